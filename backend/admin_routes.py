@@ -0,0 +1,83 @@
+from flask import Blueprint, request, jsonify
+from functools import wraps
+import hmac
+import logging
+import os
+from model_registry import registry, ModelNotAvailable
+from logging_setup import logging_status, set_levels, set_sample_rates
+
+logger = logging.getLogger(__name__)
+
+admin_bp = Blueprint('admin', __name__)
+
+# Paths of the admin routes, left out of CORS so browsers on other origins cannot call them
+ADMIN_PATHS = r'/api/(models|logging)\b'
+
+def requires_admin(view):
+    """Serve the route only to requests carrying ADMIN_TOKEN (Authorization: Bearer <token>).
+
+    Without ADMIN_TOKEN in the environment the route is disabled and answers 404.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv('ADMIN_TOKEN')
+        if not token:
+            return jsonify({'status': 'error', 'message': 'Not found'}), 404
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.encode(), token.encode()):
+            logger.warning("Rejected unauthenticated admin request to %s", request.path)
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify({
+        'status': 'success',
+        'models': registry.status(),
+        'versions': registry.versions()
+    })
+
+@admin_bp.route('/api/models/<name>/swap', methods=['POST'])
+@requires_admin
+def swap_model(name):
+    payload = request.get_json(silent=True) or {}
+    version = payload.get('version', 'current')
+    if not isinstance(version, str):
+        return jsonify({'status': 'error', 'message': 'version must be a string'}), 400
+    try:
+        handle = registry.swap(name, version)
+    except KeyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except ModelNotAvailable as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    logger.info("Swapped %s to version %s", name, version)
+    return jsonify({
+        'status': 'success',
+        'model': handle.describe()
+    })
+
+@admin_bp.route('/api/logging', methods=['GET'])
+@requires_admin
+def get_logging():
+    return jsonify({
+        'status': 'success',
+        'logging': logging_status()
+    })
+
+@admin_bp.route('/api/logging', methods=['PUT'])
+@requires_admin
+def update_logging():
+    """Change log levels ({"levels": {"root": "DEBUG"}}) and sample rates ({"sample_rates": {"/api/x": 0.1}})"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        if 'levels' in payload:
+            set_levels(payload['levels'])
+        if 'sample_rates' in payload:
+            set_sample_rates(payload['sample_rates'])
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({
+        'status': 'success',
+        'logging': logging_status()
+    })
@@ -0,0 +1,170 @@
+"""Pre-aggregated recommendation counters for the analytics endpoints.
+
+Each saved recommendation increments one counter per dimension
+(destination, destination type, travel season, municipality) with ``$inc``,
+so the dashboard routes read a few small documents instead of unwinding the
+whole ``user_preferences`` history.
+
+Rebuild the counters from existing history (run from ``backend/``)::
+
+    python analytics_counters.py --rebuild
+
+The app does this by itself when it connects to a database whose counters
+are empty but whose history is not, e.g. on the first start after upgrading.
+"""
+from collections import Counter
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from history import DIMENSION_COLLECTION, DestinationDimension, destination_count_stages, recommendation_records
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = 'analytics_counters'
+
+# Counter dimension -> destination attribute of each saved recommendation
+DIMENSIONS = {
+    'destination': 'destination',
+    'destination_type': 'destination_type',
+    'travel_season': 'travel_season',
+    'municipality': 'municipality'
+}
+
+
+# Placeholder (name, count) pairs the analytics routes show before any history exists
+DEFAULT_COUNTS = {
+    'destination': [('Mati City', 150), ('Cateel', 120), ('Boston', 100), ('Baganga', 80), ('Caraga', 60)],
+    'destination_type': [('Beach', 35), ('Mountain', 25), ('Cultural', 20), ('Nature', 15), ('Island', 5)],
+    'travel_season': [
+        ('Summer (March-May)', 45), ('Rainy (June-October)', 25), ('Holiday Season (November-February)', 30)
+    ],
+    'municipality': [
+        ('Mati City', 40), ('Cateel', 25), ('Baganga', 20), ('Boston', 15), ('Caraga', 10), ('Manay', 8),
+        ('Tarragona', 7), ('Banaybanay', 6), ('Lupon', 5), ('San Isidro', 4), ('Governor Generoso', 3)
+    ]
+}
+
+
+def ensure_counter_indexes(counters_collection):
+    """One counter document per (dimension, key); upserts rely on this index"""
+    counters_collection.create_index([('dimension', ASCENDING), ('key', ASCENDING)], unique=True)
+    counters_collection.create_index([('dimension', ASCENDING), ('count', DESCENDING)])
+
+
+def count_recommendations(documents, destinations):
+    """Count (dimension, key) pairs over the recommendations of saved history documents"""
+    counts = Counter()
+    for document in documents:
+        for record in recommendation_records(document, destinations):
+            for dimension, field in DIMENSIONS.items():
+                counts[(dimension, record.get(field))] += 1
+    return counts
+
+
+def count_destination_groups(groups, destinations):
+    """Count (dimension, key) pairs from per-destination counts ({'_id': dest_id or name, 'count': n})"""
+    counts = Counter()
+    for group in groups:
+        record = destinations.lookup(group['_id'])
+        for dimension, field in DIMENSIONS.items():
+            counts[(dimension, record.get(field))] += group['count']
+    return counts
+
+
+def counter_updates(documents, destinations):
+    """One upserting $inc per (dimension, key) counted in newly saved history documents"""
+    return [
+        UpdateOne({'dimension': dimension, 'key': key}, {'$inc': {'count': count}}, upsert=True)
+        for (dimension, key), count in count_recommendations(documents, destinations).items()
+    ]
+
+
+def increment_counters(counters_collection, documents, destinations):
+    """Apply the counts from newly saved history documents with one bulk $inc"""
+    updates = counter_updates(documents, destinations)
+    if updates:
+        counters_collection.bulk_write(updates, ordered=False)
+
+
+def _counters_cursor(counters_collection, dimension, limit):
+    return counters_collection.find(
+        {'dimension': dimension},
+        {'_id': 0, 'key': 1, 'count': 1}
+    ).sort('count', DESCENDING).limit(limit)
+
+
+def read_counters(counters_collection, dimension, limit=0):
+    """Return [(key, count)] for a dimension, highest count first"""
+    return [(counter['key'], counter['count']) for counter in _counters_cursor(counters_collection, dimension, limit)]
+
+
+async def read_counters_async(counters_collection, dimension, limit=0, max_time_ms=None):
+    """read_counters for a motor collection, with an optional server-side time limit"""
+    cursor = _counters_cursor(counters_collection, dimension, limit)
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+    return [(counter['key'], counter['count']) for counter in await cursor.to_list(length=None)]
+
+
+def rebuild_counters(history_collection, counters_collection, destinations):
+    """Recompute every counter from the full history in one pass.
+
+    The new counters are written to a scratch collection and renamed over the
+    live one, so readers never see a half-built set. Increments that land
+    while the rebuild runs are lost; run it before traffic or accept the drift.
+    """
+    database = counters_collection.database
+    scratch = database[f'{counters_collection.name}_rebuild']
+    scratch.drop()
+
+    # Count per destination, then derive every dimension from the destination records
+    groups = history_collection.aggregate(destination_count_stages(), allowDiskUse=True)
+    counters = [
+        {'dimension': dimension, 'key': key, 'count': count}
+        for (dimension, key), count in count_destination_groups(groups, destinations).items()
+    ]
+    if counters:
+        scratch.insert_many(counters)
+    total = len(counters)
+
+    ensure_counter_indexes(scratch)
+    if total:
+        scratch.rename(counters_collection.name, dropTarget=True)
+    else:
+        scratch.drop()
+        counters_collection.delete_many({})
+    ensure_counter_indexes(counters_collection)
+    logger.info("Rebuilt %s analytics counters", total)
+    return total
+
+
+def backfill_counters(history_collection, counters_collection, destinations):
+    """rebuild_counters if there is history but no counters yet; returns the rebuilt count or None"""
+    if counters_collection.find_one({}, {'_id': 1}) is not None:
+        return None
+    if history_collection.find_one({}, {'_id': 1}) is None:
+        return None
+    logger.info("Analytics counters are empty but history exists; rebuilding them")
+    return rebuild_counters(history_collection, counters_collection, destinations)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from catalog import load_catalog
+    from destination_index import DestinationIndex
+
+    logging.basicConfig(level=logging.INFO)
+    if '--rebuild' not in sys.argv[1:]:
+        print(__doc__)
+        sys.exit(1)
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    db = client['travel_recommendations']
+    destinations = DestinationDimension().add_catalog(DestinationIndex(load_catalog())).load(db[DIMENSION_COLLECTION].find())
+    rebuild_counters(db['user_preferences'], db[COUNTERS_COLLECTION], destinations)
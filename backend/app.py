@@ -1,165 +1,312 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.monotonic()
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from pymongo import MongoClient
-import pandas as pd
 import numpy as np
 import os
 from dotenv import load_dotenv
 import logging
-from models.random_forest_model import TravelRecommendationModel
+from functools import wraps
+import threading
+from models.recommendation_table import MODEL_FILE, TABLE_FILE
+from model_registry import registry, CURRENT_VERSION
+from destination_index import DestinationIndex
+from catalog import load_catalog
+from recommendation_cache import RecommendationCache
+from spool import WriteSpool
+from rating_aggregates import AGGREGATES_COLLECTION, rating_document, read_summary, record_ratings
+from pagination import fetch_page, parse_limit
+from history import DIMENSION_COLLECTION, SUMMARY_PROJECTION, DestinationDimension, expand_history, history_document, sync_dimension
+from catalog_response import PreSerializedCatalog, negotiate_encoding
+from dashboard import build_dashboard, dashboard_pipeline, parse_window_bound
+from analytics_counters import COUNTERS_COLLECTION, DEFAULT_COUNTS, backfill_counters, increment_counters, read_counters
+from indexes import ensure_indexes
+from startup import StartupTracker
+import metrics
+from logging_setup import configure_logging
+from metrics import stage
 from ml_routes import ml_bp
-from datetime import datetime
+from admin_routes import ADMIN_PATHS, admin_bp
+import atexit
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Structured logging through a background writer; LOG_LEVEL and LOG_SAMPLE_RATES configure it
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+# Every route except the admin ones may be called from the frontend's origin
+CORS(app, resources={rf'^(?!{ADMIN_PATHS}).*': {}})
+# Request latency and in-flight gauges for /metrics
+metrics.install(app)
 
 # Register blueprints
 app.register_blueprint(ml_bp)
+app.register_blueprint(admin_bp)
+
+# Readiness and per-phase startup timings, served by /readyz
+startup = StartupTracker()
+
+# MongoDB handles, set by connect_database once the server answers
+client = None
+db = None
+destinations_collection = None
+user_preferences_collection = None
+ratings_collection = None
+counters_collection = None
+rating_aggregates_collection = None
+
+# dest_id -> destination attributes for compact history documents; mirrored in destinations_dim
+destinations = DestinationDimension()
+
+# History and ratings are appended to a local spool and replayed into MongoDB in the
+# background, so requests neither wait on MongoDB nor lose writes while it is down
+write_spool = WriteSpool(
+    os.getenv('SPOOL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool', 'writes.db')),
+    handlers={
+        'user_preferences': lambda database, documents: increment_counters(database[COUNTERS_COLLECTION], documents, destinations),
+        'ratings': lambda database, documents: record_ratings(database[AGGREGATES_COLLECTION], documents)
+    },
+    batch_size=int(os.getenv('SPOOL_BATCH_SIZE', 100)),
+    flush_interval=float(os.getenv('SPOOL_FLUSH_INTERVAL', 1.0)),
+    retry_interval=float(os.getenv('SPOOL_RETRY_INTERVAL', 5.0)),
+    max_rows=int(os.getenv('SPOOL_MAX_ROWS', 1000000)),
+    max_attempts=int(os.getenv('SPOOL_MAX_ATTEMPTS', 5))
+)
+atexit.register(write_spool.close)
+
+# Global variables for models and data; models themselves live in the registry
+catalog = None
+destination_index = None
+destinations_response = None
+recommendation_cache = RecommendationCache(
+    maxsize=int(os.getenv('RECOMMENDATION_CACHE_SIZE', 4096)),
+    ttl=float(os.getenv('RECOMMENDATION_CACHE_TTL', 3600))
+)
+metrics.register_collector(metrics.stats_collector(
+    'recommendation_cache', recommendation_cache.stats,
+    counters=('hits', 'misses', 'evictions', 'expirations', 'invalidations')
+))
+metrics.register_collector(metrics.stats_collector(
+    'write_spool', write_spool.stats,
+    counters=('appended', 'inserted', 'duplicates', 'dropped', 'failed', 'dead_lettered', 'handler_failures',
+              'unhandled', 'batches')
+))
 
 # MongoDB connection
-try:
+def connect_database():
+    global client
     mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-    logger.info(f"Attempting to connect to MongoDB at: {mongodb_uri}")
-    client = MongoClient(mongodb_uri)
+    logger.info("Attempting to connect to MongoDB at: %s", mongodb_uri)
+    client = MongoClient(
+        mongodb_uri,
+        serverSelectionTimeoutMS=int(os.getenv('MONGODB_TIMEOUT_MS', 5000)),
+        event_listeners=[metrics.MongoCommandTimer()]
+    )
     # Test the connection
     client.admin.command('ping')
     logger.info("Successfully connected to MongoDB")
-    
-    db = client['travel_recommendations']
+    attach_database(client['travel_recommendations'])
+
+def attach_database(database):
+    """Point the collection handles at database (a pymongo Database, or a stand-in such as mongomock)"""
+    global db, destinations_collection, user_preferences_collection, ratings_collection
+    global counters_collection, rating_aggregates_collection
+    db = database
     destinations_collection = db['destinations']
     user_preferences_collection = db['user_preferences']
     ratings_collection = db['ratings']  # New collection for ratings
+    counters_collection = db[COUNTERS_COLLECTION]  # Pre-aggregated analytics counts
+    rating_aggregates_collection = db[AGGREGATES_COLLECTION]  # Running rating summary
+    ensure_indexes(db, COUNTERS_COLLECTION)
+    sync_dimension(db[DIMENSION_COLLECTION], destinations)
+    # History saved before the counters existed would otherwise show up nowhere in the analytics
+    try:
+        backfill_counters(user_preferences_collection, counters_collection, destinations)
+    except Exception as e:
+        logger.error("Could not rebuild the analytics counters, run python analytics_counters.py --rebuild: %s", e)
     
-    # Test collection access
-    user_preferences_collection.find_one()
-    ratings_collection.find_one()
-    logger.info("Successfully accessed collections")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {str(e)}")
-    raise
-
-# Global variables for models and data
-df = None
-model = None
-
-# Load and preprocess data
+    # Start replaying spooled writes, including any left over from a previous run
+    write_spool.attach(db)
+
+# Load the typed catalog, memory-mapped and shared with the other workers
 def load_data():
     try:
-        df = pd.read_csv('dataset/Mati-City.csv')
-        logger.info(f"Successfully loaded data with {len(df)} records")
-        return df
+        catalog = load_catalog()
+        logger.info("Successfully loaded catalog with %s records (content %s)", len(catalog), catalog.fingerprint[:12])
+        return catalog
     except Exception as e:
-        logger.error(f"Error loading data: {str(e)}")
+        logger.error("Error loading data: %s", e)
         raise
 
 # Initialize model
 def initialize_models():
-    global df, model
+    """Load the catalog and saved model artifacts; never trains (see train_models.py)"""
+    global catalog, destination_index, destinations_response
     try:
         logger.info("Loading data and initializing model...")
-        df = load_data()
+        with startup.phase('load_data'):
+            catalog = load_data()
+        with startup.phase('build_catalog_indexes'):
+            destination_index = DestinationIndex(catalog)
+            destinations_response = PreSerializedCatalog(catalog)
+            destinations.add_catalog(destination_index)
+        if db is not None:
+            sync_dimension(db[DIMENSION_COLLECTION], destinations)
         
         # Initialize Random Forest
-        model = TravelRecommendationModel()
-        if not os.path.exists('models/random_forest_model.joblib'):
-            logger.info("Training new Random Forest model...")
-            model.train(df)
-            logger.info("Random Forest model training completed")
-        else:
+        with startup.phase('load_model'):
+            model_dir = registry.directory(CURRENT_VERSION)
+            if not os.path.exists(os.path.join(model_dir, MODEL_FILE)) and not os.path.exists(os.path.join(model_dir, TABLE_FILE)):
+                raise Exception("No trained Random Forest model found. Run 'python train_models.py' first.")
             logger.info("Loading existing Random Forest model...")
-            model.load_model()
+            registry.swap('random_forest', CURRENT_VERSION)
             logger.info("Random Forest model loaded successfully")
+        startup.mark_ready('models')
     except Exception as e:
-        logger.error(f"Error during initialization: {str(e)}")
+        logger.error("Error during initialization: %s", e)
         raise
 
-# Initialize models when the app starts
-initialize_models()
+def on_model_swapped(handle):
+    """A Random Forest published after a failed start (e.g. by a hot-swap) makes the models ready"""
+    if handle.name == 'random_forest' and destination_index is not None:
+        startup.mark_ready('models')
+
+registry.on_swap(on_model_swapped)
+
+def connect_database_with_retry(retry_interval=None):
+    """Keep trying to reach MongoDB until it answers"""
+    retry_interval = retry_interval or float(os.getenv('MONGODB_RETRY_INTERVAL', 5))
+    while True:
+        try:
+            with startup.phase('connect_database'):
+                connect_database()
+            startup.mark_ready('database')
+            return
+        except Exception as e:
+            logger.error("Failed to connect to MongoDB: %s; retrying in %ss", e, retry_interval)
+            time.sleep(retry_interval)
+
+def warm_up():
+    """Load models and connect to MongoDB; both run off the import path"""
+    try:
+        initialize_models()
+    except Exception:
+        pass  # Recorded in the startup report; /readyz stays unready
+    connect_database_with_retry()
+
+def start_warmup():
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def preload():
+    """Load the catalog and models synchronously, e.g. in a pre-fork server master"""
+    try:
+        initialize_models()
+    except Exception:
+        pass  # Recorded in the startup report; start_worker retries in the worker
+
+def start_worker():
+    """Per-process startup after fork: MongoDB clients are not fork-safe, so connect here"""
+    target = connect_database_with_retry if startup.is_ready('models') else warm_up
+    thread = threading.Thread(target=target, name='worker-startup', daemon=True)
+    thread.start()
+    return thread
+
+def requires(*components):
+    """Answer 503 until the given startup components are ready"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not startup.is_ready(*components):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Service is starting up, please retry shortly',
+                    'startup': startup.report()
+                }), 503
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    ready = startup.is_ready('models', 'database')
+    return jsonify({
+        'status': 'ready' if ready else 'starting',
+        'startup': startup.report()
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+# Largest number of preference sets accepted by the batch endpoint
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 10000))
+
+def add_packing_tips(recommendations):
+    """Ensure each recommendation has a destination field and its packing tips"""
+    return destination_index.add_packing_tips(recommendations)
 
 @app.route('/api/recommendations', methods=['POST'])
+@requires('models')
 def get_travel_recommendations():
     try:
         logger.info("Received recommendation request")
-        user_preferences = request.json
-        logger.debug(f"User preferences: {user_preferences}")
+        with stage('parse_json'):
+            user_preferences = request.json
+        logger.debug("User preferences: %s", user_preferences)
         
         # Validate required fields
         required_fields = ['destination_type', 'travel_purpose', 'travel_season', 'budget']
         for field in required_fields:
             if field not in user_preferences:
-                logger.error(f"Missing required field: {field}")
+                logger.error("Missing required field: %s", field)
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        # Get predictive recommendations
-        predictive_recommendations = model.predict(user_preferences, df)
-        
-        # Log the recommendations for debugging
-        logger.debug("Predictive recommendations:")
-        for rec in predictive_recommendations:
-            logger.debug(f"  - {rec}")
+        # One registry read per request, so a concurrent hot-swap never mixes versions
+        model = registry.get('random_forest')
         
-        # Ensure all recommendations have a destination field and include packing tips
-        predictive_recommendations = []
-        for rec in model.predict(user_preferences, df):
-            destination = rec.get('destination', rec.get('Destination', 'Unknown Destination'))
-            # Get packing tips from the dataset with exact matching
-            dest_data = df[df['Destination'].str.strip() == destination.strip()]
-            if dest_data.empty:
-                # Try case-insensitive matching if exact match fails
-                dest_data = df[df['Destination'].str.strip().str.lower() == destination.strip().lower()]
-            
-            packing_tips = dest_data['Packing Tips'].iloc[0] if not dest_data.empty else 'No packing tips available for this destination'
-            
-            logger.debug(f"Destination: {destination}")
-            logger.debug(f"Found matching data: {not dest_data.empty}")
-            logger.debug(f"Packing tips: {packing_tips}")
+        # Serve repeated preference sets from the cache; it resets whenever a new model is loaded
+        with stage('cache_lookup'):
+            recommendation_cache.ensure_generation(model.generation)
+            cache_key = model.cache_key(user_preferences)
+            cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            predictive_recommendations = [dict(rec) for rec in cached]
+        else:
+            # Get predictive recommendations
+            with stage('predict'):
+                recommendations = model.predict(user_preferences, catalog, destination_index)
             
-            predictive_recommendations.append({
-                **rec,
-                'destination': destination,
-                'packing_tips': packing_tips
-            })
+            # Ensure all recommendations have a destination field and include packing tips
+            with stage('packing_tips'):
+                predictive_recommendations = add_packing_tips(recommendations)
+            recommendation_cache.put(cache_key, [dict(rec) for rec in predictive_recommendations])
         
-        logger.debug("Final recommendations with packing tips:")
-        for rec in predictive_recommendations:
-            logger.debug(f"  - {rec}")
+        logger.debug("Final recommendations with packing tips: %s", predictive_recommendations)
         
         # Save user preferences and recommendations to MongoDB
         try:
-            user_preference_doc = {
-                'budget': float(user_preferences['budget']),
-                'destination_type': user_preferences['destination_type'],
-                'travel_season': user_preferences['travel_season'],
-                'travel_purpose': user_preferences['travel_purpose'],
-                'municipality': user_preferences.get('municipality', ''),
-                'group_type': user_preferences.get('group_type', ''),
-                'number_of_people': int(user_preferences.get('number_of_people', 1)),
-                'trip_duration': int(user_preferences.get('trip_duration', 1)),
-                'recommendations': predictive_recommendations,
-                'created_at': datetime.utcnow()
-            }
-            
-            logger.debug(f"Attempting to save document: {user_preference_doc}")
-            result = user_preferences_collection.insert_one(user_preference_doc)
-            logger.info(f"Successfully saved user preferences with ID: {result.inserted_id}")
+            user_preference_doc = history_document(user_preferences, predictive_recommendations)
             
-            # Verify the save
-            saved_doc = user_preferences_collection.find_one({'_id': result.inserted_id})
-            if saved_doc:
-                logger.info("Verified document was saved successfully")
-            else:
-                logger.error("Document was not found after saving")
+            # Spooled locally and replayed in batches, so the response never waits on MongoDB
+            logger.debug("Spooling user preferences for saving: %s", user_preference_doc)
+            with stage('spool_history'):
+                spooled = write_spool.append('user_preferences', user_preference_doc)
+            if not spooled:
+                logger.error("Write spool is full, user preferences were not saved")
                 
         except Exception as e:
-            logger.error(f"Error saving to MongoDB: {str(e)}")
-            logger.error(f"Document that failed to save: {user_preference_doc}")
+            logger.error("Error saving to MongoDB: %s", e)
             # Continue with the response even if saving fails
         
         if not predictive_recommendations:
@@ -170,46 +317,133 @@ def get_travel_recommendations():
                 'recommendations': {'predictive': predictive_recommendations}
             })
         
-        logger.info(f"Returning recommendations: {predictive_recommendations}")
-        return jsonify({
-            'status': 'success',
-            'recommendations': {'predictive': predictive_recommendations}
-        })
+        logger.info("Returning %s recommendations", len(predictive_recommendations))
+        logger.debug("Returning recommendations: %s", predictive_recommendations)
+        with stage('serialize'):
+            return jsonify({
+                'status': 'success',
+                'recommendations': {'predictive': predictive_recommendations}
+            })
+    
+    except Exception as e:
+        logger.error("Error in get_travel_recommendations: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recommendations/cache', methods=['GET'])
+def get_recommendation_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'worker': os.getpid(),
+        'cache': recommendation_cache.stats()
+    })
+
+@app.route('/api/recommendations/queue', methods=['GET'])
+def get_history_queue_stats():
+    return jsonify({
+        'status': 'success',
+        'worker': os.getpid(),
+        'queue': write_spool.stats()
+    })
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+@requires('models')
+def get_batch_recommendations():
+    try:
+        payload = request.json
+        list_of_preferences = payload.get('preferences') if isinstance(payload, dict) else payload
+        if not isinstance(list_of_preferences, list):
+            return jsonify({'error': 'Expected a list of preferences'}), 400
+        if len(list_of_preferences) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch too large: at most {MAX_BATCH_SIZE} preference sets'}), 400
+        logger.info("Received batch recommendation request for %s preference sets", len(list_of_preferences))
+        
+        # Validate required fields
+        required_fields = ['destination_type', 'travel_purpose', 'travel_season', 'budget']
+        for position, user_preferences in enumerate(list_of_preferences):
+            if not isinstance(user_preferences, dict):
+                return jsonify({'error': f'Preference set {position} must be an object'}), 400
+            for field in required_fields:
+                if field not in user_preferences:
+                    return jsonify({'error': f'Missing required field: {field} in preference set {position}'}), 400
+        
+        model = registry.get('random_forest')
+        with stage('predict'):
+            results = model.predict_batch(list_of_preferences, catalog, destination_index)
+        with stage('packing_tips'):
+            recommendations = [{'predictive': add_packing_tips(recommendations)} for recommendations in results]
+        with stage('serialize'):
+            return jsonify({
+                'status': 'success',
+                'recommendations': recommendations
+            })
     
     except Exception as e:
-        logger.error(f"Error in get_travel_recommendations: {str(e)}")
+        logger.error("Error in get_batch_recommendations: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/destinations', methods=['GET'])
+@requires('models')
 def get_all_destinations():
     try:
         logger.info("Received request for all destinations")
-        destinations = df.to_dict('records')
-        return jsonify({
-            'status': 'success',
-            'destinations': destinations
-        })
+        # Optional projection (?fields=a,b or ?exclude=Packing Tips) and paging (?offset=&limit=)
+        try:
+            fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+            exclude = [f.strip() for f in request.args.get('exclude', '').split(',') if f.strip()]
+            fields = destinations_response.resolve_fields(fields, exclude)
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = request.args.get('limit')
+            limit = max(0, int(limit)) if limit else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        variant = destinations_response.variant(fields, offset, limit)
+        encoding = negotiate_encoding(request.accept_encodings)
+        etag = variant.etags[encoding]
+        headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            if encoding != 'identity':
+                headers['Content-Encoding'] = encoding
+            response = Response(variant.encoded(encoding), mimetype='application/json', headers=headers)
+        response.set_etag(etag)
+        return response
     except Exception as e:
-        logger.error(f"Error in get_all_destinations: {str(e)}")
+        logger.error("Error in get_all_destinations: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/history', methods=['GET'])
+@requires('database')
 def get_user_history():
     try:
         logger.info("Received request for user history")
-        # Get the last 10 recommendations
-        history = list(user_preferences_collection.find(
-            {},
-            {'_id': 0}  # Exclude MongoDB _id field
-        ).sort('created_at', -1).limit(10))
+        # Newest first, one keyset page at a time; ?cursor= continues from next_cursor
+        include_recommendations = request.args.get('include_recommendations', 'true').lower() != 'false'
+        projection = None if include_recommendations else SUMMARY_PROJECTION
+        try:
+            limit = parse_limit(request.args.get('limit'), default=10)
+            history, next_cursor = fetch_page(
+                user_preferences_collection, request.args.get('cursor'), limit, projection=projection
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        logger.info(f"Found {len(history)} history records")
+        # Compact documents store destination ids; rebuild the recommendations from destinations_dim
+        with stage('expand_history'):
+            if destinations.missing(history):
+                destinations.load(db[DIMENSION_COLLECTION].find())
+            history = [expand_history(document, destinations) for document in history]
+        
+        logger.info("Found %s history records", len(history))
         return jsonify({
             'status': 'success',
-            'history': history
+            'history': history,
+            'next_cursor': next_cursor
         })
     except Exception as e:
-        logger.error(f"Error in get_user_history: {str(e)}")
+        logger.error("Error in get_user_history: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ratings', methods=['POST'])
@@ -217,26 +451,27 @@ def submit_rating():
     try:
         logger.info("Received rating submission")
         rating_data = request.json
-        logger.debug(f"Rating data: {rating_data}")
+        logger.debug("Rating data: %s", rating_data)
         
         # Validate required fields
         required_fields = ['system_satisfaction_score', 'analytics_satisfaction_score']
         for field in required_fields:
             if field not in rating_data:
-                logger.error(f"Missing required field: {field}")
+                logger.error("Missing required field: %s", field)
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        # Save rating to MongoDB
         try:
-            rating_doc = {
-                'system_satisfaction_score': float(rating_data['system_satisfaction_score']),
-                'analytics_satisfaction_score': float(rating_data['analytics_satisfaction_score']),
-                'created_at': datetime.utcnow()
-            }
-            
-            logger.debug(f"Attempting to save rating: {rating_doc}")
-            result = ratings_collection.insert_one(rating_doc)
-            logger.info(f"Successfully saved rating with ID: {result.inserted_id}")
+            rating_doc = rating_document(rating_data)
+        except (TypeError, ValueError) as e:
+            logger.error("Invalid rating: %s", e)
+            return jsonify({'error': str(e)}), 400
+        
+        # Save rating to MongoDB, through the spool
+        try:
+            logger.debug("Attempting to save rating: %s", rating_doc)
+            if not write_spool.append('ratings', rating_doc):
+                raise RuntimeError("Write spool is full")
+            logger.info("Successfully spooled rating with ID: %s", rating_doc['_id'])
             
             return jsonify({
                 'status': 'success',
@@ -244,228 +479,162 @@ def submit_rating():
             })
             
         except Exception as e:
-            logger.error(f"Error saving rating to MongoDB: {str(e)}")
+            logger.error("Error saving rating to MongoDB: %s", e)
             return jsonify({
                 'status': 'error',
                 'message': 'Failed to save rating'
             }), 500
             
     except Exception as e:
-        logger.error(f"Error in submit_rating: {str(e)}")
+        logger.error("Error in submit_rating: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ratings', methods=['GET'])
+@requires('database')
 def get_ratings():
     try:
         logger.info("Received request for ratings")
-        # Get all ratings
-        ratings = list(ratings_collection.find(
-            {},
-            {'_id': 0}  # Exclude MongoDB _id field
-        ).sort('created_at', -1))
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            page, next_cursor = fetch_page(ratings_collection, request.args.get('cursor'), limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Calculate average ratings
-        if ratings:
-            avg_system = sum(r['system_satisfaction_score'] for r in ratings) / len(ratings)
-            avg_analytics = sum(r['analytics_satisfaction_score'] for r in ratings) / len(ratings)
-        else:
-            avg_system = 0
-            avg_analytics = 0
+        # Averages come from the running aggregates, not from the ratings themselves
+        total_ratings, averages, summary = read_summary(rating_aggregates_collection)
         
-        logger.info(f"Found {len(ratings)} ratings")
+        logger.info("Returning %s of %s ratings", len(page), total_ratings)
         return jsonify({
             'status': 'success',
-            'ratings': ratings,
-            'averages': {
-                'system_satisfaction_score': round(avg_system, 2),
-                'analytics_satisfaction_score': round(avg_analytics, 2)
-            }
+            'ratings': page,
+            'next_cursor': next_cursor,
+            'total_ratings': total_ratings,
+            'averages': averages,
+            'summary': summary
         })
     except Exception as e:
-        logger.error(f"Error in get_ratings: {str(e)}")
+        logger.error("Error in get_ratings: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/top-destinations', methods=['GET'])
+@requires('database')
 def get_top_destinations():
     try:
         logger.info("Received request for top destinations")
         
-        # Aggregate recommendations to count occurrences of each destination
-        pipeline = [
-            # Unwind the recommendations array to get individual recommendations
-            {"$unwind": "$recommendations"},
-            # Group by destination and count occurrences
-            {"$group": {
-                "_id": "$recommendations.destination",
-                "recommendations": {"$sum": 1}
-            }},
-            # Sort by count in descending order
-            {"$sort": {"recommendations": -1}},
-            # Limit to top 5
-            {"$limit": 5},
-            # Project to match the expected format
-            {"$project": {
-                "name": "$_id",
-                "recommendations": 1,
-                "_id": 0
-            }}
+        # Read the pre-aggregated counters maintained as recommendations are saved;
+        # if no data is found, return some default destinations
+        top_destinations = [
+            {"name": name, "recommendations": count}
+            for name, count in read_counters(counters_collection, 'destination', limit=5) or DEFAULT_COUNTS['destination']
         ]
         
-        top_destinations = list(user_preferences_collection.aggregate(pipeline))
-        
-        # If no data is found, return some default destinations
-        if not top_destinations:
-            top_destinations = [
-                {"name": "Mati City", "recommendations": 150},
-                {"name": "Cateel", "recommendations": 120},
-                {"name": "Boston", "recommendations": 100},
-                {"name": "Baganga", "recommendations": 80},
-                {"name": "Caraga", "recommendations": 60}
-            ]
-        
         return jsonify({
             'status': 'success',
             'destinations': top_destinations
         })
     except Exception as e:
-        logger.error(f"Error in get_top_destinations: {str(e)}")
+        logger.error("Error in get_top_destinations: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/destination-types', methods=['GET'])
+@requires('database')
 def get_destination_types_distribution():
     try:
         logger.info("Received request for destination types distribution")
         
-        # Aggregate recommendations to count occurrences of each destination type
-        pipeline = [
-            # Unwind the recommendations array to get individual recommendations
-            {"$unwind": "$recommendations"},
-            # Group by destination type and count occurrences
-            {"$group": {
-                "_id": "$recommendations.destination_type",
-                "count": {"$sum": 1}
-            }},
-            # Sort by count in descending order
-            {"$sort": {"count": -1}},
-            # Project to match the expected format
-            {"$project": {
-                "name": "$_id",
-                "value": "$count",
-                "_id": 0
-            }}
+        # Read the pre-aggregated counters maintained as recommendations are saved;
+        # if no data is found, return some default distribution
+        distribution = [
+            {"name": name, "value": count}
+            for name, count in read_counters(counters_collection, 'destination_type') or DEFAULT_COUNTS['destination_type']
         ]
         
-        distribution = list(user_preferences_collection.aggregate(pipeline))
-        
-        # If no data is found, return some default distribution
-        if not distribution:
-            distribution = [
-                {"name": "Beach", "value": 35},
-                {"name": "Mountain", "value": 25},
-                {"name": "Cultural", "value": 20},
-                {"name": "Nature", "value": 15},
-                {"name": "Island", "value": 5}
-            ]
-        
         return jsonify({
             'status': 'success',
             'distribution': distribution
         })
     except Exception as e:
-        logger.error(f"Error in get_destination_types_distribution: {str(e)}")
+        logger.error("Error in get_destination_types_distribution: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/travel-seasons', methods=['GET'])
+@requires('database')
 def get_travel_seasons_distribution():
     try:
         logger.info("Received request for travel seasons distribution")
         
-        # Aggregate recommendations to count occurrences of each travel season
-        pipeline = [
-            # Unwind the recommendations array to get individual recommendations
-            {"$unwind": "$recommendations"},
-            # Group by travel season and count occurrences
-            {"$group": {
-                "_id": "$recommendations.travel_season",
-                "count": {"$sum": 1}
-            }},
-            # Sort by count in descending order
-            {"$sort": {"count": -1}},
-            # Project to match the expected format
-            {"$project": {
-                "name": "$_id",
-                "value": "$count",
-                "_id": 0
-            }}
+        # Read the pre-aggregated counters maintained as recommendations are saved;
+        # if no data is found, return some default distribution
+        distribution = [
+            {"name": name, "value": count}
+            for name, count in read_counters(counters_collection, 'travel_season') or DEFAULT_COUNTS['travel_season']
         ]
         
-        distribution = list(user_preferences_collection.aggregate(pipeline))
-        
-        # If no data is found, return some default distribution
-        if not distribution:
-            distribution = [
-                {"name": "Summer (March-May)", "value": 45},
-                {"name": "Rainy (June-October)", "value": 25},
-                {"name": "Holiday Season (November-February)", "value": 30}
-            ]
-        
         return jsonify({
             'status': 'success',
             'distribution': distribution
         })
     except Exception as e:
-        logger.error(f"Error in get_travel_seasons_distribution: {str(e)}")
+        logger.error("Error in get_travel_seasons_distribution: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/municipalities', methods=['GET'])
+@requires('database')
 def get_municipalities_distribution():
     try:
         logger.info("Received request for municipalities distribution")
         
-        # Aggregate recommendations to count occurrences of each municipality
-        pipeline = [
-            # Unwind the recommendations array to get individual recommendations
-            {"$unwind": "$recommendations"},
-            # Group by municipality and count occurrences
-            {"$group": {
-                "_id": "$recommendations.municipality",
-                "count": {"$sum": 1}
-            }},
-            # Sort by count in descending order
-            {"$sort": {"count": -1}},
-            # Project to match the expected format
-            {"$project": {
-                "name": "$_id",
-                "value": "$count",
-                "_id": 0
-            }}
+        # Read the pre-aggregated counters maintained as recommendations are saved;
+        # if no data is found, return some default distribution
+        distribution = [
+            {"name": name, "value": count}
+            for name, count in read_counters(counters_collection, 'municipality') or DEFAULT_COUNTS['municipality']
         ]
         
-        distribution = list(user_preferences_collection.aggregate(pipeline))
+        return jsonify({
+            'status': 'success',
+            'distribution': distribution
+        })
+    except Exception as e:
+        logger.error("Error in get_municipalities_distribution: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+@requires('database')
+def get_dashboard():
+    try:
+        logger.info("Received request for dashboard")
         
-        # If no data is found, return some default distribution
-        if not distribution:
-            distribution = [
-                {"name": "Mati City", "value": 40},
-                {"name": "Cateel", "value": 25},
-                {"name": "Baganga", "value": 20},
-                {"name": "Boston", "value": 15},
-                {"name": "Caraga", "value": 10},
-                {"name": "Manay", "value": 8},
-                {"name": "Tarragona", "value": 7},
-                {"name": "Banaybanay", "value": 6},
-                {"name": "Lupon", "value": 5},
-                {"name": "San Isidro", "value": 4},
-                {"name": "Governor Generoso", "value": 3}
-            ]
+        # Optional created_at window, e.g. ?since=2025-01-01T00:00:00&until=2025-02-01
+        try:
+            since = parse_window_bound(request.args.get('since'))
+            until = parse_window_bound(request.args.get('until'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid time window: {str(e)}'}), 400
+        
+        # One pass counts recommendations per destination; the panels come from the destination records
+        with stage('aggregate'):
+            groups = list(user_preferences_collection.aggregate(dashboard_pipeline(since, until), allowDiskUse=True))
+        dashboard = build_dashboard(groups, destinations)
         
         return jsonify({
             'status': 'success',
-            'distribution': distribution
+            'dashboard': dashboard,
+            'window': {
+                'since': since.isoformat() if since else None,
+                'until': until.isoformat() if until else None
+            }
         })
     except Exception as e:
-        logger.error(f"Error in get_municipalities_distribution: {str(e)}")
+        logger.error("Error in get_dashboard: %s", e)
         return jsonify({'error': str(e)}), 500
 
+startup.record('import', time.monotonic() - _import_started)
+
+# Warm up in the background so importing the app stays fast
+if os.getenv('WARMUP_ON_IMPORT', 'true').lower() != 'false':
+    start_warmup()
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""Asyncio variant of the database-bound routes, on Quart and motor.
+
+Serves the analytics routes, ``/api/dashboard``, ``/api/history``,
+``/api/ratings`` and ``/api/recommendations`` with non-blocking MongoDB I/O,
+so a slow aggregation holds a coroutine instead of a worker thread. Each
+route class has its own concurrency limit (``ASYNC_LIMIT_<CLASS>``); a
+request that cannot get a slot within ``ASYNC_QUEUE_TIMEOUT`` seconds is
+answered with 503 instead of queueing. Every database call is bounded
+server-side with ``maxTimeMS`` and client-side with ``asyncio.wait_for``
+(``ASYNC_DB_TIMEOUT_MS``) and answered with 504 when it runs over. Model
+inference runs on a small thread pool of its own.
+
+Run from ``backend/`` with an ASGI server::
+
+    hypercorn async_app:app
+
+``create_app(database)`` accepts any motor-compatible database, e.g.
+``mongomock_motor.AsyncMongoMockClient()['travel_recommendations']``.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import logging
+import os
+
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+from analytics_counters import COUNTERS_COLLECTION, DEFAULT_COUNTS, counter_updates, read_counters_async
+from catalog import CSV_PATH, load_catalog
+from dashboard import build_dashboard, dashboard_pipeline, parse_window_bound
+from destination_index import DestinationIndex
+from history import DIMENSION_COLLECTION, SUMMARY_PROJECTION, DestinationDimension, expand_history, history_document
+from model_registry import registry
+from pagination import fetch_page_async, parse_limit
+from rating_aggregates import AGGREGATES_COLLECTION, SUMMARY_ID, rating_document, rating_update, summarize
+
+logger = logging.getLogger(__name__)
+
+DB_TIMEOUT_MS = int(os.getenv('ASYNC_DB_TIMEOUT_MS', 5000))
+QUEUE_TIMEOUT = float(os.getenv('ASYNC_QUEUE_TIMEOUT', 2.0))
+# Concurrent requests per route class
+ROUTE_LIMITS = {
+    'analytics': int(os.getenv('ASYNC_LIMIT_ANALYTICS', 8)),
+    'history': int(os.getenv('ASYNC_LIMIT_HISTORY', 32)),
+    'writes': int(os.getenv('ASYNC_LIMIT_WRITES', 64)),
+    'inference': int(os.getenv('ASYNC_LIMIT_INFERENCE', 4))
+}
+# Analytics route -> (counter dimension, limit, response key, item count key)
+ANALYTICS_ROUTES = {
+    '/api/top-destinations': ('destination', 5, 'destinations', 'recommendations'),
+    '/api/destination-types': ('destination_type', 0, 'distribution', 'value'),
+    '/api/travel-seasons': ('travel_season', 0, 'distribution', 'value'),
+    '/api/municipalities': ('municipality', 0, 'distribution', 'value')
+}
+
+
+class Overloaded(Exception):
+    pass
+
+
+def create_app(database=None, catalog_path=CSV_PATH):
+    """Build the app; without a database, connect with motor to MONGODB_URI when serving starts"""
+    app = cors(Quart(__name__))
+    state = {'database': database, 'tasks': set(), 'destinations': DestinationDimension()}
+    limits = {}
+    inference_pool = ThreadPoolExecutor(max_workers=ROUTE_LIMITS['inference'], thread_name_prefix='inference')
+
+    @app.before_serving
+    async def start():
+        # Semaphores belong to the serving event loop
+        limits.update({name: asyncio.Semaphore(limit) for name, limit in ROUTE_LIMITS.items()})
+        if state['database'] is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            client = AsyncIOMotorClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+            state['database'] = client['travel_recommendations']
+        loop = asyncio.get_running_loop()
+        state['catalog'] = await loop.run_in_executor(inference_pool, load_catalog, catalog_path)
+        state['destination_index'] = DestinationIndex(state['catalog'])
+        destinations = state['destinations'].add_catalog(state['destination_index'])
+        await collection(DIMENSION_COLLECTION).bulk_write(destinations.upserts(), ordered=False)
+        await load_destinations()
+
+    @app.after_serving
+    async def stop():
+        # Let in-flight history saves finish
+        if state['tasks']:
+            await asyncio.wait(state['tasks'], timeout=DB_TIMEOUT_MS / 1000)
+        inference_pool.shutdown(wait=False)
+
+    def collection(name):
+        return state['database'][name]
+
+    @asynccontextmanager
+    async def slot(route_class):
+        """Hold one of the route class's slots, or raise Overloaded"""
+        semaphore = limits[route_class]
+        try:
+            await asyncio.wait_for(semaphore.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Overloaded(route_class)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    async def bounded(awaitable):
+        """Client-side bound matching the server-side maxTimeMS"""
+        return await asyncio.wait_for(awaitable, DB_TIMEOUT_MS / 1000)
+
+    async def load_destinations():
+        """Pick up destinations_dim records this process does not know, e.g. added by a migration"""
+        documents = await bounded(collection(DIMENSION_COLLECTION).find().max_time_ms(DB_TIMEOUT_MS).to_list(length=None))
+        state['destinations'].load(documents)
+
+    @app.errorhandler(Overloaded)
+    async def overloaded(e):
+        return jsonify({'status': 'error', 'message': f'Too many concurrent {e} requests, please retry'}), 503
+
+    @app.errorhandler(asyncio.TimeoutError)
+    async def timed_out(e):
+        return jsonify({'status': 'error', 'message': 'Database query timed out'}), 504
+
+    def analytics_view(path, dimension, limit, key, count_key):
+        async def view():
+            async with slot('analytics'):
+                counts = await bounded(read_counters_async(
+                    collection(COUNTERS_COLLECTION), dimension, limit=limit, max_time_ms=DB_TIMEOUT_MS
+                ))
+            return jsonify({
+                'status': 'success',
+                key: [{'name': name, count_key: count} for name, count in counts or DEFAULT_COUNTS[dimension]]
+            })
+        app.add_url_rule(path, f'analytics_{dimension}', view, methods=['GET'])
+
+    for path, route in ANALYTICS_ROUTES.items():
+        analytics_view(path, *route)
+
+    @app.route('/api/dashboard', methods=['GET'])
+    async def get_dashboard():
+        try:
+            since = parse_window_bound(request.args.get('since'))
+            until = parse_window_bound(request.args.get('until'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid time window: {str(e)}'}), 400
+        async with slot('analytics'):
+            cursor = collection('user_preferences').aggregate(
+                dashboard_pipeline(since, until), allowDiskUse=True, maxTimeMS=DB_TIMEOUT_MS
+            )
+            groups = await bounded(cursor.to_list(length=None))
+        return jsonify({
+            'status': 'success',
+            'dashboard': build_dashboard(groups, state['destinations']),
+            'window': {
+                'since': since.isoformat() if since else None,
+                'until': until.isoformat() if until else None
+            }
+        })
+
+    @app.route('/api/history', methods=['GET'])
+    async def get_user_history():
+        include_recommendations = request.args.get('include_recommendations', 'true').lower() != 'false'
+        projection = None if include_recommendations else SUMMARY_PROJECTION
+        try:
+            limit = parse_limit(request.args.get('limit'), default=10)
+            async with slot('history'):
+                history, next_cursor = await bounded(fetch_page_async(
+                    collection('user_preferences'), request.args.get('cursor'), limit,
+                    projection=projection, max_time_ms=DB_TIMEOUT_MS
+                ))
+                if state['destinations'].missing(history):
+                    await load_destinations()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        history = [expand_history(document, state['destinations']) for document in history]
+        return jsonify({'status': 'success', 'history': history, 'next_cursor': next_cursor})
+
+    @app.route('/api/ratings', methods=['GET'])
+    async def get_ratings():
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            async with slot('history'):
+                page, next_cursor = await bounded(fetch_page_async(
+                    collection('ratings'), request.args.get('cursor'), limit, max_time_ms=DB_TIMEOUT_MS
+                ))
+                summary = await bounded(
+                    collection(AGGREGATES_COLLECTION).find({'_id': SUMMARY_ID}).max_time_ms(DB_TIMEOUT_MS).to_list(length=1)
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        total_ratings, averages, details = summarize(summary[0] if summary else None)
+        return jsonify({
+            'status': 'success',
+            'ratings': page,
+            'next_cursor': next_cursor,
+            'total_ratings': total_ratings,
+            'averages': averages,
+            'summary': details
+        })
+
+    @app.route('/api/ratings', methods=['POST'])
+    async def submit_rating():
+        rating_data = await request.get_json()
+        for field in ['system_satisfaction_score', 'analytics_satisfaction_score']:
+            if not rating_data or field not in rating_data:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        try:
+            rating_doc = rating_document(rating_data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        async with slot('writes'):
+            await bounded(collection('ratings').insert_one(rating_doc))
+            await bounded(collection(AGGREGATES_COLLECTION).update_one(
+                {'_id': SUMMARY_ID}, rating_update(rating_doc), upsert=True
+            ))
+        return jsonify({'status': 'success', 'message': 'Rating saved successfully'})
+
+    async def save_history(document):
+        try:
+            async with slot('writes'):
+                await bounded(collection('user_preferences').insert_one(document))
+                updates = counter_updates([document], state['destinations'])
+                if updates:
+                    await bounded(collection(COUNTERS_COLLECTION).bulk_write(updates, ordered=False))
+        except Exception as e:
+            logger.error("User preferences were not saved: %s", e)
+
+    @app.route('/api/recommendations', methods=['POST'])
+    async def get_travel_recommendations():
+        user_preferences = await request.get_json(silent=True)
+        for field in ['destination_type', 'travel_purpose', 'travel_season', 'budget']:
+            if not user_preferences or field not in user_preferences:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+
+        # Inference is CPU-bound: run it on the inference pool, off the event loop
+        loop = asyncio.get_running_loop()
+        destination_index = state['destination_index']
+        try:
+            async with slot('inference'):
+                model = await loop.run_in_executor(inference_pool, registry.get, 'random_forest')
+                recommendations = await loop.run_in_executor(
+                    inference_pool, model.predict, user_preferences, state['catalog'], destination_index
+                )
+            recommendations = destination_index.add_packing_tips(recommendations)
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error("Error in get_travel_recommendations: %s", e)
+            return jsonify({'error': str(e)}), 500
+
+        # Saved in the background; the response does not wait for MongoDB
+        try:
+            document = history_document(user_preferences, [dict(rec) for rec in recommendations])
+        except Exception as e:
+            # Continue with the response even if saving fails, as the sync route does
+            logger.error("Error saving to MongoDB: %s", e)
+        else:
+            task = asyncio.create_task(save_history(document))
+            state['tasks'].add(task)
+            task.add_done_callback(state['tasks'].discard)
+
+        if not recommendations:
+            return jsonify({
+                'status': 'success',
+                'message': 'No matches found. Please try different preferences.',
+                'recommendations': {'predictive': recommendations}
+            })
+        return jsonify({'status': 'success', 'recommendations': {'predictive': recommendations}})
+
+    return app
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run()
@@ -0,0 +1,330 @@
+"""Endpoint and model micro-benchmarks.
+
+Drives every route through the Flask test client against an in-process
+MongoDB stand-in (mongomock), so it runs offline. Models are trained into a
+temporary directory first; the timings of each model's train and predict are
+reported separately. For every endpoint the report has p50/p95/p99 latency
+and the memory allocated per request (tracemalloc, measured in a separate
+pass so tracing does not skew the latencies).
+
+Run from ``backend/`` (requires ``pip install mongomock``)::
+
+    python -m benchmarks.bench_endpoints [--iterations N] [--output FILE] [--compare BASELINE]
+
+Results are written as JSON to ``benchmarks/results/<commit>.json`` by
+default; ``--compare`` prints the p50/p95 ratio against an earlier result.
+"""
+from contextlib import redirect_stdout
+from datetime import datetime
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = 'dataset/Mati-City.csv'
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+PREFERENCE_COLUMNS = {
+    'destination_type': 'Destination_Type',
+    'travel_purpose': 'Travel_Purpose',
+    'travel_season': 'Travel_season',
+    'municipality': 'Municipality'
+}
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'mean_ms': round(float(samples.mean()), 4),
+        'samples': len(samples)
+    }
+
+
+def measure(call, iterations, alloc_iterations=None, warmup=3):
+    """Time call() iterations times, then trace the allocations of a few more calls"""
+    for _ in range(warmup):
+        call()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    result = percentiles(timings)
+
+    alloc_iterations = alloc_iterations or max(1, min(iterations, 20))
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    result['alloc_peak_bytes'] = int(np.mean(peaks))
+    result['alloc_retained_bytes'] = int(np.mean(retained))
+    return result
+
+
+def sample_preferences(catalog, count, seed=0):
+    """Preference sets drawn from catalog rows, with budgets around the row's budget"""
+    rng = np.random.default_rng(seed)
+    rows = catalog.frame().iloc[rng.integers(0, len(catalog), count)]
+    budgets = rows['Budget'] * rng.uniform(0.5, 1.5, count)
+    return [
+        {
+            **{key: str(row[column]) for key, column in PREFERENCE_COLUMNS.items()},
+            'budget': round(float(budget), 2),
+            'group_type': 'family',
+            'number_of_people': 2,
+            'trip_duration': 3
+        }
+        for (_, row), budget in zip(rows.iterrows(), budgets)
+    ]
+
+
+def ml_training_frame(catalog):
+    """The catalog in the column layout ml_model.train_model expects"""
+    frame = catalog.frame()[['Destination', 'Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']]
+    return frame.rename(columns={'Travel_season': 'Travel_Season'})
+
+
+def quietly(call):
+    """Run call with the models' training and prediction prints suppressed"""
+    with redirect_stdout(io.StringIO()):
+        return call()
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = quietly(call)
+    return result, round(time.perf_counter() - start, 4)
+
+
+def bench_catalog(catalog_dir, iterations):
+    """Parsing the CSV against memory-mapping the saved catalog"""
+    from catalog import Catalog, build_catalog
+
+    build_catalog(DATASET_PATH).save(catalog_dir)
+    return {
+        'build_from_csv': measure(lambda: build_catalog(DATASET_PATH), max(10, iterations // 10)),
+        'load_mmap': measure(lambda: Catalog.load(catalog_dir), iterations)
+    }
+
+
+def bench_models(catalog, model_dir, preferences, iterations):
+    """Train every model into model_dir and time train and predict in isolation"""
+    from ml_model import MlPipeline, train_model
+    from models.random_forest_model import TravelRecommendationModel
+    from rule_based_model import RuleBasedModel
+
+    results = {'catalog': bench_catalog(os.path.join(model_dir, 'catalog'), iterations)}
+    _, train_seconds = timed(lambda: TravelRecommendationModel(model_dir=model_dir).train(catalog))
+    forest = TravelRecommendationModel(model_dir=model_dir)
+    forest.load_model()
+    index = forest.get_destination_index(catalog)
+    cycle = iter_cycle(preferences)
+    results['random_forest'] = {
+        'train_s': train_seconds,
+        'predict': measure(lambda: forest.predict(next(cycle), catalog, index), iterations),
+        'predict_batch_100': measure(lambda: forest.predict_batch(preferences[:100], catalog, index), max(10, iterations // 10))
+    }
+    # The forest path, as served when the lookup table is missing or stale
+    compiled = TravelRecommendationModel(model_dir=model_dir)
+    compiled.load_model()
+    compiled.table = None
+    compiled.compiled = compiled.load_compiled()
+    compiled.label_encoders = joblib.load(compiled.encoders_path)
+    compiled.encoder = compiled.build_encoder()
+    results['random_forest']['predict_compiled_forest'] = measure(
+        lambda: compiled.predict(next(cycle), catalog, index), iterations
+    )
+
+    (model, label_encoders, scaler), train_seconds = timed(lambda: train_model(ml_training_frame(catalog)))
+    pipeline = MlPipeline(model, label_encoders, scaler, keep_model=True)
+    pipeline.save(os.path.join(model_dir, 'ml'))
+    results['ml'] = {'train_s': train_seconds, 'predict': measure(lambda: pipeline.predict(next(cycle)), iterations)}
+
+    try:
+        from models.xgboost_model import XGBoostTravelModel
+    except ImportError:
+        results['xgboost'] = {'skipped': 'xgboost is not installed'}
+    else:
+        xgboost_model = XGBoostTravelModel(model_dir=model_dir)
+        try:
+            _, train_seconds = timed(lambda: xgboost_model.train(catalog, cv_folds=0))
+        except Exception as e:
+            results['xgboost'] = {'error': str(e)}
+        else:
+            results['xgboost'] = {
+                'train_s': train_seconds,
+                'predict': measure(lambda: quietly(lambda: xgboost_model.predict(next(cycle), catalog)), iterations)
+            }
+
+    rule_based = RuleBasedModel()
+    _, load_seconds = timed(lambda: rule_based.load_data(catalog))
+    results['rule_based'] = {'train_s': load_seconds, 'predict': measure(lambda: rule_based.predict(next(cycle)), iterations)}
+    return results
+
+
+def iter_cycle(items):
+    while True:
+        yield from items
+
+
+def endpoint_cases(app_module, preferences):
+    """(name, method, path, request kwargs) for every route; POST bodies cycle through preferences"""
+    cycle = iter_cycle(preferences)
+    gzip = {'headers': {'Accept-Encoding': 'gzip'}}
+    etag = app_module.destinations_response.variant(None, 0, None).etags['identity']
+    return [
+        ('healthz', 'get', '/healthz', lambda: {}),
+        ('readyz', 'get', '/readyz', lambda: {}),
+        ('recommendations', 'post', '/api/recommendations', lambda: {'json': next(cycle)}),
+        ('recommendations_batch_50', 'post', '/api/recommendations/batch', lambda: {'json': preferences[:50]}),
+        ('recommendations_cache', 'get', '/api/recommendations/cache', lambda: {}),
+        ('recommendations_queue', 'get', '/api/recommendations/queue', lambda: {}),
+        ('destinations', 'get', '/api/destinations', lambda: {}),
+        ('destinations_gzip', 'get', '/api/destinations', lambda: gzip),
+        ('destinations_not_modified', 'get', '/api/destinations', lambda: {'headers': {'If-None-Match': f'"{etag}"'}}),
+        ('destinations_page', 'get', '/api/destinations?fields=Destination,Budget&limit=20', lambda: {}),
+        ('history', 'get', '/api/history', lambda: {}),
+        ('history_compact', 'get', '/api/history?include_recommendations=false&limit=50', lambda: {}),
+        ('ratings_post', 'post', '/api/ratings', lambda: {'json': {
+            'system_satisfaction_score': 4, 'analytics_satisfaction_score': 5
+        }}),
+        ('ratings', 'get', '/api/ratings', lambda: {}),
+        ('top_destinations', 'get', '/api/top-destinations', lambda: {}),
+        ('destination_types', 'get', '/api/destination-types', lambda: {}),
+        ('travel_seasons', 'get', '/api/travel-seasons', lambda: {}),
+        ('municipalities', 'get', '/api/municipalities', lambda: {}),
+        ('dashboard', 'get', '/api/dashboard', lambda: {}),
+        ('predict', 'post', '/api/predict', lambda: {'json': next(cycle)}),
+        ('models', 'get', '/api/models', lambda: {})
+    ]
+
+
+def bench_endpoints(app_module, preferences, iterations, history_size):
+    """Seed the stand-in database, then measure every route through the test client"""
+    app_module.recommendation_cache.clear()
+    client = app_module.app.test_client()
+    # Seed history (and its counters) and ratings through the routes themselves
+    for user_preferences in preferences[:history_size]:
+        client.post('/api/recommendations', json=user_preferences)
+        client.post('/api/ratings', json={'system_satisfaction_score': 4, 'analytics_satisfaction_score': 3})
+    app_module.write_spool.flush()
+
+    results = {}
+    for name, method, path, kwargs in endpoint_cases(app_module, preferences):
+        statuses = set()
+
+        def call():
+            response = getattr(client, method)(path, **kwargs())
+            response.get_data()
+            statuses.add(response.status_code)
+
+        results[name] = measure(call, iterations)
+        results[name]['status_codes'] = sorted(statuses)
+        logger.info("%s: p50 %sms, p95 %sms", name, results[name]['p50_ms'], results[name]['p95_ms'])
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the p50/p95 ratio of every measurement against a baseline result"""
+    def walk(current, previous, prefix=''):
+        for name, value in current.items():
+            if not isinstance(value, dict) or name not in previous:
+                continue
+            if 'p50_ms' in value and 'p50_ms' in previous[name]:
+                p50 = value['p50_ms'] / previous[name]['p50_ms'] if previous[name]['p50_ms'] else float('nan')
+                p95 = value['p95_ms'] / previous[name]['p95_ms'] if previous[name]['p95_ms'] else float('nan')
+                print(f"{prefix}{name:<40} p50 x{p50:.2f}  p95 x{p95:.2f}")
+            else:
+                walk(value, previous[name], f"{prefix}{name}.")
+
+    print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    walk(results, baseline)
+
+
+def run(iterations=200, history_size=200, output=None, baseline_path=None):
+    import mongomock
+
+    from catalog import load_catalog
+
+    catalog = load_catalog(DATASET_PATH)
+    preferences = sample_preferences(catalog, max(iterations, 100))
+    with tempfile.TemporaryDirectory() as model_dir:
+        logger.info("Training models into %s", model_dir)
+        models = bench_models(catalog, model_dir, preferences, iterations)
+
+        # MODEL_DIR and SPOOL_PATH are read at import, and the app must not warm up on its own
+        os.environ['MODEL_DIR'] = model_dir
+        os.environ['WARMUP_ON_IMPORT'] = 'false'
+        os.environ['SPOOL_PATH'] = os.path.join(model_dir, 'spool.db')
+        import app as app_module
+        logging.getLogger().setLevel(logging.WARNING)
+        app_module.initialize_models()
+        app_module.attach_database(mongomock.MongoClient()['travel_recommendations'])
+        app_module.startup.mark_ready('database')
+        endpoints = bench_endpoints(app_module, preferences, iterations, history_size)
+        app_module.write_spool.close()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': iterations,
+        'history_size': history_size,
+        'endpoints': endpoints,
+        'models': models
+    }
+    output = output or os.path.join(RESULTS_DIR, f"{results['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.warning("Saved benchmark results to %s", output)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(results, json.load(f))
+    return results
+
+
+def _option(name, default, cast=str):
+    args = sys.argv[1:]
+    return cast(args[args.index(name) + 1]) if name in args else default
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run(
+        iterations=_option('--iterations', 200, int),
+        history_size=_option('--history', 200, int),
+        output=_option('--output', None),
+        baseline_path=_option('--compare', None)
+    )
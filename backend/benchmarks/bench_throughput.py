@@ -0,0 +1,157 @@
+"""Throughput of the production server as the number of workers grows.
+
+For each worker count this starts ``gunicorn -c gunicorn.conf.py wsgi:app``
+on a local port, waits for ``/readyz`` to report the models as loaded, then
+drives it with client processes that each keep one HTTP/1.1 connection open
+and send requests back to back for a fixed duration. It reports requests
+per second, error count and p50/p99 latency per worker count, and saves
+the results as JSON next to the endpoint benchmarks.
+
+Run from ``backend/`` with gunicorn installed and trained models in
+``models/`` (MongoDB is optional; without it history is not saved)::
+
+    python -m benchmarks.bench_throughput [--workers 1,2,4,8] [--duration 15] [--clients 32]
+
+``--path`` picks the route (default ``/api/recommendations``, POSTing
+preference sets drawn from the catalog; GET routes such as
+``/api/destinations`` work too). Client processes compete with the server
+for CPU, so run them on a separate machine (``--url``) when measuring
+more workers than half the cores. ``--output`` overrides the JSON path.
+"""
+from multiprocessing import get_context
+import http.client
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from benchmarks.bench_endpoints import DATASET_PATH, RESULTS_DIR, git_commit, sample_preferences
+from catalog import load_catalog
+
+logger = logging.getLogger(__name__)
+
+
+def wait_until_ready(url, timeout=120):
+    parsed = urlparse(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=2)
+            connection.request('GET', '/readyz')
+            response = connection.getresponse()
+            body = json.loads(response.read() or b'{}')
+            if body.get('startup', {}).get('ready', {}).get('models'):
+                return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server at {url} did not load its models within {timeout}s")
+
+
+def client(url, path, bodies, duration):
+    """One keep-alive connection sending requests until duration elapses; returns latencies and errors"""
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    position = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if bodies:
+                body = bodies[position % len(bodies)]
+                position += 1
+                connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            else:
+                connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def drive(url, path, bodies, duration, clients):
+    context = get_context('spawn')
+    with context.Pool(clients) as pool:
+        results = pool.starmap(client, [(url, path, bodies[i::clients] or bodies, duration) for i in range(clients)])
+    latencies = np.concatenate([np.asarray(result[0]) for result in results]) * 1000
+    return {
+        'requests': int(len(latencies)),
+        'errors': int(sum(result[1] for result in results)),
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None
+    }
+
+
+def start_server(workers, port, threads):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+               BIND=f'127.0.0.1:{port}', LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env=env)
+
+
+def run(worker_counts, duration=15, clients=32, threads=4, path='/api/recommendations', port=8123, url=None, output=None):
+    bodies = [json.dumps(p) for p in sample_preferences(load_catalog(DATASET_PATH), 1000)] if path == '/api/recommendations' else []
+    results = []
+    for workers in worker_counts:
+        server = None if url else start_server(workers, port, threads)
+        target = url or f'http://127.0.0.1:{port}'
+        try:
+            wait_until_ready(target)
+            drive(target, path, bodies, min(3, duration), clients)  # warm-up
+            result = dict(drive(target, path, bodies, duration, clients), workers=workers, threads=threads)
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+        logger.info("%s workers: %s req/s, p50 %sms, p99 %sms, %s errors", workers, result['requests_per_second'], result['p50_ms'], result['p99_ms'], result['errors'])
+        results.append(result)
+
+    report = {
+        'commit': git_commit(),
+        'cpu_count': os.cpu_count(),
+        'path': path,
+        'duration_s': duration,
+        'clients': clients,
+        'results': results
+    }
+    output = output or os.path.join(RESULTS_DIR, f"throughput-{report['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info("Saved throughput results to %s", output)
+    return report
+
+
+def _option(name, default, cast=str):
+    args = sys.argv[1:]
+    return cast(args[args.index(name) + 1]) if name in args else default
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, max(1, cpus // 2), cpus})
+    run(
+        worker_counts=_option('--workers', default_workers, lambda value: [int(n) for n in value.split(',')]),
+        duration=_option('--duration', 15, int),
+        clients=_option('--clients', 32, int),
+        threads=_option('--threads', 4, int),
+        path=_option('--path', '/api/recommendations'),
+        url=_option('--url', None),
+        output=_option('--output', None)
+    )
@@ -0,0 +1,265 @@
+"""Typed, immutable destination catalog.
+
+``build_catalog`` parses ``dataset/Mati-City.csv`` once into typed columns:
+- the four categorical columns as int32 codes into sorted categories, the
+  same codes a ``LabelEncoder`` fitted on the column assigns;
+- ``Budget`` as float64, with the original text kept for display only;
+- an int32 destination id per row (the id history documents store);
+- pre-normalized (stripped, lowercased) destination and category keys.
+
+``Catalog.save`` writes every column as its own ``.npy`` file with a
+``manifest.json`` that records the SHA-256 of the CSV and of the column
+contents. ``load_catalog`` memory-maps the columns, so workers share one
+copy of the pages and skip CSV parsing. It rebuilds the files when they
+are missing or were built from a different CSV.
+
+Build (or rebuild) the catalog, or check its content hash (run from
+``backend/``)::
+
+    python catalog.py [--verify]
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from destination_index import destination_id, normalize_destination
+from feature_encoder import parse_budget
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.path.join('dataset', 'Mati-City.csv')
+CATALOG_DIR = os.path.join('dataset', 'catalog')
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+
+COLUMNS = ['Destination', 'Packing Tips', 'Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']
+CATEGORICAL_COLUMNS = ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_sha256(arrays):
+    """Hash of every array's name, dtype, shape and bytes"""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f'{name}:{array.dtype.str}:{array.shape};'.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class Catalog:
+    """Read-only typed columns of the destination catalog, one entry per CSV row"""
+
+    def __init__(self, arrays, source_sha256=None, fingerprint=None):
+        self.arrays = arrays
+        for array in arrays.values():
+            if array.flags.writeable:
+                array.flags.writeable = False
+        self.source_sha256 = source_sha256
+        self.fingerprint = fingerprint or content_sha256(arrays)
+        self.columns = list(COLUMNS)
+        self._first_rows = None
+
+    @classmethod
+    def from_frame(cls, df, source_sha256=None):
+        """Build from a DataFrame of the CSV read as strings"""
+        df = df.rename(columns=lambda column: str(column).strip())
+        budgets = []
+        for destination, value in zip(df['Destination'], df['Budget']):
+            try:
+                budgets.append(parse_budget(value))
+            except ValueError:
+                # Kept as NaN: such rows are never recommended by budget
+                logger.error("Unparseable budget %r for destination %s", value, destination)
+                budgets.append(np.nan)
+        destinations = [str(value) for value in df['Destination']]
+        arrays = {
+            'destination': np.array(destinations, dtype=str),
+            'destination_key': np.array([normalize_destination(value) for value in destinations], dtype=str),
+            'dest_id': np.array([destination_id(value) for value in destinations], dtype=np.int32),
+            'packing_tips': np.array([str(value) for value in df['Packing Tips']], dtype=str),
+            'budget': np.array(budgets, dtype=np.float64),
+            'budget_text': np.array([str(value) for value in df['Budget']], dtype=str)
+        }
+        for column in CATEGORICAL_COLUMNS:
+            # np.unique sorts, so the codes match a LabelEncoder fitted on the column
+            categories, codes = np.unique(np.array([str(value) for value in df[column]], dtype=str), return_inverse=True)
+            arrays[f'{column}.codes'] = codes.astype(np.int32)
+            arrays[f'{column}.categories'] = categories
+            arrays[f'{column}.keys'] = np.array([normalize_destination(value) for value in categories], dtype=str)
+        return cls(arrays, source_sha256=source_sha256)
+
+    def __len__(self):
+        return len(self.arrays['destination'])
+
+    @property
+    def destination(self):
+        return self.arrays['destination']
+
+    @property
+    def destination_key(self):
+        return self.arrays['destination_key']
+
+    @property
+    def dest_id(self):
+        return self.arrays['dest_id']
+
+    @property
+    def packing_tips(self):
+        return self.arrays['packing_tips']
+
+    @property
+    def budget(self):
+        return self.arrays['budget']
+
+    @property
+    def budget_text(self):
+        return self.arrays['budget_text']
+
+    def codes(self, column):
+        return self.arrays[f'{column}.codes']
+
+    def categories(self, column):
+        return self.arrays[f'{column}.categories']
+
+    def values(self, column):
+        """Per-row values of a categorical column"""
+        return self.categories(column)[self.codes(column)]
+
+    def keys(self, column):
+        """Per-row normalized values of a categorical column"""
+        return self.arrays[f'{column}.keys'][self.codes(column)]
+
+    def first_rows(self):
+        """Destination name -> its first catalog row"""
+        if self._first_rows is None:
+            first_rows = {}
+            for row, destination in enumerate(self.destination.tolist()):
+                first_rows.setdefault(destination, row)
+            self._first_rows = first_rows
+        return self._first_rows
+
+    def records(self):
+        """One dict per row, for the destination index and the rule-based model"""
+        columns = {
+            'destination': self.destination.tolist(),
+            'key': self.destination_key.tolist(),
+            'dest_id': self.dest_id.tolist(),
+            'packing_tips': self.packing_tips.tolist(),
+            'budget': self.budget_text.tolist(),
+            'budget_value': self.budget.tolist(),
+            'destination_type': self.values('Destination_Type').tolist(),
+            'travel_purpose': self.values('Travel_Purpose').tolist(),
+            'travel_season': self.values('Travel_season').tolist(),
+            'municipality': self.values('Municipality').tolist()
+        }
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def rows(self):
+        """Rows in CSV column order with the CSV's own text, e.g. the "1,500" budget"""
+        columns = [self.destination.tolist(), self.packing_tips.tolist(), self.budget_text.tolist()]
+        columns += [self.values(column).tolist() for column in CATEGORICAL_COLUMNS]
+        return list(zip(*columns))
+
+    def frame(self):
+        """A new DataFrame for training: float Budget and categorical dtypes; callers may modify it"""
+        import pandas as pd
+
+        data = {
+            'Destination': self.destination.tolist(),
+            'Packing Tips': self.packing_tips.tolist(),
+            'Budget': np.array(self.budget)
+        }
+        for column in CATEGORICAL_COLUMNS:
+            data[column] = pd.Categorical.from_codes(np.array(self.codes(column)), categories=self.categories(column).tolist())
+        return pd.DataFrame(data, columns=self.columns)
+
+    def save(self, path=CATALOG_DIR):
+        """Write the arrays, then the manifest; each file is replaced atomically"""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays.items():
+            target = os.path.join(path, f'{name}.npy')
+            with open(f'{target}.{os.getpid()}.tmp', 'wb') as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(f'{target}.{os.getpid()}.tmp', target)
+        manifest = {
+            'version': FORMAT_VERSION,
+            'rows': len(self),
+            'source_sha256': self.source_sha256,
+            'content_sha256': self.fingerprint,
+            'arrays': {name: {'dtype': array.dtype.str, 'shape': list(array.shape)} for name, array in self.arrays.items()}
+        }
+        target = os.path.join(path, MANIFEST_FILE)
+        with open(f'{target}.{os.getpid()}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f'{target}.{os.getpid()}.tmp', target)
+
+    @classmethod
+    def load(cls, path=CATALOG_DIR, mmap=True, verify=False):
+        """Load a saved catalog, memory-mapped by default so workers share it"""
+        manifest = read_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No catalog manifest in {path}")
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+            for name in manifest['arrays']
+        }
+        if verify and content_sha256(arrays) != manifest['content_sha256']:
+            raise ValueError(f"Catalog in {path} does not match its manifest's content hash")
+        return cls(arrays, source_sha256=manifest['source_sha256'], fingerprint=manifest['content_sha256'])
+
+
+def read_manifest(path=CATALOG_DIR):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == FORMAT_VERSION else None
+
+
+def build_catalog(csv_path=CSV_PATH):
+    """Parse the CSV into a Catalog"""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    return Catalog.from_frame(df, source_sha256=file_sha256(csv_path))
+
+
+def load_catalog(csv_path=CSV_PATH, path=CATALOG_DIR, mmap=True):
+    """The saved catalog, rebuilt and saved first if it is missing or the CSV has changed"""
+    source_sha256 = file_sha256(csv_path) if os.path.exists(csv_path) else None
+    manifest = read_manifest(path)
+    if manifest is not None and source_sha256 in (None, manifest['source_sha256']):
+        return Catalog.load(path, mmap=mmap)
+
+    logger.info("Building the catalog from %s", csv_path)
+    catalog = build_catalog(csv_path)
+    try:
+        catalog.save(path)
+    except OSError as e:
+        logger.warning("Could not save the catalog to %s, using it unsaved: %s", path, e)
+        return catalog
+    return Catalog.load(path, mmap=mmap)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if '--verify' in sys.argv[1:]:
+        catalog = Catalog.load(verify=True)
+        logger.info("Catalog matches its content hash %s", catalog.fingerprint)
+    else:
+        catalog = build_catalog()
+        catalog.save()
+        logger.info("Saved %s destinations to %s (content %s)", len(catalog), CATALOG_DIR, catalog.fingerprint)
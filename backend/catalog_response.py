@@ -0,0 +1,140 @@
+"""Pre-serialized ``/api/destinations`` responses.
+
+The catalog does not change between restarts, so each record is serialized
+once as per-field JSON fragments, using the CSV's own text for every field.
+Each projection joins them once into per-record segments, and response
+bodies are assembled from those segments with a strong ETag.
+
+The full catalog and whole-catalog projections are cached and compressed at
+the highest level, once per encoding a client asks for; the full catalog is
+compressed eagerly. Pages (``offset``/``limit``) are not cached: they are
+joined from the segments and compressed at a moderate level, only in the
+encoding the request negotiated.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import math
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_VARIANTS = 256
+# Compression levels for cached bodies (compressed once) and for pages (compressed per request)
+CACHED_LEVELS = {'gzip': 9, 'br': 11}
+PAGE_LEVELS = {'gzip': 5, 'br': 4}
+
+
+def _json_value(value):
+    # Missing CSV cells come back as NaN, which is not valid JSON
+    if isinstance(value, float) and math.isnan(value):
+        value = None
+    return json.dumps(value)
+
+
+def compress(body, encoding, level):
+    if encoding == 'gzip':
+        # mtime=0 keeps the bytes, and so the strong ETag, stable
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return body
+
+
+class CatalogVariant:
+    """One response body with its ETags; each encoding is compressed on first use"""
+
+    def __init__(self, body, levels=CACHED_LEVELS):
+        self.body = body
+        self.levels = levels
+        self._encoded = {'identity': body}
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # Strong ETags identify the exact bytes, so each encoding gets its own. Stored
+        # unquoted, as werkzeug compares them; Response.set_etag adds the quotes
+        self.etags = {
+            'identity': digest,
+            'gzip': f'{digest}-gz',
+            'br': f'{digest}-br'
+        }
+
+    def encoded(self, encoding):
+        data = self._encoded.get(encoding)
+        if data is None:
+            # Deterministic, so a concurrent duplicate compression stores the same bytes
+            data = self._encoded[encoding] = compress(self.body, encoding, self.levels[encoding])
+        return data
+
+
+class PreSerializedCatalog:
+    def __init__(self, catalog):
+        self.columns = list(catalog.columns)
+        self.records = [
+            {column: json.dumps(column) + ':' + _json_value(value) for column, value in zip(self.columns, row)}
+            for row in catalog.rows()
+        ]
+        self._segments = {}
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.full = self.variant()
+        self.full.encoded('gzip')
+        if brotli is not None:
+            self.full.encoded('br')
+        logger.info("Pre-serialized %s destinations (%s bytes, %s gzipped)",
+                    len(self.records), len(self.full.body), len(self.full.encoded('gzip')))
+
+    def resolve_fields(self, fields=None, exclude=None):
+        """Validate a projection; returns the selected columns in catalog order"""
+        selected = list(self.columns) if not fields else fields
+        unknown = [field for field in list(selected) + list(exclude or []) if field not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        excluded = set(exclude or [])
+        return tuple(column for column in self.columns if column in selected and column not in excluded)
+
+    def segments(self, fields):
+        """Serialized records of a projection, one JSON object string per record"""
+        segments = self._segments.get(fields)
+        if segments is None:
+            segments = ['{' + ','.join(record[field] for field in fields) + '}' for record in self.records]
+            with self._lock:
+                if len(self._segments) < MAX_CACHED_VARIANTS:
+                    self._segments[fields] = segments
+        return segments
+
+    def variant(self, fields=None, offset=0, limit=None):
+        """Response for a projection and page, built from the shared record segments"""
+        fields = tuple(fields) if fields else tuple(self.columns)
+        whole = offset == 0 and (limit is None or limit >= len(self.records))
+        if whole:
+            variant = self._variants.get(fields)
+            if variant is not None:
+                return variant
+
+        end = len(self.records) if limit is None else offset + limit
+        body = ''.join([
+            '{"status":"success","total":', str(len(self.records)), ',"destinations":[',
+            ','.join(self.segments(fields)[offset:end]),
+            ']}'
+        ]).encode()
+        if not whole:
+            return CatalogVariant(body, levels=PAGE_LEVELS)
+        variant = CatalogVariant(body)
+        with self._lock:
+            if len(self._variants) < MAX_CACHED_VARIANTS:
+                self._variants[fields] = variant
+        return variant
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick br, then gzip, then identity based on the request's Accept-Encoding"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return 'identity'
@@ -0,0 +1,60 @@
+"""Single-pass dashboard aggregation over the recommendation history.
+
+One aggregation counts recommendations per destination over
+``user_preferences``. ``build_dashboard`` then derives the top destinations
+and the destination type, travel season and municipality distributions from
+the destination records, so a dashboard render scans the history once and
+never carries destination text through the pipeline.
+
+This replaces the earlier ``$facet`` over the unwound recommendations:
+compact history documents no longer contain the destination type, season or
+municipality, so faceting server-side would need a ``$lookup`` into
+``destinations_dim`` per render. The per-destination groups are at most one
+per catalog destination, so folding them into the four facets here is cheap.
+"""
+from datetime import datetime
+
+from analytics_counters import count_destination_groups
+from history import destination_count_stages
+
+
+def parse_window_bound(value):
+    """Parse an ISO-8601 ``since``/``until`` query parameter; empty means unbounded"""
+    if not value:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1]
+    return datetime.fromisoformat(value)
+
+
+def dashboard_pipeline(since=None, until=None):
+    """Aggregation pipeline returning ``{'_id': dest_id or name, 'count': n}`` per destination"""
+    pipeline = []
+    window = {}
+    if since is not None:
+        window['$gte'] = since
+    if until is not None:
+        window['$lt'] = until
+    if window:
+        pipeline.append({"$match": {"created_at": window}})
+    return pipeline + destination_count_stages()
+
+
+def _ranked(counts, dimension, count_key, limit=None):
+    items = sorted(
+        ((key, count) for (name, key), count in counts.items() if name == dimension),
+        key=lambda item: -item[1]
+    )
+    return [{'name': key, count_key: count} for key, count in items[:limit]]
+
+
+def build_dashboard(groups, destinations, top_limit=5):
+    """All four dashboard facets from the per-destination counts"""
+    counts = count_destination_groups(groups, destinations)
+    return {
+        'top_destinations': _ranked(counts, 'destination', 'recommendations', top_limit),
+        'destination_types': _ranked(counts, 'destination_type', 'value'),
+        'travel_seasons': _ranked(counts, 'travel_season', 'value'),
+        'municipalities': _ranked(counts, 'municipality', 'value')
+    }
+
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_destination(name):
+    """Normalize a destination name for case-insensitive lookups"""
+    return str(name).strip().lower()
+
+
+def destination_id(name):
+    """Stable 31-bit id of a destination name, identical in every process"""
+    digest = hashlib.blake2b(normalize_destination(name).encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFF
+
+
+class DestinationIndex:
+    """Destination -> catalog row lookup built once from the catalog.
+
+    Lookups try the stripped name first and fall back to the case-insensitive
+    key, mirroring the exact-then-lowercase matching the endpoint used to do
+    with DataFrame scans. The first catalog row wins for each name, like
+    ``.iloc[0]`` did.
+    """
+
+    def __init__(self, catalog):
+        self.exact = {}
+        self.normalized = {}
+        for record in catalog.records():
+            self.exact.setdefault(record['destination'].strip(), record)
+            self.normalized.setdefault(record['key'], record)
+        logger.info("Built destination index with %s destinations", len(self.exact))
+
+    def get(self, destination):
+        """Return the catalog record for a destination, or None if unknown"""
+        record = self.exact.get(str(destination).strip())
+        if record is None:
+            record = self.normalized.get(normalize_destination(destination))
+        return record
+
+    def add_packing_tips(self, recommendations):
+        """Ensure each recommendation has a destination field and its packing tips"""
+        enriched = []
+        for rec in recommendations:
+            destination = rec.get('destination', rec.get('Destination', 'Unknown Destination'))
+            dest_data = self.get(destination)
+            packing_tips = dest_data['packing_tips'] if dest_data is not None else 'No packing tips available for this destination'
+            logger.debug("Destination: %s, found matching data: %s, packing tips: %s", destination, dest_data is not None, packing_tips)
+            enriched.append({
+                **rec,
+                'destination': destination,
+                'packing_tips': packing_tips
+            })
+        return enriched
+
+    def __contains__(self, destination):
+        return self.get(destination) is not None
+
+    def __len__(self):
+        return len(self.exact)
@@ -0,0 +1,122 @@
+"""Shared feature encoding for every prediction path.
+
+A ``FeatureEncoder`` is compiled once from a model's fitted label encoders
+and budget scaler. It turns request preferences into a NumPy row with plain
+dict lookups and two float operations per row, instead of one
+``LabelEncoder.transform`` call per column on a one-row DataFrame.
+"""
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Unknown-category policies
+UNKNOWN_DEFAULT = 'default'  # encode as default_code (0), as the models always did
+UNKNOWN_ERROR = 'error'      # raise UnknownCategoryError
+
+
+class UnknownCategoryError(ValueError):
+    pass
+
+
+def parse_budget(value):
+    """Parse a request or catalog budget such as "1,500" into a float"""
+    return float(str(value).replace(',', ''))
+
+
+class FeatureEncoder:
+    def __init__(self, feature_columns, categories, preference_keys, budget_column='Budget',
+                 budget_mean=0.0, budget_scale=1.0, unknown=UNKNOWN_DEFAULT, default_code=0):
+        """
+        feature_columns: model input columns, in order
+        categories: column -> ordered category values (code = position)
+        preference_keys: column -> key in the request preferences
+        """
+        self.feature_columns = list(feature_columns)
+        self.preference_keys = dict(preference_keys)
+        self.budget_column = budget_column
+        self.budget_position = self.feature_columns.index(budget_column)
+        self.budget_key = self.preference_keys.get(budget_column, 'budget')
+        self.budget_mean = float(budget_mean)
+        self.budget_scale = float(budget_scale) or 1.0
+        self.unknown = unknown
+        self.default_code = default_code
+        self.categorical = [
+            (self.feature_columns.index(column), column, self.preference_keys[column],
+             {value: code for code, value in enumerate(list(values))})
+            for column, values in categories.items()
+        ]
+        self.unknown_counts = {column: 0 for column in categories}
+        self._local = threading.local()
+
+    @classmethod
+    def from_label_encoders(cls, feature_columns, label_encoders, preference_keys, scaler=None, **kwargs):
+        """Compile from fitted LabelEncoders and an optional StandardScaler or {'mean', 'std'} dict"""
+        categories = {column: encoder.classes_.tolist() for column, encoder in label_encoders.items()}
+        if scaler is None:
+            mean, scale = 0.0, 1.0
+        elif isinstance(scaler, dict):
+            mean, scale = scaler['mean'], scaler['std']
+        else:
+            mean, scale = scaler.mean_[0], scaler.scale_[0]
+        return cls(feature_columns, categories, preference_keys, budget_mean=mean, budget_scale=scale, **kwargs)
+
+    @property
+    def width(self):
+        return len(self.feature_columns)
+
+    def code(self, column, codes, value):
+        # An exact match first: some training categories carry whitespace ('Beach ')
+        code = codes.get(value)
+        if code is None:
+            code = codes.get(str(value).strip())
+        if code is None:
+            if self.unknown == UNKNOWN_ERROR:
+                raise UnknownCategoryError(f"{column} value not found in training data: {value!r}")
+            self.unknown_counts[column] += 1
+            logger.warning("%s value not found in training data. Using default value.", column)
+            return self.default_code
+        return code
+
+    def encode_into(self, preferences, out):
+        """Write one encoded row into out (a 1-D float64 array of length width)"""
+        out[self.budget_position] = (parse_budget(preferences[self.budget_key]) - self.budget_mean) / self.budget_scale
+        for position, column, key, codes in self.categorical:
+            out[position] = self.code(column, codes, preferences.get(key, ''))
+        return out
+
+    def encode(self, preferences):
+        """Encode one preference set into this thread's preallocated (1, width) row.
+
+        The row is reused by the next call on the same thread; copy it to keep it.
+        """
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.zeros((1, self.width), dtype=np.float64)
+        self.encode_into(preferences, row[0])
+        return row
+
+    def encode_many(self, list_of_preferences):
+        """Encode N preference sets into a new (N, width) array"""
+        n = len(list_of_preferences)
+        X = np.empty((n, self.width), dtype=np.float64)
+        budgets = np.fromiter((parse_budget(p[self.budget_key]) for p in list_of_preferences), np.float64, n)
+        X[:, self.budget_position] = (budgets - self.budget_mean) / self.budget_scale
+        for position, column, key, codes in self.categorical:
+            X[:, position] = np.fromiter(
+                (self.code(column, codes, p.get(key, '')) for p in list_of_preferences), np.float64, n
+            )
+        return X
+
+    def lookup(self, column, value, missing=-1):
+        """Exact code of value in column, or missing; no stripping and no unknown policy"""
+        for _, name, _, codes in self.categorical:
+            if name == column:
+                return codes.get(value, missing)
+        raise KeyError(column)
+
+    def codes(self, preferences):
+        """Category codes only, in categorical column order"""
+        return tuple(self.code(column, codes, preferences.get(key, '')) for _, column, key, codes in self.categorical)
@@ -0,0 +1,43 @@
+"""Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Every setting can be overridden from the environment:
+
+- ``BIND`` (default ``0.0.0.0:$PORT``, port 5000)
+- ``WEB_CONCURRENCY``: worker processes (default: one per CPU)
+- ``GUNICORN_THREADS``: threads per worker (default 4)
+- ``MAX_REQUESTS`` / ``MAX_REQUESTS_JITTER``: recycle a worker after this
+  many requests, staggered so workers do not restart together
+- ``GUNICORN_TIMEOUT`` / ``GRACEFUL_TIMEOUT``: seconds
+
+Metrics and cache/spool stats are per worker; ``/metrics`` reports only the
+worker that answered (see the README's Production Serving section).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Load the catalog and models once in the master and share them copy-on-write
+preload_app = True
+
+# Graceful recycling: finish in-flight requests, then replace the worker
+max_requests = int(os.getenv('MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+
+def post_fork(server, worker):
+    # MongoClient is not fork-safe: each worker connects (and starts its spool replayer) itself
+    import app as application
+    application.start_worker()
+    server.log.info("Worker %s started", worker.pid)
+
+
+def worker_exit(server, worker):
+    import app as application
+    application.write_spool.close()
@@ -0,0 +1,249 @@
+"""Recommendation history documents stored in ``user_preferences``.
+
+History is stored in a compact form. Each document keeps the request inputs
+as typed scalars (the budget as a number) and the recommendations as parallel ``dest_ids`` and
+``scores`` arrays, so pair ``i`` is ``(dest_ids[i], scores[i])``. Destination
+attributes (name, type, season, municipality, budget, packing tips) live
+once per destination in the ``destinations_dim`` collection, keyed by the
+same integer id. ``expand_history`` rebuilds the recommendations
+``/api/history`` returns. Documents saved before the compact schema are
+returned unchanged.
+
+The categorical inputs are kept as their (stripped) strings, not as model
+codes: label-encoder codes are reassigned whenever a model is retrained or
+hot-swapped, so stored codes would silently change meaning, and the
+analytics counters group on the strings.
+
+A destination's id is derived from its normalized name, so every process
+computes the same id without asking MongoDB. This also works while MongoDB
+is down and writes go to the spool.
+
+Convert existing history to the compact schema (run from ``backend/``)::
+
+    python history.py --migrate [--batch-size 500]
+"""
+from datetime import datetime
+import logging
+import os
+import sys
+
+from pymongo import ReplaceOne, UpdateOne
+
+from destination_index import DestinationIndex, destination_id, normalize_destination
+from feature_encoder import parse_budget
+
+logger = logging.getLogger(__name__)
+
+DIMENSION_COLLECTION = 'destinations_dim'
+DIMENSION_FIELDS = ['destination', 'budget', 'destination_type', 'travel_purpose', 'travel_season', 'municipality', 'packing_tips']
+NO_PACKING_TIPS = 'No packing tips available for this destination'
+# Leaves out the recommendations of both schemas
+SUMMARY_PROJECTION = {'dest_ids': 0, 'scores': 0, 'recommendations': 0}
+# Indexes on the embedded recommendations of the old schema
+LEGACY_INDEXES = [
+    'recommendations.destination_1',
+    'recommendations.destination_type_1',
+    'recommendations.travel_season_1',
+    'recommendations.municipality_1'
+]
+
+
+class DestinationDimension:
+    """dest_id -> destination attributes, the in-memory copy of ``destinations_dim``"""
+
+    def __init__(self):
+        self.records = {}
+
+    def add(self, record):
+        """Register a destination record; returns its id. The first record for a name wins"""
+        dest_id = destination_id(record['destination'])
+        existing = self.records.get(dest_id)
+        if existing is None:
+            self.records[dest_id] = {field: record.get(field) for field in DIMENSION_FIELDS}
+        elif normalize_destination(existing['destination']) != normalize_destination(record['destination']):
+            raise ValueError(f"Destination id collision: {existing['destination']!r} and {record['destination']!r}")
+        return dest_id
+
+    def add_catalog(self, destination_index):
+        for record in destination_index.normalized.values():
+            self.add(record)
+        return self
+
+    def load(self, documents):
+        """Add records read from destinations_dim that are not known yet"""
+        for document in documents:
+            self.records.setdefault(document['_id'], {field: document.get(field) for field in DIMENSION_FIELDS})
+        return self
+
+    def get(self, dest_id):
+        return self.records.get(dest_id)
+
+    def lookup(self, key):
+        """Record for a dest_id, or for a destination name embedded in an old-schema document"""
+        if isinstance(key, str):
+            return self.records.get(destination_id(key)) or {'destination': key}
+        return self.records.get(key, {})
+
+    def missing(self, documents):
+        """Whether any of the documents references an id this dimension does not know"""
+        return any(dest_id not in self.records for document in documents for dest_id in document.get('dest_ids', ()))
+
+    def upserts(self):
+        return [ReplaceOne({'_id': dest_id}, {'_id': dest_id, **record}, upsert=True) for dest_id, record in self.records.items()]
+
+    def __len__(self):
+        return len(self.records)
+
+
+def sync_dimension(collection, dimension):
+    """Upsert the known destinations into destinations_dim and load the ones only it has"""
+    upserts = dimension.upserts()
+    if upserts:
+        collection.bulk_write(upserts, ordered=False)
+    dimension.load(collection.find())
+    return dimension
+
+
+def _count(value, default=1):
+    """An optional integer input; anything unparseable is stored as the default"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def history_document(user_preferences, recommendations):
+    """The compact history document saved for one recommendation request.
+
+    Raises ValueError if the budget cannot be parsed; the models reject such requests too.
+    """
+    return {
+        'budget': parse_budget(user_preferences['budget']),
+        'destination_type': str(user_preferences['destination_type']).strip(),
+        'travel_season': str(user_preferences['travel_season']).strip(),
+        'travel_purpose': str(user_preferences['travel_purpose']).strip(),
+        'municipality': str(user_preferences.get('municipality', '')).strip(),
+        'group_type': str(user_preferences.get('group_type', '')).strip(),
+        'number_of_people': _count(user_preferences.get('number_of_people', 1)),
+        'trip_duration': _count(user_preferences.get('trip_duration', 1)),
+        'dest_ids': [destination_id(rec.get('destination', rec.get('Destination'))) for rec in recommendations],
+        'scores': [float(rec.get('similarity_score', 0.0)) for rec in recommendations],
+        'created_at': datetime.utcnow()
+    }
+
+
+def recommendation_records(document, dimension):
+    """Destination attributes of every recommendation in a history document, either schema"""
+    if 'dest_ids' in document:
+        return [dimension.get(dest_id) or {} for dest_id in document['dest_ids']]
+    return document.get('recommendations', [])
+
+
+def expand_recommendation(record, score):
+    """The recommendation as the API returned it, from its dimension record"""
+    destination = record.get('destination', 'Unknown Destination')
+    packing_tips = record.get('packing_tips') if 'packing_tips' in record else NO_PACKING_TIPS
+    return {
+        'destination': destination,
+        'Destination': destination,
+        'budget': record.get('budget'),
+        'destination_type': record.get('destination_type'),
+        'travel_purpose': record.get('travel_purpose'),
+        'travel_season': record.get('travel_season'),
+        'municipality': record.get('municipality'),
+        'similarity_score': score,
+        'packing_tips': packing_tips
+    }
+
+
+def expand_history(document, dimension):
+    """Rebuild the embedded recommendations of a compact history document in place"""
+    if 'dest_ids' in document:
+        dest_ids = document.pop('dest_ids')
+        scores = document.pop('scores', [None] * len(dest_ids))
+        document['recommendations'] = [
+            expand_recommendation(dimension.get(dest_id) or {}, score) for dest_id, score in zip(dest_ids, scores)
+        ]
+    else:
+        # Either an old-schema document or a summary projection
+        document.pop('scores', None)
+    return document
+
+
+def destination_count_stages():
+    """Pipeline stages counting recommendations per destination in either schema.
+
+    Groups on the dest_id of compact documents and on the embedded name of
+    old ones; ``DestinationDimension.lookup`` resolves both.
+    """
+    return [
+        {"$project": {"_id": 0, "key": {"$ifNull": ["$dest_ids", "$recommendations.destination"]}}},
+        {"$unwind": "$key"},
+        {"$group": {"_id": "$key", "count": {"$sum": 1}}}
+    ]
+
+
+def compact_update(document, dimension):
+    """Update converting one old-schema history document; adds unknown destinations to dimension"""
+    dest_ids, scores = [], []
+    for rec in document.get('recommendations', []):
+        name = rec.get('destination', rec.get('Destination', 'Unknown Destination'))
+        dest_ids.append(dimension.add({**rec, 'destination': name}))
+        scores.append(float(rec.get('similarity_score', 0.0)))
+    fields = {'dest_ids': dest_ids, 'scores': scores}
+    if isinstance(document.get('budget'), str):
+        fields['budget'] = parse_budget(document['budget'])
+    # Matching on the old field keeps the update idempotent if the migration is re-run
+    return UpdateOne(
+        {'_id': document['_id'], 'recommendations': {'$exists': True}},
+        {'$set': fields, '$unset': {'recommendations': ''}}
+    )
+
+
+def migrate(history_collection, dimension_collection, dimension, batch_size=500):
+    """Convert every old-schema history document; safe to interrupt and re-run"""
+    query = {'recommendations': {'$exists': True}}
+    migrated = 0
+    last_id = None
+    sync_dimension(dimension_collection, dimension)
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        documents = list(history_collection.find(batch_query).sort('_id', 1).limit(batch_size))
+        if not documents:
+            break
+        known = len(dimension)
+        updates = [compact_update(document, dimension) for document in documents]
+        # Destinations first, so no compact document references an id missing from the dimension
+        if len(dimension) > known:
+            sync_dimension(dimension_collection, dimension)
+        migrated += history_collection.bulk_write(updates, ordered=False).modified_count
+        last_id = documents[-1]['_id']
+        logger.info("Migrated %s history documents", migrated)
+
+    existing = set(history_collection.index_information())
+    for name in LEGACY_INDEXES:
+        if name in existing:
+            history_collection.drop_index(name)
+            logger.info("Dropped index %s", name)
+    logger.info("Migrated %s history documents; %s destinations in %s", migrated, len(dimension), dimension_collection.name)
+    return migrated
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from catalog import load_catalog
+
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if '--migrate' not in args:
+        print(__doc__)
+        sys.exit(1)
+    batch_size = int(args[args.index('--batch-size') + 1]) if '--batch-size' in args else 500
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    db = client['travel_recommendations']
+    dimension = DestinationDimension().add_catalog(DestinationIndex(load_catalog()))
+    migrate(db['user_preferences'], db[DIMENSION_COLLECTION], dimension, batch_size=batch_size)
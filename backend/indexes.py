@@ -0,0 +1,24 @@
+"""Index management for the collections the API queries.
+
+Called once at startup; ``create_index`` is a no-op for indexes that already
+exist, so every worker can run it safely.
+"""
+import logging
+
+from pymongo import DESCENDING
+
+from analytics_counters import ensure_counter_indexes
+
+logger = logging.getLogger(__name__)
+
+# Keyset pagination sorts on (created_at, _id), newest first
+CREATED_AT_KEYSET = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+
+def ensure_indexes(db, counters_collection_name):
+    user_preferences = db['user_preferences']
+    user_preferences.create_index(CREATED_AT_KEYSET, name='created_at_keyset')
+
+    db['ratings'].create_index(CREATED_AT_KEYSET, name='created_at_keyset')
+    ensure_counter_indexes(db[counters_collection_name])
+    logger.info("Ensured MongoDB indexes")
@@ -0,0 +1,164 @@
+"""Queue-based structured logging.
+
+``configure_logging`` gives the root logger a single ``QueueHandler``. A
+``QueueListener`` thread formats records as JSON lines and writes them, so
+request threads never wait on log I/O. On the request thread a record costs
+a level check, the sampling decision and, only if it is kept, one
+``%``-format of its message; callers pass payloads as arguments
+(``logger.debug("Preferences: %s", prefs)``) so nothing is rendered for
+records that are filtered out.
+
+Records below WARNING can be sampled per endpoint (``LOG_SAMPLE_RATES``,
+e.g. ``/api/recommendations=0.1``). Levels and rates can be changed at
+runtime through ``set_levels``/``set_sample_rates`` (``/api/logging``).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime
+
+from metrics import current_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'endpoint'}
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+def parse_sample_rates(value):
+    """'/api/a=0.1,/api/b=0.5' -> {'/api/a': 0.1, '/api/b': 0.5}"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            endpoint, rate = item.rsplit('=', 1)
+            rates[endpoint.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class EndpointSampler(logging.Filter):
+    """Tag records with the current endpoint and keep a sample of the sub-WARNING ones"""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        record.endpoint = current_endpoint()
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.endpoint, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Render the message of kept records only; formatting and I/O happen in the listener"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record, including any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+            'endpoint': getattr(record, 'endpoint', None)
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, sample_rates=None, structured=None, stream=None):
+    """Route all logging through a queue to a background writer; safe to call more than once"""
+    global _listener, _handler
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    sample_rates = sample_rates if sample_rates is not None else parse_sample_rates(os.getenv('LOG_SAMPLE_RATES'))
+    structured = structured if structured is not None else os.getenv('LOG_FORMAT', 'json').lower() == 'json'
+    with _lock:
+        root = logging.getLogger()
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        if _handler is not None:
+            _handler.filters[0].rates = dict(sample_rates)
+            return _handler
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(StructuredFormatter() if structured else logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(endpoint)s] %(message)s'
+        ))
+        log_queue = queue.SimpleQueue()
+        _handler = LazyQueueHandler(log_queue)
+        _handler.addFilter(EndpointSampler(sample_rates))
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        # A forked child (e.g. a gunicorn worker) does not inherit the writer thread
+        os.register_at_fork(after_in_child=_restart_listener)
+        return _handler
+
+
+def _restart_listener():
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_levels(levels):
+    """{'': 'DEBUG', 'pymongo': 'WARNING'} -> applied immediately; '' or 'root' is the root logger"""
+    for name, level in levels.items():
+        level = level.upper() if isinstance(level, str) else level
+        if isinstance(level, str) and not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+        logging.getLogger(None if name in ('', 'root') else name).setLevel(level)
+        logger.warning("Log level of %s set to %s", name or 'root', level)
+
+
+def set_sample_rates(rates):
+    if _handler is None:
+        raise RuntimeError("Logging is not configured")
+    _handler.filters[0].rates = {endpoint: min(1.0, max(0.0, float(rate))) for endpoint, rate in rates.items()}
+
+
+def logging_status():
+    root = logging.getLogger()
+    levels = {'root': logging.getLevelName(root.level)}
+    for name, item in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(item, logging.Logger) and item.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(item.level)
+    return {
+        'levels': levels,
+        'sample_rates': dict(_handler.filters[0].rates) if _handler is not None else {},
+        'queued': _listener.queue.qsize() if _listener is not None else 0
+    }
@@ -0,0 +1,201 @@
+"""In-process metrics with a Prometheus text exposition.
+
+Request latency and in-flight requests come from the middleware installed by
+``install(app)``. Handlers and models time their parts with ``stage(name)``.
+MongoDB command timings come from ``MongoCommandTimer``, a pymongo command
+listener. Components with a ``stats()`` dict (cache, write-behind queue) are
+read at scrape time through ``stats_collector``. Observing a value costs one
+``perf_counter`` call, a bisect and a short lock, so the instrumentation can
+stay on in production. ``render()`` produces the ``/metrics`` body.
+
+Values live in the process that records them. Under gunicorn each worker has
+its own, so a scrape sees only the worker that answered it (see README).
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+from pymongo import monitoring
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+_local = threading.local()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [f'{self.name}{_labels(self.labelnames, labels)} {value}' for labels, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = {labels: list(series) for labels, series in self._values.items()}
+        lines = self.header()
+        names = self.labelnames + ('le',)
+        for labels, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route', ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled', ('endpoint',))
+STAGE_SECONDS = Histogram('request_stage_duration_seconds', 'Time spent in named stages of a request', ('endpoint', 'stage'))
+MONGO_SECONDS = Histogram('mongodb_command_duration_seconds', 'MongoDB command latency', ('command', 'outcome'))
+
+
+def current_endpoint():
+    return getattr(_local, 'endpoint', 'none')
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a named stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, current_endpoint(), name)
+
+
+def install(app):
+    """Time every request and count in-flight requests per route"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        _local.endpoint = endpoint
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = endpoint
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+
+    @app.after_request
+    def observe_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, g.metrics_endpoint, request.method, str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def finish_request(exception=None):
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is not None:
+            REQUESTS_IN_FLIGHT.dec(endpoint)
+        _local.endpoint = 'none'
+
+
+def register_collector(collector):
+    """collector() yields (name, kind, documentation, value) tuples at scrape time"""
+    _collectors.append(collector)
+
+
+def stats_collector(prefix, stats, counters=()):
+    """Expose a stats() dict: keys in counters as <prefix>_<key>_total, numeric others as gauges"""
+    def collect():
+        values = stats()
+        if values is None:
+            return
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in counters:
+                yield f'{prefix}_{key}_total', 'counter', f'{prefix} {key}', value
+            else:
+                yield f'{prefix}_{key}', 'gauge', f'{prefix} {key}', value
+    return collect
+
+
+def render():
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, documentation, value in collector():
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Record the duration pymongo reports for every command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name, 'success')
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name, 'failure')
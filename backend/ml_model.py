@@ -5,6 +5,88 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
 import joblib
+import os
+from feature_encoder import FeatureEncoder, UNKNOWN_ERROR
+from models.forest_compiler import check_parity, compile_forest, threshold_inputs
+from metrics import stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+# File names of the /api/predict pipeline inside a model directory
+ML_MODEL_FILES = {
+    'model': 'random_forest_model.joblib',
+    'label_encoders': 'label_encoders.joblib',
+    'scaler': 'scaler.joblib'
+}
+
+ML_FEATURE_COLUMNS = ['Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_Season', 'Municipality']
+ML_PREFERENCE_KEYS = {
+    'Budget': 'budget',
+    'Destination_Type': 'destination_type',
+    'Travel_Purpose': 'travel_purpose',
+    'Travel_Season': 'travel_season',
+    'Municipality': 'municipality'
+}
+
+def build_encoder(model, label_encoders, scaler, preference_keys=ML_PREFERENCE_KEYS):
+    """Compile the /api/predict feature encoder; unknown categories raise, as LabelEncoder did"""
+    feature_columns = list(getattr(model, 'feature_names_in_', ML_FEATURE_COLUMNS))
+    return FeatureEncoder.from_label_encoders(
+        feature_columns, label_encoders, preference_keys, scaler=scaler, unknown=UNKNOWN_ERROR
+    )
+
+class MlPipeline:
+    """The /api/predict classifier together with its label encoders and scaler"""
+    def __init__(self, model, label_encoders, scaler, keep_model=False):
+        self.label_encoders = label_encoders
+        self.scaler = scaler
+        self.encoder = build_encoder(model, label_encoders, scaler)
+        # Serve from the array-based forest when the model is a Random Forest, and drop the
+        # sklearn estimator so the worker holds one copy (keep_model=True keeps it for save)
+        self.compiled = compile_forest(model) if hasattr(model, 'estimators_') else None
+        if self.compiled is not None:
+            try:
+                check_parity(model, self.compiled, threshold_inputs(model))
+            except AssertionError as e:
+                logger.warning("Compiled forest does not match sklearn, serving from sklearn: %s", e)
+                self.compiled = None
+        self.model = model if self.compiled is None or keep_model else None
+    
+    @classmethod
+    def load(cls, directory):
+        """Load the pipeline from directory; raises FileNotFoundError naming the missing file"""
+        paths = {name: os.path.join(directory, filename) for name, filename in ML_MODEL_FILES.items()}
+        for path in paths.values():
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model file not found: {path}")
+        return cls(**{name: joblib.load(path) for name, path in paths.items()})
+    
+    @property
+    def classes_(self):
+        return self.compiled.classes if self.compiled is not None else self.model.classes_
+    
+    def predict_proba(self, preferences):
+        """Class probabilities for one preference set (request keys, e.g. 'budget')"""
+        with stage('model.encode'):
+            X = self.encoder.encode(preferences)
+        with stage('model.predict_proba'):
+            if self.compiled is not None:
+                return self.compiled.predict_proba(X)[0]
+            return self.model.predict_proba(pd.DataFrame(X, columns=self.encoder.feature_columns))[0]
+    
+    def predict(self, preferences):
+        """Return (destination, confidence) from a single predict_proba call"""
+        probabilities = self.predict_proba(preferences)
+        best = int(np.argmax(probabilities))
+        return str(self.classes_[best]), float(probabilities[best])
+    
+    def save(self, directory):
+        if self.model is None:
+            raise ValueError("The sklearn model was released after compiling; build with keep_model=True to save")
+        os.makedirs(directory, exist_ok=True)
+        for name, filename in ML_MODEL_FILES.items():
+            joblib.dump(getattr(self, name), os.path.join(directory, filename))
 
 def preprocess_data(df):
     """
@@ -60,21 +142,16 @@ def train_model(df):
     
     return rf_model, label_encoders, scaler
 
-def predict_destination(model, label_encoders, scaler, input_data):
+def predict_destination(model, label_encoders, scaler, input_data, encoder=None):
     """
     Make a prediction for a new input
     """
-    # Create a DataFrame with the input data
-    input_df = pd.DataFrame([input_data])
-    
-    # Encode categorical variables
-    for column, encoder in label_encoders.items():
-        input_df[column] = encoder.transform(input_df[column])
-    
-    # Scale numerical features
-    input_df['Budget'] = scaler.transform(input_df[['Budget']])
+    # input_data uses the model's column names, so they double as preference keys
+    if encoder is None:
+        encoder = build_encoder(model, label_encoders, scaler, {column: column for column in input_data})
     
     # Make prediction
+    input_df = pd.DataFrame(encoder.encode(input_data), columns=encoder.feature_columns)
     prediction = model.predict(input_df)
     
     return prediction[0]
@@ -1,52 +1,33 @@
 from flask import Blueprint, request, jsonify
-import joblib
-import pandas as pd
-from ml_model import predict_destination
+from model_registry import registry, ModelNotAvailable
 
 ml_bp = Blueprint('ml', __name__)
 
-# Load the saved model and encoders
-try:
-    model = joblib.load('random_forest_model.joblib')
-    label_encoders = joblib.load('label_encoders.joblib')
-    scaler = joblib.load('scaler.joblib')
-except FileNotFoundError:
-    print("Warning: Model files not found. Please train the model first.")
-    model = None
-    label_encoders = None
-    scaler = None
-
 @ml_bp.route('/api/predict', methods=['POST'])
 def predict():
-    if model is None or label_encoders is None or scaler is None:
+    # The registry loads the pipeline once per process and hot-swaps new versions
+    try:
+        pipeline = registry.get('ml')
+    except ModelNotAvailable as e:
         return jsonify({
             'status': 'error',
-            'message': 'Model not trained yet. Please train the model first.'
-        }), 500
+            'message': f'Model not trained yet. Please train the model first. ({str(e)})'
+        }), 503
 
     try:
         data = request.get_json()
         
         # Extract features from request
-        input_data = {
-            'Budget': float(data.get('budget', 0)),
-            'Destination_Type': data.get('destination_type', ''),
-            'Travel_Purpose': data.get('travel_purpose', ''),
-            'Travel_Season': data.get('travel_season', ''),
-            'Municipality': data.get('municipality', '')
+        preferences = {
+            'budget': data.get('budget', 0),
+            'destination_type': data.get('destination_type', ''),
+            'travel_purpose': data.get('travel_purpose', ''),
+            'travel_season': data.get('travel_season', ''),
+            'municipality': data.get('municipality', '')
         }
 
-        # Make prediction
-        prediction = predict_destination(model, label_encoders, scaler, input_data)
-
-        # Get prediction probabilities
-        input_df = pd.DataFrame([input_data])
-        for column, encoder in label_encoders.items():
-            input_df[column] = encoder.transform(input_df[column])
-        input_df['Budget'] = scaler.transform(input_df[['Budget']])
-        
-        probabilities = model.predict_proba(input_df)[0]
-        confidence_score = max(probabilities)
+        # Label and confidence come from the same probability vector
+        prediction, confidence_score = pipeline.predict(preferences)
 
         return jsonify({
             'status': 'success',
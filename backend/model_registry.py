@@ -0,0 +1,178 @@
+"""Process-wide registry of the prediction models.
+
+Every model is loaded once per process and shared by all blueprints through
+``registry.get(name)``. Releasing a retrained model means copying its
+artifacts to ``models/releases/<version>/`` (same file names as in
+``models/``) and calling ``registry.swap(name, version)``, exposed as
+``POST /api/models/<name>/swap``.
+
+A swap loads the new version completely before publishing it with a single
+reference assignment. The old model keeps serving while the new one loads,
+and stays published if the load fails (the loader raises for artifacts it
+cannot use), so a bad release never takes the model away. Requests that
+already hold the old model finish with it, and new requests get the new
+one. Both copies are resident during the load. Loads are serialized. Only
+``current`` and the directories listed by ``versions()`` can be loaded.
+
+Listeners added with ``on_swap`` are called with every newly published
+handle, e.g. to mark the app ready after a swap fixed a failed start.
+"""
+from datetime import datetime
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROOT = os.getenv('MODEL_DIR', 'models')
+CURRENT_VERSION = 'current'
+
+
+class ModelNotAvailable(Exception):
+    pass
+
+
+class ModelHandle:
+    """An immutable (model, version) pair; swapping replaces the whole handle"""
+
+    def __init__(self, name, version, model, directory):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.directory = directory
+        self.loaded_at = datetime.utcnow()
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'directory': self.directory,
+            'loaded_at': self.loaded_at.isoformat()
+        }
+
+
+class ModelRegistry:
+    def __init__(self, root=MODEL_ROOT):
+        self.root = root
+        self._loaders = {}
+        self._handles = {}
+        self._errors = {}
+        self._load_lock = threading.Lock()
+        self._listeners = []
+
+    def register(self, name, loader):
+        """loader(directory) returns a ready model or raises"""
+        self._loaders[name] = loader
+
+    def on_swap(self, listener):
+        """listener(handle) is called after each successful load"""
+        self._listeners.append(listener)
+
+    def directory(self, version):
+        """Directory of a known version; raises ModelNotAvailable for anything else"""
+        if version == CURRENT_VERSION:
+            return self.root
+        # Only plain release names: a version must never reach outside models/releases
+        if (not isinstance(version, str) or version in ('', '.', '..') or os.sep in version
+                or (os.altsep and os.altsep in version) or version not in self.versions()):
+            raise ModelNotAvailable(f"Model version not found: {version!r}")
+        return os.path.join(self.root, 'releases', version)
+
+    def versions(self):
+        releases = os.path.join(self.root, 'releases')
+        available = [CURRENT_VERSION]
+        if os.path.isdir(releases):
+            available += sorted(entry for entry in os.listdir(releases) if os.path.isdir(os.path.join(releases, entry)))
+        return available
+
+    def handle(self, name):
+        """The live handle, loading the current version on first use"""
+        handle = self._handles.get(name)
+        if handle is None:
+            handle = self.swap(name, CURRENT_VERSION, only_if_missing=True)
+        return handle
+
+    def get(self, name):
+        return self.handle(name).model
+
+    def peek(self, name):
+        """The live model, or None if it has not been loaded; never triggers a load"""
+        handle = self._handles.get(name)
+        return handle.model if handle is not None else None
+
+    def swap(self, name, version=CURRENT_VERSION, only_if_missing=False):
+        """Load a version and publish it atomically; returns the new handle.
+
+        Raises ModelNotAvailable, leaving the published handle in place, if
+        the version cannot be loaded.
+        """
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        with self._load_lock:
+            if only_if_missing and name in self._handles:
+                return self._handles[name]
+            directory = self.directory(version)
+            if not os.path.isdir(directory):
+                raise ModelNotAvailable(f"Model version not found: {directory}")
+            try:
+                model = self._loaders[name](directory)
+            except Exception as e:
+                self._errors[name] = str(e)
+                current = self._handles.get(name)
+                logger.error("Failed to load %s version %s, still serving %s: %s",
+                             name, version, current.version if current is not None else 'nothing', e)
+                raise ModelNotAvailable(f"Failed to load {name} version {version}: {str(e)}")
+            handle = ModelHandle(name, version, model, directory)
+            # A single reference assignment publishes the new model to every thread
+            self._handles[name] = handle
+            self._errors.pop(name, None)
+            logger.info("Loaded %s version %s from %s", name, version, directory)
+        for listener in self._listeners:
+            try:
+                listener(handle)
+            except Exception as e:
+                logger.error("Swap listener failed for %s: %s", name, e)
+        return handle
+
+    def status(self):
+        return {
+            name: {
+                'loaded': self._handles[name].describe() if name in self._handles else None,
+                'error': self._errors.get(name)
+            }
+            for name in self._loaders
+        }
+
+
+def _load_random_forest(directory):
+    from models.random_forest_model import TravelRecommendationModel
+
+    model = TravelRecommendationModel(model_dir=directory)
+    model.load_model()
+    if not model.is_loaded():
+        raise ModelNotAvailable(f"No Random Forest artifacts in {directory}")
+    return model
+
+
+def _load_ml_pipeline(directory):
+    from ml_model import MlPipeline
+
+    ml_directory = os.path.join(directory, 'ml')
+    if not os.path.isdir(ml_directory) and directory == MODEL_ROOT and os.path.exists('scaler.joblib'):
+        # Older deployments kept the /api/predict artifacts in the working directory
+        ml_directory = '.'
+    return MlPipeline.load(ml_directory)
+
+
+def _load_xgboost(directory):
+    from models.xgboost_model import XGBoostTravelModel
+
+    model = XGBoostTravelModel(model_dir=directory)
+    model.load_model()
+    return model
+
+
+registry = ModelRegistry()
+registry.register('random_forest', _load_random_forest)
+registry.register('ml', _load_ml_pipeline)
+registry.register('xgboost', _load_xgboost)
@@ -0,0 +1,203 @@
+"""Array-based inference engine for the Random Forest.
+
+``compile_forest`` flattens every estimator of a fitted
+``RandomForestClassifier`` into contiguous node arrays (feature, threshold,
+children and normalized leaf class distributions). ``CompiledForest``
+walks all trees for all rows at once with NumPy, without sklearn's input
+validation or per-tree dispatch. Its probabilities equal sklearn's up to
+floating-point rounding (sklearn may sum the trees in another order);
+``check_parity`` enforces ``PARITY_TOLERANCE``.
+
+The arrays are saved as one ``.npy`` file each so workers can memory-map
+them and share the pages. Compile the saved forest and check parity
+against sklearn (run from ``backend/``)::
+
+    python -m models.forest_compiler
+"""
+import logging
+import os
+import sys
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COMPILED_DIR = 'random_forest_compiled'
+COMPILED_PATH = os.path.join('models', COMPILED_DIR)
+# Largest absolute probability difference from sklearn that check_parity accepts
+PARITY_TOLERANCE = 1e-9
+ARRAYS = ['roots', 'feature', 'threshold', 'left', 'right', 'leaf_index', 'leaf_values', 'classes']
+
+
+class CompiledForest:
+    def __init__(self, roots, feature, threshold, left, right, leaf_index, leaf_values, classes, fingerprint=None):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.classes = classes
+        self.fingerprint = fingerprint
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Global leaf node id reached in every tree, shape (n_rows, n_trees)"""
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        while True:
+            left = self.left[nodes]
+            active = left >= 0
+            if not active.any():
+                return nodes
+            # sklearn compares the float32 input with the float64 threshold
+            values = X[rows, np.where(active, self.feature[nodes], 0)]
+            go_left = values <= self.threshold[nodes]
+            nodes = np.where(active, np.where(go_left, left, self.right[nodes]), nodes)
+
+    def predict_proba(self, X):
+        """Class probabilities for an (n_rows, n_features) array, as sklearn computes them"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        leaves = self.leaf_index[self.apply(X)]
+        proba = np.zeros((X.shape[0], self.leaf_values.shape[1]), dtype=np.float64)
+        # Same tree order and summation as RandomForestClassifier.predict_proba
+        for tree in range(self.n_trees):
+            proba += self.leaf_values[leaves[:, tree]]
+        proba /= self.n_trees
+        return proba
+
+    def save(self, path=COMPILED_PATH):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        if self.fingerprint is not None:
+            with open(os.path.join(path, 'fingerprint'), 'w') as f:
+                f.write(self.fingerprint)
+
+    @classmethod
+    def load(cls, path=COMPILED_PATH, mmap=True):
+        """Load the node arrays, memory-mapped by default so workers share them"""
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+            for name in ARRAYS
+        }
+        fingerprint_path = os.path.join(path, 'fingerprint')
+        if os.path.exists(fingerprint_path):
+            with open(fingerprint_path) as f:
+                arrays['fingerprint'] = f.read().strip()
+        return cls(**arrays)
+
+
+def compile_forest(forest):
+    """Flatten a fitted RandomForestClassifier into a CompiledForest"""
+    roots, features, thresholds, lefts, rights, leaf_indices, leaf_values = [], [], [], [], [], [], []
+    node_offset = 0
+    leaf_offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(node_offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, -1, tree.children_left + node_offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + node_offset))
+
+        # DecisionTreeClassifier.predict_proba normalizes each leaf's values
+        values = tree.value[is_leaf, 0, :forest.n_classes_]
+        normalizer = values.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        leaf_values.append(values / normalizer)
+
+        index = np.full(tree.node_count, -1, dtype=np.int32)
+        index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+        leaf_indices.append(index)
+
+        node_offset += tree.node_count
+        leaf_offset += int(is_leaf.sum())
+
+    return CompiledForest(
+        roots=np.array(roots, dtype=np.int32),
+        feature=np.concatenate(features).astype(np.int32),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(np.int32),
+        right=np.concatenate(rights).astype(np.int32),
+        leaf_index=np.concatenate(leaf_indices),
+        leaf_values=np.ascontiguousarray(np.concatenate(leaf_values), dtype=np.float64),
+        classes=np.asarray(forest.classes_).astype(str)
+    )
+
+
+def check_parity(forest, compiled, X):
+    """Compare compiled and sklearn probabilities; returns the largest absolute difference"""
+    import pandas as pd
+
+    X = np.asarray(X, dtype=np.float64)
+    expected = forest.predict_proba(pd.DataFrame(X, columns=getattr(forest, 'feature_names_in_', None)))
+    actual = compiled.predict_proba(X)
+    if expected.shape != actual.shape:
+        raise AssertionError(f"Shape mismatch: sklearn {expected.shape}, compiled {actual.shape}")
+    if not np.array_equal(np.asarray(forest.classes_).astype(str), compiled.classes):
+        raise AssertionError("Class order differs from the forest")
+    difference = float(np.abs(expected - actual).max()) if expected.size else 0.0
+    if difference > PARITY_TOLERANCE:
+        raise AssertionError(f"Compiled forest differs from sklearn by up to {difference}")
+    return difference
+
+
+def threshold_inputs(forest, n_rows=500, seed=0):
+    """Rows whose every feature sits on, or just above, one of the forest's split thresholds on it"""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, forest.n_features_in_), dtype=np.float64)
+    for feature in range(forest.n_features_in_):
+        thresholds = np.unique(np.concatenate(
+            [estimator.tree_.threshold[estimator.tree_.feature == feature] for estimator in forest.estimators_]
+        ))
+        candidates = np.concatenate([[0.0], thresholds, np.nextafter(thresholds, np.inf)])
+        X[:, feature] = rng.choice(candidates, n_rows)
+    return X
+
+
+def parity_inputs(forest, label_encoders, feature_columns, n_random=2000, seed=0):
+    """Random rows over the encoded input space plus every budget split threshold"""
+    from models.recommendation_table import CATEGORICAL_COLUMNS, budget_thresholds
+
+    rng = np.random.default_rng(seed)
+    budget_index = feature_columns.index('Budget')
+    thresholds = budget_thresholds(forest, budget_index)
+    budgets = np.concatenate([rng.uniform(0, 10000, n_random), thresholds, np.nextafter(thresholds, np.inf)])
+    X = np.empty((len(budgets), len(feature_columns)), dtype=np.float64)
+    X[:, budget_index] = budgets
+    for column in CATEGORICAL_COLUMNS:
+        X[:, feature_columns.index(column)] = rng.integers(0, len(label_encoders[column].classes_), len(budgets))
+    return X
+
+
+def compile_saved_forest(model_path=None, encoders_path=None, compiled_path=COMPILED_PATH, check=True):
+    """Compile the saved forest, check parity against sklearn, and save the arrays"""
+    from models.recommendation_table import MODEL_PATH, ENCODERS_PATH, artifact_fingerprint
+    from models.random_forest_model import TravelRecommendationModel
+
+    model_path = model_path or MODEL_PATH
+    forest = joblib.load(model_path)
+    compiled = compile_forest(forest)
+    compiled.fingerprint = artifact_fingerprint(model_path)
+    if check:
+        label_encoders = joblib.load(encoders_path or ENCODERS_PATH)
+        X = parity_inputs(forest, label_encoders, TravelRecommendationModel().feature_columns)
+        check_parity(forest, compiled, X)
+        logger.info("Compiled forest matches sklearn on %s rows", len(X))
+    compiled.save(compiled_path)
+    logger.info("Saved compiled forest (%s nodes, %s leaves) to %s", len(compiled.feature), len(compiled.leaf_values), compiled_path)
+    return compiled
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    compile_saved_forest(check='--no-check' not in sys.argv[1:])
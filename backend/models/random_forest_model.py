@@ -1,32 +1,62 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
 import joblib
 import os
+import itertools
+import logging
+from destination_index import DestinationIndex
+from feature_encoder import FeatureEncoder, parse_budget
+from metrics import stage
+from models.forest_compiler import CompiledForest, check_parity, compile_forest, threshold_inputs, COMPILED_DIR
+from models.recommendation_table import (
+    RecommendationTable, artifact_fingerprint, top_k_indices, CATEGORICAL_COLUMNS, MODEL_DIR, MODEL_FILE, ENCODERS_FILE,
+    TABLE_FILE, TABLE_VERSION
+)
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counter so every trained or loaded model gets a distinct generation
+_generations = itertools.count(1)
+
+PREFERENCE_KEYS = ['destination_type', 'travel_purpose', 'travel_season', 'municipality']
+FEATURE_KEYS = dict(zip(['Budget'] + CATEGORICAL_COLUMNS, ['budget'] + PREFERENCE_KEYS))
 
 class TravelRecommendationModel:
-    def __init__(self):
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.model_path = os.path.join(model_dir, MODEL_FILE)
+        self.encoders_path = os.path.join(model_dir, ENCODERS_FILE)
+        self.table_path = os.path.join(model_dir, TABLE_FILE)
+        self.compiled_path = os.path.join(model_dir, COMPILED_DIR)
         self.model = None
+        self.table = None
+        self.compiled = None
+        self.generation = None
         self.label_encoders = {}
+        self.encoder = None
         self.feature_columns = ['Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']
+        self.destination_index = None
+        self._indexed_catalog = None
         
-    def preprocess_data(self, df):
-        """Preprocess the data for training"""
-        # Create label encoders for categorical features
-        for column in ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']:
-            self.label_encoders[column] = LabelEncoder()
-            df[column] = self.label_encoders[column].fit_transform(df[column])
+    def preprocess_data(self, catalog):
+        """Training frame with the catalog's category codes and numeric budget"""
+        # sklearn is only needed for training; keep it off the serving import path
+        from sklearn.preprocessing import LabelEncoder
         
-        # Convert Budget to numeric
-        df['Budget'] = df['Budget'].str.replace(',', '').astype(float)
+        df = catalog.frame()
+        # The catalog codes are the ones a LabelEncoder fitted on each column assigns
+        for column in CATEGORICAL_COLUMNS:
+            self.label_encoders[column] = LabelEncoder().fit(np.array(catalog.categories(column).tolist(), dtype=object))
+            df[column] = catalog.codes(column).astype(np.int64)
         
         return df
     
-    def train(self, df):
+    def train(self, catalog):
         """Train the Random Forest model"""
+        from sklearn.ensemble import RandomForestClassifier
+        
         # Preprocess the data
-        processed_df = self.preprocess_data(df.copy())
+        processed_df = self.preprocess_data(catalog)
         
         # Prepare features and target
         X = processed_df[self.feature_columns]
@@ -42,66 +72,180 @@ class TravelRecommendationModel:
         
         # Save the model and encoders
         self.save_model()
+        self.compiled = compile_forest(self.model)
+        # Never save a compiled forest that would serve different answers
+        check_parity(self.model, self.compiled, threshold_inputs(self.model))
+        self.compiled.fingerprint = artifact_fingerprint(self.model_path)
+        self.compiled.save(self.compiled_path)
+        self.build_table()
+        self.encoder = self.build_encoder()
+        self.generation = next(_generations)
+    
+    def build_table(self):
+        """Precompute the top-5 lookup table for the trained forest and save it"""
+        self.table = RecommendationTable.build(self.model, self.label_encoders, self.feature_columns)
+        self.table.fingerprint = artifact_fingerprint(self.model_path)
+        self.table.save(self.table_path)
+        
+    def build_encoder(self):
+        """Compile the feature encoder from the table categories or the label encoders"""
+        if self.table is not None:
+            categories = {column: self.table.categories[column].tolist() for column in CATEGORICAL_COLUMNS}
+        else:
+            categories = {column: self.label_encoders[column].classes_.tolist() for column in CATEGORICAL_COLUMNS}
+        return FeatureEncoder(self.feature_columns, categories, FEATURE_KEYS)
         
-    def predict(self, user_preferences, df):
+    def is_loaded(self):
+        return self.table is not None or self.compiled is not None or self.model is not None
+    
+    def predict_proba(self, X):
+        """Class probabilities for encoded rows, from the compiled forest when available"""
+        if self.compiled is not None:
+            return self.compiled.predict_proba(X)
+        return self.model.predict_proba(pd.DataFrame(X, columns=self.feature_columns))
+    
+    @property
+    def classes_(self):
+        return self.compiled.classes if self.compiled is not None else self.model.classes_
+    
+    def get_destination_index(self, catalog):
+        """Return the destination index for catalog, building it only when the catalog changes"""
+        if self.destination_index is None or self._indexed_catalog is not catalog:
+            self.destination_index = DestinationIndex(catalog)
+            self._indexed_catalog = catalog
+        return self.destination_index
+    
+    def predict(self, user_preferences, catalog, destination_index=None):
         """Make predictions based on user preferences"""
-        if self.model is None:
+        if not self.is_loaded():
+            self.load_model()
+        if destination_index is None:
+            destination_index = self.get_destination_index(catalog)
+        
+        if self.table is not None:
+            with stage('model.lookup'):
+                top_destinations, scores = self.table.lookup_codes(
+                    self.encoder.codes(user_preferences), parse_budget(user_preferences['budget'])
+                )
+        else:
+            with stage('model.forest'):
+                # Get predictions
+                predictions = self.predict_proba(self.encoder.encode(user_preferences))
+                
+                # Get top 5 destinations
+                top_indices = top_k_indices(predictions[0], 5)
+                top_destinations = self.classes_[top_indices]
+                scores = predictions[0][top_indices]
+        
+        with stage('model.build_recommendations'):
+            return self._build_recommendations(top_destinations, scores, destination_index)
+    
+    def encode_batch(self, list_of_preferences):
+        """Encode N preference sets into an (N, n_features) array in feature_columns order"""
+        return self.encoder.encode_many(list_of_preferences)
+    
+    def predict_batch(self, list_of_preferences, catalog, destination_index=None, k=5):
+        """Make predictions for many preference sets with a single model evaluation"""
+        if not self.is_loaded():
             self.load_model()
+        if destination_index is None:
+            destination_index = self.get_destination_index(catalog)
+        if not list_of_preferences:
+            return []
+        
+        X = self.encode_batch(list_of_preferences)
+        
+        if self.table is not None:
+            codes = X[:, [self.feature_columns.index(column) for column in CATEGORICAL_COLUMNS]].astype(np.intp)
+            top_destinations, scores = self.table.lookup_many(codes, X[:, self.feature_columns.index('Budget')])
+            top_destinations, scores = top_destinations[:, :k], scores[:, :k]
+        else:
+            predictions = self.predict_proba(X)
+            
+            # Same ranking as predict, so a batch row matches the single call
+            top_indices = top_k_indices(predictions, k)
+            scores = np.take_along_axis(predictions, top_indices, axis=1)
+            top_destinations = self.classes_[top_indices]
         
-        # Preprocess user preferences
-        input_data = pd.DataFrame([{
-            'Budget': float(user_preferences['budget']),
-            'Destination_Type': user_preferences['destination_type'],
-            'Travel_Purpose': user_preferences['travel_purpose'],
-            'Travel_season': user_preferences['travel_season'],
-            'Municipality': user_preferences['municipality']
-        }])
-        
-        # Transform categorical features
-        for column in ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']:
-            try:
-                input_data[column] = self.label_encoders[column].transform([input_data[column].iloc[0]])[0]
-            except ValueError as e:
-                # If the value is not in the encoder's classes, use the most common class
-                input_data[column] = 0
-                print(f"Warning: {column} value not found in training data. Using default value.")
-        
-        # Get predictions
-        predictions = self.model.predict_proba(input_data)
-        
-        # Get top 5 destinations
-        top_indices = np.argsort(predictions[0])[-5:][::-1]
-        top_destinations = self.model.classes_[top_indices]
-        
-        # Get full destination details
+        return [
+            self._build_recommendations(row_destinations, row_scores, destination_index)
+            for row_destinations, row_scores in zip(top_destinations, scores)
+        ]
+    
+    def _build_recommendations(self, top_destinations, scores, destination_index):
+        """Get full destination details for the ranked destinations"""
         recommendations = []
-        for dest in top_destinations:
-            dest_data = df[df['Destination'] == dest].iloc[0]
+        for dest, score in zip(top_destinations, scores):
+            dest_data = destination_index.get(dest)
             recommendations.append({
-                'destination': dest_data['Destination'],
-                'Destination': dest_data['Destination'],
-                'budget': dest_data['Budget'],
-                'destination_type': dest_data['Destination_Type'],
-                'travel_purpose': dest_data['Travel_Purpose'],
-                'travel_season': dest_data['Travel_season'],
-                'municipality': dest_data['Municipality'],
-                'similarity_score': float(predictions[0][np.where(self.model.classes_ == dest)[0][0]])
+                'destination': dest_data['destination'],
+                'Destination': dest_data['destination'],
+                'budget': dest_data['budget'],
+                'destination_type': dest_data['destination_type'],
+                'travel_purpose': dest_data['travel_purpose'],
+                'travel_season': dest_data['travel_season'],
+                'municipality': dest_data['municipality'],
+                'similarity_score': float(score)
             })
         
         return recommendations
     
     def save_model(self):
         """Save the model and encoders"""
-        if not os.path.exists('models'):
-            os.makedirs('models')
+        if not os.path.exists(self.model_dir):
+            os.makedirs(self.model_dir)
         
-        joblib.dump(self.model, 'models/random_forest_model.joblib')
-        joblib.dump(self.label_encoders, 'models/label_encoders.joblib')
+        joblib.dump(self.model, self.model_path)
+        joblib.dump(self.label_encoders, self.encoders_path)
+    
+    def load_table(self):
+        """Load the precomputed lookup table, unless it was built from another forest"""
+        if not os.path.exists(self.table_path):
+            return None
+        table = RecommendationTable.load(self.table_path)
+        if os.path.exists(self.model_path) and table.fingerprint != artifact_fingerprint(self.model_path):
+            logger.warning("Recommendation table does not match the saved model. Falling back to the forest.")
+            return None
+        if table.version != TABLE_VERSION:
+            logger.warning("Recommendation table uses another ranking; rebuild it with python -m models.recommendation_table. "
+                           "Falling back to the forest.")
+            return None
+        return table
+    
+    def load_compiled(self):
+        """Load the memory-mapped compiled forest, unless it was built from another forest"""
+        if not os.path.isdir(self.compiled_path):
+            return None
+        compiled = CompiledForest.load(self.compiled_path)
+        if os.path.exists(self.model_path) and compiled.fingerprint != artifact_fingerprint(self.model_path):
+            logger.warning("Compiled forest does not match the saved model. Falling back to sklearn.")
+            return None
+        return compiled
     
     def load_model(self):
-        """Load the saved model and encoders"""
+        """Load the lookup table if it is current, otherwise the compiled or saved model and encoders"""
+        self.table = self.load_table()
+        if self.table is not None:
+            self.encoder = self.build_encoder()
+            self.generation = next(_generations)
+            return
         try:
-            self.model = joblib.load('models/random_forest_model.joblib')
-            self.label_encoders = joblib.load('models/label_encoders.joblib')
+            self.compiled = self.load_compiled()
+            if self.compiled is None:
+                self.model = joblib.load(self.model_path)
+            self.label_encoders = joblib.load(self.encoders_path)
         except:
-            raise Exception("Model not found. Please train the model first.") 
\ No newline at end of file
+            raise Exception("Model not found. Please train the model first.")
+        self.encoder = self.build_encoder()
+        self.generation = next(_generations)
+    
+    def cache_key(self, user_preferences):
+        """Normalized inputs that fully determine the output of predict"""
+        if not self.is_loaded():
+            self.load_model()
+        budget = parse_budget(user_preferences['budget'])
+        if self.table is not None:
+            # Every budget in the same interval gets the same answer from the table
+            budget = self.table.budget_bucket(budget)
+        # Unstripped: 'Beach' and 'Beach ' are separate training categories and encode differently
+        return (budget,) + tuple(str(user_preferences.get(key, '')) for key in PREFERENCE_KEYS)
\ No newline at end of file
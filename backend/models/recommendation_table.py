@@ -0,0 +1,199 @@
+"""Precomputed top-k lookup table for the Random Forest recommender.
+
+The forest only ever sees four label-encoded categoricals and a budget, and a
+tree can only change its answer where the budget crosses one of its split
+thresholds. Evaluating ``predict_proba`` once per categorical combination and
+per budget interval therefore captures every answer the forest can give, and
+a request becomes a handful of array lookups.
+
+Build the table from the saved forest (run from ``backend/``)::
+
+    python -m models.recommendation_table
+"""
+import hashlib
+import itertools
+import logging
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']
+MODEL_DIR = 'models'
+MODEL_FILE = 'random_forest_model.joblib'
+ENCODERS_FILE = 'label_encoders.joblib'
+TABLE_FILE = 'random_forest_table.npz'
+# Bumped when the stored ordering changes; older tables are ignored until rebuilt
+TABLE_VERSION = 3
+MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILE)
+ENCODERS_PATH = os.path.join(MODEL_DIR, ENCODERS_FILE)
+TABLE_PATH = os.path.join(MODEL_DIR, TABLE_FILE)
+
+
+def artifact_fingerprint(path):
+    """SHA-256 of a model file, used to detect a table built from another forest"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def top_k_indices(probabilities, k):
+    """Indices of the k highest probabilities, best first.
+
+    The last k of an ascending argsort, reversed, as the recommender has
+    always ranked; among tied probabilities the later class comes first.
+    Every ranking path (the table, single and batch forest predictions) uses
+    this, and each row is sorted on its own, so the same input is ranked the
+    same way on each of them.
+    """
+    return np.argsort(probabilities, axis=-1)[..., ::-1][..., :k]
+
+
+def budget_thresholds(forest, feature_index):
+    """Sorted unique split thresholds the forest uses on the budget feature"""
+    thresholds = [
+        estimator.tree_.threshold[estimator.tree_.feature == feature_index]
+        for estimator in forest.estimators_
+    ]
+    return np.unique(np.concatenate(thresholds)) if thresholds else np.array([], dtype=np.float64)
+
+
+def budget_grid(thresholds):
+    """One representative budget for each interval between split thresholds.
+
+    Trees send ``x <= threshold`` left, so bucket ``i`` covers
+    ``(thresholds[i - 1], thresholds[i]]``, which is what
+    ``np.searchsorted(thresholds, x, side='left')`` returns.
+    """
+    if len(thresholds) == 0:
+        return np.array([0.0])
+    midpoints = (thresholds[:-1] + thresholds[1:]) / 2
+    return np.concatenate([[thresholds[0] - 1], midpoints, [thresholds[-1] + 1]])
+
+
+class RecommendationTable:
+    """Top-k destinations for every (categoricals, budget bucket) cell"""
+
+    def __init__(self, classes, categories, thresholds, top_classes, top_scores, fingerprint=None, version=TABLE_VERSION):
+        self.classes = classes
+        self.categories = categories
+        self.thresholds = thresholds
+        self.top_classes = top_classes
+        self.top_scores = top_scores
+        self.fingerprint = fingerprint
+        self.version = version
+
+    @property
+    def k(self):
+        return self.top_classes.shape[-1]
+
+    @classmethod
+    def build(cls, forest, label_encoders, feature_columns, k=5, chunk_size=64):
+        """Evaluate the forest over the full input grid and keep the top k per cell"""
+        budget_index = feature_columns.index('Budget')
+        thresholds = budget_thresholds(forest, budget_index)
+        grid = budget_grid(thresholds)
+        categories = {column: np.asarray(label_encoders[column].classes_) for column in CATEGORICAL_COLUMNS}
+        sizes = [len(categories[column]) for column in CATEGORICAL_COLUMNS]
+        k = min(k, len(forest.classes_))
+
+        combos = np.array(list(itertools.product(*[range(size) for size in sizes])), dtype=np.float64)
+        top_classes = np.empty((len(combos), len(grid), k), dtype=np.int16)
+        top_scores = np.empty((len(combos), len(grid), k), dtype=np.float64)
+        column_positions = [feature_columns.index(column) for column in CATEGORICAL_COLUMNS]
+
+        logger.info("Building recommendation table: %s combinations x %s budget buckets", len(combos), len(grid))
+        for start in range(0, len(combos), chunk_size):
+            chunk = combos[start:start + chunk_size]
+            X = np.empty((len(chunk) * len(grid), len(feature_columns)), dtype=np.float64)
+            X[:, budget_index] = np.tile(grid, len(chunk))
+            for position, values in zip(column_positions, chunk.T):
+                X[:, position] = np.repeat(values, len(grid))
+
+            probabilities = forest.predict_proba(pd.DataFrame(X, columns=feature_columns))
+            top = top_k_indices(probabilities, k)
+            scores = np.take_along_axis(probabilities, top, axis=1)
+            top_classes[start:start + len(chunk)] = top.reshape(len(chunk), len(grid), k)
+            top_scores[start:start + len(chunk)] = scores.reshape(len(chunk), len(grid), k)
+
+        shape = tuple(sizes) + (len(grid), k)
+        return cls(
+            classes=np.asarray(forest.classes_).astype(str),
+            categories=categories,
+            thresholds=thresholds,
+            top_classes=top_classes.reshape(shape),
+            top_scores=top_scores.reshape(shape)
+        )
+
+    def save(self, path=TABLE_PATH):
+        """Write the table as an uncompressed .npz next to the forest"""
+        arrays = {
+            'classes': self.classes.astype(str),
+            'thresholds': self.thresholds,
+            'top_classes': self.top_classes,
+            'top_scores': self.top_scores,
+            'version': np.array(self.version)
+        }
+        for column in CATEGORICAL_COLUMNS:
+            arrays[f'categories_{column}'] = self.categories[column].astype(str)
+        if self.fingerprint is not None:
+            arrays['fingerprint'] = np.array(self.fingerprint)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=TABLE_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                classes=data['classes'],
+                categories={column: data[f'categories_{column}'] for column in CATEGORICAL_COLUMNS},
+                thresholds=data['thresholds'],
+                top_classes=data['top_classes'],
+                top_scores=data['top_scores'],
+                fingerprint=str(data['fingerprint']) if 'fingerprint' in data.files else None,
+                version=int(data['version']) if 'version' in data.files else 1
+            )
+
+    def budget_bucket(self, budget):
+        """Index of the budget interval; the forest compares budgets as float32"""
+        return int(np.searchsorted(self.thresholds, float(np.float32(budget)), side='left'))
+
+    def budget_buckets(self, budgets):
+        """Vectorized budget_bucket for an array of budgets"""
+        budgets = np.asarray(budgets, dtype=np.float32).astype(np.float64)
+        return np.searchsorted(self.thresholds, budgets, side='left')
+
+    def lookup_codes(self, codes, budget):
+        """Return (destinations, scores) for category codes in CATEGORICAL_COLUMNS order, best first"""
+        cell = tuple(codes) + (self.budget_bucket(budget),)
+        return self.classes[self.top_classes[cell]], self.top_scores[cell]
+
+    def lookup_many(self, codes, budgets):
+        """Return (destinations, scores) arrays of shape (N, k) for encoded rows.
+
+        ``codes`` is an (N, 4) integer array in CATEGORICAL_COLUMNS order.
+        """
+        cells = tuple(codes.T) + (self.budget_buckets(budgets),)
+        return self.classes[self.top_classes[cells]], self.top_scores[cells]
+
+
+def build_table(model_path=MODEL_PATH, encoders_path=ENCODERS_PATH, table_path=TABLE_PATH, k=5):
+    """Build and save the lookup table from the saved forest and encoders"""
+    from models.random_forest_model import TravelRecommendationModel
+
+    forest = joblib.load(model_path)
+    label_encoders = joblib.load(encoders_path)
+    table = RecommendationTable.build(forest, label_encoders, TravelRecommendationModel().feature_columns, k=k)
+    table.fingerprint = artifact_fingerprint(model_path)
+    table.save(table_path)
+    logger.info("Saved recommendation table to %s (%s bytes)", table_path, table.top_classes.nbytes + table.top_scores.nbytes)
+    return table
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build_table()
@@ -2,30 +2,136 @@ import pandas as pd
 import numpy as np
 import xgboost as xgb
 from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import cross_val_score, train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
+import logging
 import os
+from feature_encoder import FeatureEncoder, parse_budget
+from metrics import stage
+
+PREFERENCE_KEYS = {
+    'Budget': 'budget',
+    'Destination_Type': 'destination_type',
+    'Travel_Purpose': 'travel_purpose',
+    'Travel_season': 'travel_season',
+    'Municipality': 'municipality'
+}
+logger = logging.getLogger(__name__)
+
+ENGINEERED_COLUMNS = [
+    'Budget_Type', 'Budget_Purpose', 'Budget_Season',
+    'Type_Purpose', 'Type_Season', 'Purpose_Season',
+    'Budget_Squared', 'Budget_Cubed'
+]
+# Default hyperparameters; early stopping and the eval metric are constructor
+# arguments since xgboost 1.6 (the fit() keywords were removed in 2.0)
+MODEL_PARAMS = {
+    'n_estimators': 500,
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'min_child_weight': 3,
+    'gamma': 0.1,
+    'reg_alpha': 0.1,
+    'reg_lambda': 1,
+    'objective': 'multi:softprob',
+    'eval_metric': 'mlogloss',
+    'early_stopping_rounds': 50,
+    'random_state': 42
+}
+
+def build_classifier(params=None, n_jobs=-1, **overrides):
+    """An XGBClassifier with MODEL_PARAMS updated by params"""
+    return xgb.XGBClassifier(**{**MODEL_PARAMS, **(params or {}), **overrides, 'n_jobs': n_jobs})
+
+# XGBClassifier needs every label 0..num_class-1 in each training set, but most
+# destinations have a single catalog row. These splits keep one row of every
+# class (chosen at random) in training and only ever hold out the other rows.
+
+def _anchor_rows(y, rng):
+    """Shuffled positions split into one anchor row per class and the remaining rows"""
+    order = rng.permutation(len(y))
+    _, first = np.unique(np.asarray(y)[order], return_index=True)
+    is_anchor = np.zeros(len(y), dtype=bool)
+    is_anchor[order[first]] = True
+    return order[is_anchor[order]], order[~is_anchor[order]]
+
+def class_complete_split(y, test_size=0.2, random_state=42):
+    """(train, test) positions like train_test_split, with every class in train"""
+    anchors, rest = _anchor_rows(y, np.random.default_rng(random_state))
+    n_test = min(len(rest), int(round(len(y) * test_size)))
+    return np.sort(np.concatenate([anchors, rest[n_test:]])), np.sort(rest[:n_test])
+
+def class_complete_folds(y, n_folds=5, random_state=42):
+    """K (train, test) folds like KFold(shuffle=True), with every class in each train fold"""
+    anchors, rest = _anchor_rows(y, np.random.default_rng(random_state))
+    folds = []
+    for fold in range(n_folds):
+        test = rest[fold::n_folds]
+        folds.append((np.sort(np.concatenate([anchors, np.setdiff1d(rest, test)])), np.sort(test)))
+    return folds
+
+# Weights of the enhanced score, with emphasis on confidence and budget
+SCORE_WEIGHTS = {'confidence': 0.35, 'budget': 0.25, 'type': 0.15, 'purpose': 0.15, 'season': 0.10}
+# Catalog columns compared against the request by the enhanced score
+MATCH_COLUMNS = {'type': 'Destination_Type', 'purpose': 'Travel_Purpose', 'season': 'Travel_season'}
+FALLBACK_PREDICTION = {
+    'destination': 'Dahican Surf Resort',
+    'confidence_score': 1.0,
+    'budget_match': 1.0,
+    'type_match': 1.0,
+    'purpose_match': 1.0,
+    'season_match': 1.0
+}
+
+
+class ClassProfiles:
+    """Per-class catalog vectors aligned with the model's classes, for vectorized rescoring"""
+    def __init__(self, classes, catalog, encoder):
+        # The first catalog row of each class, or -1 for classes the catalog lacks
+        first_rows = catalog.first_rows()
+        rows = np.array([first_rows.get(str(destination), -1) for destination in classes], dtype=np.intp)
+        found = rows >= 0
+        rows = np.where(found, rows, 0)
+        self.budget = np.where(found, catalog.budget[rows], np.nan)
+        self.present = found & ~np.isnan(self.budget)
+        # -2 never equals a request code, which is -1 when unknown
+        self.codes = {}
+        for name, column in MATCH_COLUMNS.items():
+            category_codes = np.array(
+                [encoder.lookup(column, value, missing=-2) for value in catalog.categories(column).tolist()], dtype=np.int64
+            )
+            self.codes[name] = np.where(found, category_codes[catalog.codes(column)[rows]], -2)
 
 class XGBoostTravelModel:
-    def __init__(self):
+    def __init__(self, model_dir='models', score_weights=None, top_k=5, rescore_all=False):
+        self.model_dir = model_dir
+        self.score_weights = dict(SCORE_WEIGHTS, **(score_weights or {}))
+        self.top_k = top_k
+        self.rescore_all = rescore_all
         self.model = None
         self.label_encoders = {}
+        # Destination names; the classifier is trained on their codes 0..n-1
+        self.target_encoder = None
         self.feature_columns = ['Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']
         self.budget_scaler = None
+        self.encoder = None
+        self.profiles = None
+        self._profiled_catalog = None
         
-    def preprocess_data(self, df):
-        """Preprocess the data with advanced feature engineering"""
-        print("\n=== Preprocessing Data ===")
+    def preprocess_data(self, catalog):
+        """Training frame from the catalog, with advanced feature engineering"""
+        logger.info("Preprocessing data")
+        df = catalog.frame()
         
-        # Create label encoders for categorical features
+        # The catalog codes are the ones a LabelEncoder fitted on each column assigns
         for column in ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']:
-            self.label_encoders[column] = LabelEncoder()
-            df[column] = self.label_encoders[column].fit_transform(df[column])
-            print(f"Encoded {column} values: {dict(zip(self.label_encoders[column].classes_, self.label_encoders[column].transform(self.label_encoders[column].classes_)))}")
+            self.label_encoders[column] = LabelEncoder().fit(np.array(catalog.categories(column).tolist(), dtype=object))
+            df[column] = catalog.codes(column).astype(np.int64)
+            logger.debug("Encoded %s values: %s", column, self.label_encoders[column].classes_.tolist())
         
-        # Convert Budget to numeric and normalize
-        df['Budget'] = df['Budget'].str.replace(',', '').astype(float)
+        # Normalize the (already numeric) budget
         self.budget_scaler = {
             'mean': df['Budget'].mean(),
             'std': df['Budget'].std()
@@ -49,79 +155,149 @@ class XGBoostTravelModel:
         
         return df
     
-    def train(self, df):
+    @property
+    def classes(self):
+        """Destination names in the order of the predict_proba columns"""
+        if self.target_encoder is not None:
+            return self.target_encoder.classes_
+        # Models saved before the target encoder were fitted on the names themselves
+        return self.model.classes_
+    
+    def prepare_training_data(self, catalog):
+        """Preprocess the catalog and return the feature matrix and the encoded target"""
+        processed_df = self.preprocess_data(catalog)
+        self.target_encoder = LabelEncoder().fit(processed_df['Destination'])
+        y = pd.Series(self.target_encoder.transform(processed_df['Destination']), index=processed_df.index, name='Destination')
+        return processed_df[self.feature_columns + ENGINEERED_COLUMNS], y
+    
+    def train(self, catalog, params=None, cv_folds=5):
         """Train the XGBoost model with advanced parameters"""
-        print("\n=== Training XGBoost Model ===")
-        # Preprocess the data
-        processed_df = self.preprocess_data(df.copy())
-        
-        # Prepare features and target
-        feature_cols = self.feature_columns + [
-            'Budget_Type', 'Budget_Purpose', 'Budget_Season',
-            'Type_Purpose', 'Type_Season', 'Purpose_Season',
-            'Budget_Squared', 'Budget_Cubed'
-        ]
-        X = processed_df[feature_cols]
-        y = processed_df['Destination']
+        logger.info("Training XGBoost model")
+        # Preprocess the data and prepare features and target
+        X, y = self.prepare_training_data(catalog)
+        num_class = len(self.classes)
         
-        # Split data for validation
-        X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+        # Split data for validation, keeping every destination in the training set
+        train_index, val_index = class_complete_split(y)
+        X_train, X_val, y_train, y_val = X.iloc[train_index], X.iloc[val_index], y.iloc[train_index], y.iloc[val_index]
         
         # Initialize XGBoost model with optimized parameters
-        self.model = xgb.XGBClassifier(
-            n_estimators=500,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            min_child_weight=3,
-            gamma=0.1,
-            reg_alpha=0.1,
-            reg_lambda=1,
-            objective='multi:softprob',
-            num_class=len(df['Destination'].unique()),
-            random_state=42,
-            n_jobs=-1
-        )
+        self.model = build_classifier(params, num_class=num_class)
         
         # Train the model
-        print("Training XGBoost model...")
-        self.model.fit(
-            X_train, y_train,
-            eval_set=[(X_val, y_val)],
-            eval_metric='mlogloss',
-            early_stopping_rounds=50,
-            verbose=True
-        )
+        self.model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=True)
         
         # Evaluate on validation set
         y_pred = self.model.predict(X_val)
         accuracy = accuracy_score(y_val, y_pred)
-        print(f"\nValidation Accuracy: {accuracy:.4f}")
-        print("\nClassification Report:")
-        print(classification_report(y_val, y_pred))
+        logger.info("Validation accuracy: %.4f", accuracy)
+        logger.info("Classification report:\n%s", classification_report(
+            self.target_encoder.inverse_transform(y_val), self.target_encoder.inverse_transform(y_pred), zero_division=0
+        ))
         
-        # Perform cross-validation
-        cv_scores = cross_val_score(self.model, X, y, cv=5)
-        print(f"\nCross-validation scores: {cv_scores}")
-        print(f"Average CV score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+        # Perform cross-validation; models.xgboost_search runs it in parallel
+        if cv_folds:
+            from models.xgboost_search import cross_validate
+            cv_scores = cross_validate(params, X, y, num_class, n_folds=cv_folds)
+            logger.info("Cross-validation scores: %s", cv_scores)
+            logger.info("Average CV score: %.4f (+/- %.4f)", cv_scores.mean(), cv_scores.std() * 2)
         
-        # Print feature importance
+        # Log feature importance
         feature_importance = dict(zip(X.columns, self.model.feature_importances_))
-        print("\nFeature Importance:")
-        for feature, importance in sorted(feature_importance.items(), key=lambda x: x[1], reverse=True):
-            print(f"{feature}: {importance:.4f}")
+        logger.info("Feature importance: %s", ", ".join(
+            f"{feature}: {importance:.4f}"
+            for feature, importance in sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)
+        ))
         
         # Save the model and encoders
         self.save_model()
-        print("Model training completed and saved")
+        self.encoder = self.build_encoder()
+        self.profiles = None
+        logger.info("Model training completed and saved")
+    
+    def build_encoder(self):
+        """Compile the feature encoder from the label encoders and budget scaler"""
+        return FeatureEncoder.from_label_encoders(
+            self.feature_columns, self.label_encoders, PREFERENCE_KEYS, scaler=self.budget_scaler
+        )
+    
+    def get_profiles(self, catalog):
+        """Per-class catalog vectors, rebuilt only when the catalog or the model changes"""
+        if self.profiles is None or self._profiled_catalog is not catalog:
+            self.profiles = ClassProfiles(self.classes, catalog, self.encoder)
+            self._profiled_catalog = catalog
+        return self.profiles
+    
+    def rescore(self, probabilities, user_preferences, profiles, k=None, rescore_all=None):
+        """Enhanced scores for the top-k classes, as a list of prediction dicts best first.
+
+        Candidates are the k most probable classes, or every class when
+        rescore_all is set; either way the k best final scores are returned.
+        """
+        k = self.top_k if k is None else k
+        rescore_all = self.rescore_all if rescore_all is None else rescore_all
+        weights = self.score_weights
         
-    def predict(self, user_preferences, df):
-        """Make predictions with enhanced scoring system"""
-        print("\n=== Starting Prediction Process ===")
+        candidates = np.flatnonzero(profiles.present)
+        if not rescore_all and k < len(probabilities):
+            top = np.argpartition(probabilities, -k)[-k:]
+            candidates = top[profiles.present[top]]
+        if len(candidates) == 0:
+            return []
+        
+        budget = parse_budget(user_preferences['budget'])
+        if budget == 0 or not np.isfinite(budget):
+            # budget_match divides by it; predict answers with the fallback, as it did on ZeroDivisionError
+            raise ValueError(f"Budget must be a non-zero number, got {user_preferences['budget']!r}")
+        confidence = probabilities[candidates]
+        budget_match = 1 - np.abs(budget - profiles.budget[candidates]) / budget
+        matches = {}
+        for name, column in MATCH_COLUMNS.items():
+            code = self.encoder.lookup(column, user_preferences[PREFERENCE_KEYS[column]])
+            matches[name] = np.where(profiles.codes[name][candidates] == code, 1.0, 0.5)
+        final = (
+            weights['confidence'] * confidence +
+            weights['budget'] * budget_match +
+            weights['type'] * matches['type'] +
+            weights['purpose'] * matches['purpose'] +
+            weights['season'] * matches['season']
+        )
+        
+        if len(final) > k:
+            best = np.argpartition(-final, k - 1)[:k]
+        else:
+            best = np.arange(len(final))
+        best = best[np.argsort(-final[best], kind='stable')]
+        classes = self.classes[candidates[best]]
+        return [
+            {
+                'destination': str(dest),
+                'confidence_score': float(final[i]),
+                'budget_match': float(budget_match[i]),
+                'type_match': float(matches['type'][i]),
+                'purpose_match': float(matches['purpose'][i]),
+                'season_match': float(matches['season'][i])
+            }
+            for dest, i in zip(classes, best)
+        ]
+    
+    def engineer_features(self, X):
+        """Append the interaction and polynomial features to encoded rows, as in preprocess_data"""
+        budget, dtype, purpose, season = (
+            X[:, self.feature_columns.index(column)]
+            for column in ['Budget', 'Destination_Type', 'Travel_Purpose', 'Travel_season']
+        )
+        engineered = np.column_stack([
+            budget * dtype, budget * purpose, budget * season,
+            dtype * purpose, dtype * season, purpose * season,
+            budget ** 2, budget ** 3
+        ])
+        return pd.DataFrame(np.hstack([X, engineered]), columns=self.feature_columns + ENGINEERED_COLUMNS)
         
+    def predict(self, user_preferences, catalog, k=None, rescore_all=None):
+        """Make predictions with enhanced scoring system"""
         if self.model is None:
-            print("Model is None, attempting to load...")
+            logger.info("Model is not loaded, attempting to load")
             self.load_model()
         
         try:
@@ -133,122 +309,46 @@ class XGBoostTravelModel:
                 if not user_preferences[field]:
                     raise ValueError(f"Empty value for field: {field}")
 
-            # Preprocess user preferences
-            input_data = pd.DataFrame([{
-                'Budget': float(str(user_preferences['budget']).replace(',', '')),
-                'Destination_Type': str(user_preferences['destination_type']),
-                'Travel_Purpose': str(user_preferences['travel_purpose']),
-                'Travel_season': str(user_preferences['travel_season']),
-                'Municipality': str(user_preferences['municipality'])
-            }])
-            
-            # Transform categorical features
-            for column in ['Destination_Type', 'Travel_Purpose', 'Travel_season', 'Municipality']:
-                try:
-                    if input_data[column].iloc[0] in self.label_encoders[column].classes_:
-                        input_data[column] = self.label_encoders[column].transform([input_data[column].iloc[0]])[0]
-                    else:
-                        print(f"Warning: {column} value not found in training data. Using default value.")
-                        input_data[column] = 0
-                except Exception as e:
-                    print(f"Error transforming {column}: {str(e)}")
-                    input_data[column] = 0
-            
-            # Normalize budget
-            input_data['Budget'] = (input_data['Budget'] - self.budget_scaler['mean']) / self.budget_scaler['std']
-            
-            # Add engineered features
-            input_data['Budget_Type'] = input_data['Budget'] * input_data['Destination_Type']
-            input_data['Budget_Purpose'] = input_data['Budget'] * input_data['Travel_Purpose']
-            input_data['Budget_Season'] = input_data['Budget'] * input_data['Travel_season']
-            input_data['Type_Purpose'] = input_data['Destination_Type'] * input_data['Travel_Purpose']
-            input_data['Type_Season'] = input_data['Destination_Type'] * input_data['Travel_season']
-            input_data['Purpose_Season'] = input_data['Travel_Purpose'] * input_data['Travel_season']
-            input_data['Budget_Squared'] = input_data['Budget'] ** 2
-            input_data['Budget_Cubed'] = input_data['Budget'] ** 3
+            # Encode, normalize the budget and add the engineered features
+            with stage('model.encode'):
+                input_data = self.engineer_features(self.encoder.encode(user_preferences))
             
             # Get predictions with probability scores
-            predictions = self.model.predict_proba(input_data)
+            with stage('model.predict_proba'):
+                predictions = self.model.predict_proba(input_data)
             
-            # Get top 5 destinations with highest probability
-            top_indices = np.argsort(predictions[0])[-5:][::-1]
-            top_destinations = self.model.classes_[top_indices]
-            
-            # Get predictions with confidence scores and additional features
-            predictions_list = []
-            for idx, dest in enumerate(top_destinations):
-                dest_data = df[df['Destination'] == dest]
-                if not dest_data.empty:
-                    confidence_score = float(predictions[0][np.where(self.model.classes_ == dest)[0][0]])
-                    
-                    # Enhanced scoring system
-                    budget_match = 1 - abs(float(user_preferences['budget']) - float(dest_data['Budget'].iloc[0].replace(',', ''))) / float(user_preferences['budget'])
-                    type_match = 1 if user_preferences['destination_type'] == dest_data['Destination_Type'].iloc[0] else 0.5
-                    purpose_match = 1 if user_preferences['travel_purpose'] == dest_data['Travel_Purpose'].iloc[0] else 0.5
-                    season_match = 1 if user_preferences['travel_season'] == dest_data['Travel_season'].iloc[0] else 0.5
-                    
-                    # Weighted scoring with emphasis on confidence and budget
-                    final_score = (
-                        0.35 * confidence_score +
-                        0.25 * budget_match +
-                        0.15 * type_match +
-                        0.15 * purpose_match +
-                        0.10 * season_match
-                    )
-                    
-                    prediction = {
-                        'destination': str(dest),
-                        'confidence_score': final_score,
-                        'budget_match': budget_match,
-                        'type_match': type_match,
-                        'purpose_match': purpose_match,
-                        'season_match': season_match
-                    }
-                    predictions_list.append(prediction)
+            # Rescore the most probable classes against the catalog
+            with stage('model.rescore'):
+                predictions_list = self.rescore(predictions[0], user_preferences, self.get_profiles(catalog), k=k, rescore_all=rescore_all)
             
             if not predictions_list:
-                return [{
-                    'destination': 'Dahican Surf Resort',
-                    'confidence_score': 1.0,
-                    'budget_match': 1.0,
-                    'type_match': 1.0,
-                    'purpose_match': 1.0,
-                    'season_match': 1.0
-                }]
-            
-            # Sort predictions by final score
-            predictions_list.sort(key=lambda x: x['confidence_score'], reverse=True)
+                return [dict(FALLBACK_PREDICTION)]
             
             return predictions_list
             
         except Exception as e:
-            print(f"\nError in predict method: {str(e)}")
-            print(f"Error type: {type(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            return [{
-                'destination': 'Dahican Surf Resort',
-                'confidence_score': 1.0,
-                'budget_match': 1.0,
-                'type_match': 1.0,
-                'purpose_match': 1.0,
-                'season_match': 1.0
-            }]
+            logger.exception("Error in predict method: %s", e)
+            return [dict(FALLBACK_PREDICTION)]
     
     def save_model(self):
         """Save the model and encoders"""
-        if not os.path.exists('models'):
-            os.makedirs('models')
+        if not os.path.exists(self.model_dir):
+            os.makedirs(self.model_dir)
         
-        joblib.dump(self.model, 'models/xgboost_model.joblib')
-        joblib.dump(self.label_encoders, 'models/xgboost_label_encoders.joblib')
-        joblib.dump(self.budget_scaler, 'models/xgboost_budget_scaler.joblib')
+        joblib.dump(self.model, os.path.join(self.model_dir, 'xgboost_model.joblib'))
+        joblib.dump(self.label_encoders, os.path.join(self.model_dir, 'xgboost_label_encoders.joblib'))
+        joblib.dump(self.budget_scaler, os.path.join(self.model_dir, 'xgboost_budget_scaler.joblib'))
+        joblib.dump(self.target_encoder, os.path.join(self.model_dir, 'xgboost_target_encoder.joblib'))
     
     def load_model(self):
         """Load the saved model and encoders"""
         try:
-            self.model = joblib.load('models/xgboost_model.joblib')
-            self.label_encoders = joblib.load('models/xgboost_label_encoders.joblib')
-            self.budget_scaler = joblib.load('models/xgboost_budget_scaler.joblib')
+            self.model = joblib.load(os.path.join(self.model_dir, 'xgboost_model.joblib'))
+            self.label_encoders = joblib.load(os.path.join(self.model_dir, 'xgboost_label_encoders.joblib'))
+            self.budget_scaler = joblib.load(os.path.join(self.model_dir, 'xgboost_budget_scaler.joblib'))
         except:
-            raise Exception("Model not found. Please train the model first.") 
\ No newline at end of file
+            raise Exception("Model not found. Please train the model first.")
+        target_path = os.path.join(self.model_dir, 'xgboost_target_encoder.joblib')
+        self.target_encoder = joblib.load(target_path) if os.path.exists(target_path) else None
+        self.encoder = self.build_encoder()
+        self.profiles = None 
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""Parallel hyperparameter search for the XGBoost model.
+
+Every (configuration, fold) pair is one task on a process pool. Each worker
+gets ``cpu_count // workers`` threads for xgboost and the math libraries,
+so the pool never oversubscribes the machine. Folds keep one row of every
+destination in training (see ``class_complete_folds``), so scores measure
+the destinations with more than one catalog row. The best configuration is
+retrained with ``XGBoostTravelModel.train`` (same split and early stopping
+as before) and saved with ``save_model``.
+Run from ``backend/``::
+
+    python -m models.xgboost_search [--workers N] [--folds K]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+from catalog import load_catalog
+from models.xgboost_model import XGBoostTravelModel, build_classifier, class_complete_folds, class_complete_split
+
+logger = logging.getLogger(__name__)
+
+# 24 configurations; with 5 folds that is 120 fits
+PARAM_GRID = {
+    'max_depth': [4, 6, 8],
+    'learning_rate': [0.05, 0.1],
+    'min_child_weight': [1, 3],
+    'subsample': [0.8, 1.0]
+}
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+# Per-worker state, set once by _init_worker instead of pickled into every task
+_X = None
+_y = None
+_num_class = None
+_threads = 1
+
+
+def expand_grid(grid):
+    """Every combination of the grid values as a list of parameter dicts"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def fit_fold(params, X, y, num_class, train_index, test_index, n_jobs=1):
+    """Fit on one training fold, early-stopping on a slice of it, and score the held-out fold.
+
+    y holds the codes 0..num_class-1 of every destination; the training fold must contain all of them.
+    """
+    fit_positions, val_positions = class_complete_split(y.iloc[train_index])
+    fit_index, val_index = train_index[fit_positions], train_index[val_positions]
+    model = build_classifier(params, n_jobs=n_jobs, num_class=num_class)
+    model.fit(X.iloc[fit_index], y.iloc[fit_index], eval_set=[(X.iloc[val_index], y.iloc[val_index])], verbose=False)
+    score = accuracy_score(y.iloc[test_index], model.predict(X.iloc[test_index]))
+    return score, model.best_iteration
+
+
+def cross_validate(params, X, y, num_class, n_folds=5):
+    """Serial K-fold accuracy for one configuration, using every core per fit"""
+    folds = class_complete_folds(y, n_folds=n_folds)
+    return np.array([fit_fold(params, X, y, num_class, train_index, test_index, n_jobs=-1)[0] for train_index, test_index in folds])
+
+
+@contextmanager
+def thread_limits(threads):
+    """Set the thread env vars in this process while the pool spawns its workers.
+
+    A spawned worker reads them when it imports numpy and xgboost, before any
+    initializer runs, so they have to be in the environment it inherits.
+    """
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _init_worker(X, y, num_class, threads):
+    global _X, _y, _num_class, _threads
+    _X, _y, _num_class, _threads = X, y, num_class, threads
+
+
+def _run_task(config_index, fold, params, train_index, test_index):
+    started = time.time()
+    score, best_iteration = fit_fold(params, _X, _y, _num_class, train_index, test_index, n_jobs=_threads)
+    return config_index, fold, score, best_iteration, started, time.time()
+
+
+def search(catalog, grid=PARAM_GRID, n_folds=5, workers=None, model_dir='models'):
+    """Cross-validate every grid configuration in parallel, then refit and save the best.
+
+    Returns the per-configuration results, best first.
+    """
+    model = XGBoostTravelModel(model_dir=model_dir)
+    X, y = model.prepare_training_data(catalog)
+    num_class = len(model.classes)
+    configs = expand_grid(grid)
+    folds = class_complete_folds(y, n_folds=n_folds)
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(configs) * n_folds))
+    threads = max(1, cpus // workers)
+    logger.info("Searching %s configurations x %s folds on %s workers, %s threads each", len(configs), n_folds, workers, threads)
+
+    start = time.monotonic()
+    runs = {index: [] for index in range(len(configs))}
+    # spawn, not fork: a forked child would inherit the parent's thread pool state
+    context = multiprocessing.get_context('spawn')
+    with thread_limits(threads), ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                                     initargs=(X, y, num_class, threads)) as pool:
+        futures = [
+            pool.submit(_run_task, index, fold, params, train_index, test_index)
+            for index, params in enumerate(configs)
+            for fold, (train_index, test_index) in enumerate(folds)
+        ]
+        for future in futures:
+            index, fold, score, best_iteration, started, finished = future.result()
+            runs[index].append((score, best_iteration, started, finished))
+
+    results = []
+    for index, params in enumerate(configs):
+        scores = np.array([run[0] for run in runs[index]])
+        results.append({
+            'params': params,
+            'mean_score': float(scores.mean()),
+            'std_score': float(scores.std()),
+            'best_iterations': [int(run[1]) for run in runs[index]],
+            # From the first fold starting to the last one finishing
+            'wall_time': max(run[3] for run in runs[index]) - min(run[2] for run in runs[index]),
+            'fit_time': sum(run[3] - run[2] for run in runs[index])
+        })
+    results.sort(key=lambda result: result['mean_score'], reverse=True)
+    logger.info("Search finished in %.1fs", time.monotonic() - start)
+    for result in results:
+        logger.info(
+            "%s: accuracy %.4f (+/- %.4f), wall %.1fs, fit %.1fs",
+            result['params'], result['mean_score'], result['std_score'] * 2, result['wall_time'], result['fit_time']
+        )
+
+    best = results[0]['params']
+    logger.info("Retraining best configuration %s on %s records", best, len(catalog))
+    model.train(catalog, params=best, cv_folds=0)
+    return results
+
+
+def _option(name, default):
+    args = sys.argv[1:]
+    return int(args[args.index(name) + 1]) if name in args else default
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    search(load_catalog(), n_folds=_option('--folds', 5), workers=_option('--workers', None))
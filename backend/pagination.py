@@ -0,0 +1,87 @@
+"""Keyset pagination over ``(created_at, _id)``, newest first.
+
+The cursor is the position of the last returned document, so every page is
+an index range scan instead of a skip over all earlier documents.
+"""
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+SORT_ORDER = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+
+def parse_limit(value, default=20, maximum=100):
+    """Parse a ``limit`` query parameter, clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), maximum))
+
+
+def encode_cursor(document):
+    raw = f"{document['created_at'].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (created_at, _id) for a cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), ObjectId(object_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def keyset_filter(cursor, query=None):
+    """Restrict query to documents strictly after the cursor in SORT_ORDER"""
+    query = dict(query or {})
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        query['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}}
+        ]
+    return query
+
+
+def cursor_projection(projection):
+    """A copy of projection that still returns the cursor fields; shared constants are never handed to the driver"""
+    if projection is not None and any(projection.values()):
+        return {**projection, '_id': 1, 'created_at': 1}
+    return dict(projection) if projection is not None else None
+
+
+def split_page(documents, limit):
+    """Turn up to limit + 1 documents into (page, next_cursor)"""
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    documents = documents[:limit]
+    for document in documents:
+        document.pop('_id', None)
+    return documents, next_cursor
+
+
+def fetch_page(collection, cursor=None, limit=20, query=None, projection=None):
+    """Return (documents, next_cursor); next_cursor is None on the last page.
+
+    ``_id`` is only used to build the cursor and is removed from the returned
+    documents, matching the responses that used to exclude it.
+    """
+    documents = list(
+        collection.find(keyset_filter(cursor, query), cursor_projection(projection))
+        .sort(SORT_ORDER)
+        .limit(limit + 1)
+    )
+    return split_page(documents, limit)
+
+
+async def fetch_page_async(collection, cursor=None, limit=20, query=None, projection=None, max_time_ms=None):
+    """fetch_page for a motor collection, with an optional server-side time limit"""
+    find = (
+        collection.find(keyset_filter(cursor, query), cursor_projection(projection))
+        .sort(SORT_ORDER)
+        .limit(limit + 1)
+    )
+    if max_time_ms:
+        find = find.max_time_ms(max_time_ms)
+    return split_page(await find.to_list(length=limit + 1), limit)
@@ -0,0 +1,140 @@
+"""Running aggregates for satisfaction ratings.
+
+Every newly saved rating is folded into a single summary document with
+atomic ``$inc``/``$min``/``$max`` updates, so ``GET /api/ratings`` can report
+averages without reading the ratings themselves.
+
+Rebuild the summary from existing ratings (run from ``backend/``)::
+
+    python rating_aggregates.py --rebuild
+"""
+from datetime import datetime
+import logging
+import math
+import os
+import sys
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES_COLLECTION = 'rating_aggregates'
+SUMMARY_ID = 'ratings'
+SCORE_FIELDS = ['system_satisfaction_score', 'analytics_satisfaction_score']
+# Scores are given in whole stars by the rating dialog
+MIN_SCORE = 1
+MAX_SCORE = 5
+
+
+def histogram_bucket(score):
+    """Whole-point histogram bucket for a score, as a field-name-safe string"""
+    return str(int(math.floor(score)))
+
+
+def rating_score(value):
+    """A submitted score as a float; raises ValueError unless it is a number from MIN_SCORE to MAX_SCORE"""
+    if isinstance(value, bool):
+        raise ValueError(f"Score must be a number, got {value!r}")
+    score = float(value)
+    if not math.isfinite(score) or not MIN_SCORE <= score <= MAX_SCORE:
+        raise ValueError(f"Score must be between {MIN_SCORE} and {MAX_SCORE}, got {value!r}")
+    return score
+
+
+def rating_document(rating_data):
+    """The document saved for a submitted rating; raises ValueError (or TypeError) for an invalid score"""
+    return {
+        'system_satisfaction_score': rating_score(rating_data['system_satisfaction_score']),
+        'analytics_satisfaction_score': rating_score(rating_data['analytics_satisfaction_score']),
+        'created_at': datetime.utcnow()
+    }
+
+
+def rating_update(rating_doc):
+    """Update document folding one rating into the summary"""
+    inc = {'count': 1}
+    minimum = {}
+    maximum = {}
+    for field in SCORE_FIELDS:
+        score = rating_doc[field]
+        inc[f'{field}.sum'] = score
+        inc[f'{field}.histogram.{histogram_bucket(score)}'] = 1
+        minimum[f'{field}.min'] = score
+        maximum[f'{field}.max'] = score
+    return {'$inc': inc, '$min': minimum, '$max': maximum}
+
+
+def record_ratings(aggregates_collection, rating_docs):
+    """Fold newly saved ratings into the summary with one bulk write; ratings with invalid scores are skipped"""
+    updates = []
+    for rating_doc in rating_docs:
+        try:
+            updates.append(UpdateOne({'_id': SUMMARY_ID}, rating_update(rating_doc), upsert=True))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            logger.error("Rating %s left out of the summary: %s", rating_doc.get('_id'), e)
+    if updates:
+        aggregates_collection.bulk_write(updates, ordered=False)
+
+
+def read_summary(aggregates_collection):
+    """Return (count, averages, details) from the summary document"""
+    return summarize(aggregates_collection.find_one({'_id': SUMMARY_ID}))
+
+
+def summarize(summary):
+    """(count, averages, details) from a summary document, or from None if there is none yet"""
+    summary = summary or {}
+    count = summary.get('count', 0)
+    averages = {}
+    details = {}
+    for field in SCORE_FIELDS:
+        stats = summary.get(field, {})
+        averages[field] = round(stats.get('sum', 0) / count, 2) if count else 0
+        details[field] = {
+            'min': stats.get('min'),
+            'max': stats.get('max'),
+            'histogram': stats.get('histogram', {})
+        }
+    return count, averages, details
+
+
+def rebuild_summary(ratings_collection, aggregates_collection):
+    """Recompute the summary document from every stored rating"""
+    group = {'_id': None, 'count': {'$sum': 1}}
+    for field in SCORE_FIELDS:
+        group[f'{field}_sum'] = {'$sum': f'${field}'}
+        group[f'{field}_min'] = {'$min': f'${field}'}
+        group[f'{field}_max'] = {'$max': f'${field}'}
+    totals = next(ratings_collection.aggregate([{'$group': group}]), None)
+
+    summary = {'_id': SUMMARY_ID, 'count': 0}
+    if totals:
+        summary['count'] = totals['count']
+        for field in SCORE_FIELDS:
+            histogram = ratings_collection.aggregate([
+                {'$group': {'_id': {'$floor': f'${field}'}, 'count': {'$sum': 1}}}
+            ])
+            summary[field] = {
+                'sum': totals[f'{field}_sum'],
+                'min': totals[f'{field}_min'],
+                'max': totals[f'{field}_max'],
+                'histogram': {str(int(bucket['_id'])): bucket['count'] for bucket in histogram}
+            }
+    aggregates_collection.replace_one({'_id': SUMMARY_ID}, summary, upsert=True)
+    logger.info("Rebuilt rating summary from %s ratings", summary['count'])
+    return summary
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    logging.basicConfig(level=logging.INFO)
+    if '--rebuild' not in sys.argv[1:]:
+        print(__doc__)
+        sys.exit(1)
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    db = client['travel_recommendations']
+    rebuild_summary(db['ratings'], db[AGGREGATES_COLLECTION])
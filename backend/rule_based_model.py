@@ -1,81 +1,105 @@
-import pandas as pd
+import heapq
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
+# Catalog column matched by each preference
+MATCH_COLUMNS = {
+    'destination_type': 'Destination_Type',
+    'travel_purpose': 'Travel_Purpose',
+    'travel_season': 'Travel_season',
+    'municipality': 'Municipality'
+}
+
+def substring_index(values):
+    """Map every substring of every distinct value to a bitset (int) of the rows containing it"""
+    rows_by_value = {}
+    for row, value in enumerate(values):
+        if isinstance(value, str):
+            rows_by_value[value] = rows_by_value.get(value, 0) | (1 << row)
+    index = {}
+    for value, rows in rows_by_value.items():
+        substrings = {value[start:end] for start in range(len(value) + 1) for end in range(start, len(value) + 1)}
+        for substring in substrings:
+            index[substring] = index.get(substring, 0) | rows
+    return index
+
+def iter_rows(bits):
+    """Row ids set in a bitset, in ascending order"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
 class RuleBasedModel:
     def __init__(self):
-        self.df = None
+        self.catalog = None
+        self.records = []
+        self.daily_budgets = []
+        self.indexes = {}
 
-    def load_data(self, df):
-        """Load the dataset"""
-        # Standardize column names
-        df.columns = [col.strip() for col in df.columns]
-        # Convert all string columns to lowercase for case-insensitive matching
-        for col in df.select_dtypes(include=['object']).columns:
-            df[col] = df[col].str.lower()
-        self.df = df
-        logger.info(f"Rule-based model loaded data with {len(df)} records")
-        logger.info(f"Available columns: {df.columns.tolist()}")
+    def load_data(self, catalog):
+        """Load the catalog and build the per-column substring indexes"""
+        self.catalog = catalog
+        
+        # Budgets are already numeric; rows with an unparseable (NaN) budget can never be recommended
+        self.daily_budgets = catalog.budget.tolist()
+        usable = 0
+        for row, daily_budget in enumerate(self.daily_budgets):
+            if not math.isnan(daily_budget):
+                usable |= 1 << row
+        # Matching is case-insensitive, and recommendations carry the lowercased values
+        self.records = [
+            {
+                'destination': record['destination'].lower(),
+                'daily_budget': record['budget'],
+                'destination_type': record['destination_type'].lower(),
+                'travel_purpose': record['travel_purpose'].lower(),
+                'travel_season': record['travel_season'].lower(),
+                'municipality': record['municipality'].lower()
+            }
+            for record in catalog.records()
+        ]
+        self.indexes = {
+            key: {substring: rows & usable for substring, rows in substring_index(catalog.keys(column).tolist()).items()}
+            for key, column in MATCH_COLUMNS.items()
+        }
+        logger.info("Rule-based model loaded data with %s records", len(catalog))
 
     def predict(self, user_preferences):
         """
         Get prescriptive recommendations based on user preferences and trip duration
         """
         try:
-            logger.debug(f"Getting prescriptive recommendations for preferences: {user_preferences}")
+            logger.debug("Getting prescriptive recommendations for preferences: %s", user_preferences)
             
-            # Extract user preferences and convert to lowercase
             trip_duration = int(user_preferences.get('trip_duration', 1))
-            destination_type = user_preferences.get('destination_type', '').lower()
-            travel_purpose = user_preferences.get('travel_purpose', '').lower()
-            travel_season = user_preferences.get('travel_season', '').lower()
-            municipality = user_preferences.get('municipality', '').lower()
-            
-            logger.debug(f"Extracted preferences: trip_duration={trip_duration}, destination_type={destination_type}, "
-                        f"travel_purpose={travel_purpose}, travel_season={travel_season}, municipality={municipality}")
             
-            # Filter destinations based on preferences
-            filtered_df = self.df[
-                (self.df['Destination_Type'].str.contains(destination_type, case=False, na=False)) &
-                (self.df['Travel_Purpose'].str.contains(travel_purpose, case=False, na=False)) &
-                (self.df['Travel_season'].str.contains(travel_season, case=False, na=False)) &
-                (self.df['Municipality'].str.contains(municipality, case=False, na=False))
-            ]
-            
-            logger.debug(f"DataFrame shape after filtering: {filtered_df.shape}")
+            # Rows whose column contains the preference (case-insensitive), as a bitset intersection
+            matches = -1
+            for key in MATCH_COLUMNS:
+                matches &= self.indexes[key].get(user_preferences.get(key, '').lower(), 0)
+                if not matches:
+                    break
             
-            if filtered_df.empty:
+            if matches <= 0:
                 logger.warning("No destinations found matching the criteria")
                 return []
             
-            recommendations = []
-            for _, destination in filtered_df.iterrows():
-                try:
-                    # Calculate total budget based on trip duration
-                    daily_budget = float(str(destination['Budget']).replace(',', ''))
-                    total_budget = daily_budget * trip_duration
-                    
-                    recommendation = {
-                        'destination': str(destination['Destination']),
-                        'daily_budget': str(destination['Budget']),
-                        'total_budget': str(total_budget),
-                        'trip_duration': trip_duration,
-                        'destination_type': str(destination['Destination_Type']),
-                        'travel_purpose': str(destination['Travel_Purpose']),
-                        'travel_season': str(destination['Travel_season']),
-                        'municipality': str(destination['Municipality'])
-                    }
-                    recommendations.append(recommendation)
-                except Exception as e:
-                    logger.error(f"Error processing destination {destination['Destination']}: {str(e)}")
-                    continue
-            
-            # Sort recommendations by total budget
-            recommendations.sort(key=lambda x: float(x['total_budget']))
+            # Top 5 by total budget, cheapest first
+            rows = heapq.nsmallest(5, iter_rows(matches), key=lambda row: self.daily_budgets[row] * trip_duration)
+            recommendations = [
+                dict(
+                    self.records[row],
+                    total_budget=str(self.daily_budgets[row] * trip_duration),
+                    trip_duration=trip_duration
+                )
+                for row in rows
+            ]
             
-            logger.debug(f"Generated {len(recommendations)} recommendations")
-            return recommendations[:5]  # Return top 5 recommendations
+            logger.debug("Generated %s recommendations", len(recommendations))
+            return recommendations
         except Exception as e:
-            logger.error(f"Error in rule-based predictions: {str(e)}")
-            return [] 
\ No newline at end of file
+            logger.error("Error in rule-based predictions: %s", e)
+            return []
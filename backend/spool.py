@@ -0,0 +1,367 @@
+"""Durable local spool for MongoDB inserts.
+
+Request handlers ``append`` documents to an append-only SQLite table (WAL
+mode) instead of talking to MongoDB, so a slow or unreachable database never
+adds to request latency and nothing is lost while it is down or when the
+process restarts. Each document gets its ``_id`` when it is appended, which
+makes replay idempotent: a background replayer claims the oldest entries in
+batches, inserts them with ``insert_many(ordered=False)``, treats duplicate
+key errors as already written, and deletes the entries once MongoDB has
+them. Several processes may share one spool file; a claim keeps them from
+replaying the same entries at once.
+
+Per-collection ``handlers`` (counters, rating aggregates) see each document
+at least once. An entry is marked inserted before its handler runs and is
+only deleted after the handler succeeded, so a crash, a failed handler or a
+partial insert offers the documents to the handler again instead of losing
+them. A document can be counted twice only if the process dies between a
+successful handler and the delete. After ``max_attempts`` failed handler
+runs the entries are dropped with an error (``unhandled``); rebuild the
+derived data with ``python analytics_counters.py --rebuild`` or
+``python rating_aggregates.py --rebuild``.
+
+Documents MongoDB will never accept (failed validation, too large) are moved
+to the ``dead_letter`` table with the error instead of blocking every write
+behind them; the rest of their batch is written and handled as usual.
+Inspect them with ``sqlite3 <spool file> 'SELECT * FROM dead_letter'``.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    document BLOB NOT NULL,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    document BLOB NOT NULL,
+    error TEXT,
+    failed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Columns spool files written by earlier versions lack; added when the file is opened
+_ADDED_COLUMNS = {
+    'inserted': 'INTEGER NOT NULL DEFAULT 0',
+    'attempts': 'INTEGER NOT NULL DEFAULT 0',
+    'claimed_until': 'REAL NOT NULL DEFAULT 0'
+}
+
+
+class WriteSpool:
+    """Append documents locally; a background thread replays them into MongoDB.
+
+    ``append`` only needs the local disk and works before MongoDB is
+    connected. ``attach(database)`` starts (or re-targets) the replayer. The
+    spool holds at most ``max_rows`` entries; beyond that ``append`` drops
+    the document and returns False. A batch claimed by a process that has
+    not finished it within ``claim_timeout`` seconds may be replayed by
+    another one.
+    """
+
+    def __init__(self, path, handlers=None, batch_size=100, flush_interval=1.0, retry_interval=5.0,
+                 max_rows=1000000, synchronous='NORMAL', name='write-spool', max_attempts=5, claim_timeout=300.0):
+        self.path = path
+        self.handlers = dict(handlers or {})
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.max_rows = max_rows
+        self.synchronous = synchronous
+        self.name = name
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.database = None
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._depth = None
+        self.appended = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.handler_failures = 0
+        self.unhandled = 0
+        self.batches = 0
+
+    def _connection(self):
+        """One SQLite connection per thread and process (connections must not cross a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(f'PRAGMA synchronous={self.synchronous}')
+            connection.executescript(_SCHEMA)
+            self._add_columns(connection)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _add_columns(connection):
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(spool)')}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in columns:
+                try:
+                    connection.execute(f'ALTER TABLE spool ADD COLUMN {column} {definition}')
+                except sqlite3.OperationalError as e:
+                    # Another process added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+
+    def depth(self):
+        """Entries waiting to be replayed"""
+        return self._connection().execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def dead_letter_depth(self):
+        return self._connection().execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+
+    def append(self, collection, document):
+        """Durably record a document for insertion; returns False if it had to be dropped"""
+        with self._lock:
+            if self._depth is None:
+                self._depth = self.depth()
+            if self._depth >= self.max_rows:
+                self.dropped += 1
+                logger.warning("%s is full (%s entries), dropped a %s document", self.name, self._depth, collection)
+                return False
+        document.setdefault('_id', ObjectId())
+        self._connection().execute(
+            'INSERT INTO spool (collection, document) VALUES (?, ?)', (collection, bson.encode(document))
+        )
+        with self._lock:
+            self.appended += 1
+            self._depth += 1
+        return True
+
+    def attach(self, database):
+        """Replay into database from now on, starting the replayer if needed"""
+        self.database = database
+        return self.start()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.database is None:
+                self._stop.wait(self.flush_interval)
+                continue
+            try:
+                replayed = self.replay_once()
+            except Exception as e:
+                logger.error("%s could not replay into MongoDB, retrying in %ss: %s", self.name, self.retry_interval, e)
+                self._stop.wait(self.retry_interval)
+                continue
+            if replayed < self.batch_size:
+                self._stop.wait(self.flush_interval)
+
+    def replay_once(self):
+        """Replay the oldest batch; returns the number of entries taken off the spool"""
+        with self._replay_lock:
+            connection = self._connection()
+            rows = self._claim(connection)
+            by_collection = {}
+            for seq, collection, document, inserted, attempts in rows:
+                by_collection.setdefault(collection, []).append((seq, document, inserted, attempts))
+
+            replayed = 0
+            try:
+                for collection, entries in by_collection.items():
+                    replayed += self._replay(connection, collection, entries)
+            finally:
+                # Entries still on the spool (a failed insert or handler) can be claimed again right away
+                connection.executemany('UPDATE spool SET claimed_until = 0 WHERE seq = ?', [(row[0],) for row in rows])
+                with self._lock:
+                    self._depth = self.depth()
+            return replayed
+
+    def _claim(self, connection):
+        """The oldest entries no other process is replaying, claimed for claim_timeout seconds"""
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                'SELECT seq, collection, document, inserted, attempts FROM spool '
+                'WHERE claimed_until < ? ORDER BY seq LIMIT ?', (now, self.batch_size)
+            ).fetchall()
+            connection.executemany(
+                'UPDATE spool SET claimed_until = ? WHERE seq = ?', [(now + self.claim_timeout, row[0]) for row in rows]
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return rows
+
+    def _replay(self, connection, collection, entries):
+        """Insert the entries not inserted yet, then hand every inserted entry to the handler; returns entries removed"""
+        fresh = [index for index, (_, _, inserted, _) in enumerate(entries) if not inserted]
+        rejected = {}
+        if fresh:
+            errors = self._insert(collection, [bson.decode(entries[index][1]) for index in fresh])
+            rejected = {fresh[index]: error for index, error in errors.items()}
+        written = [index for index in range(len(entries)) if index not in rejected]
+
+        handler = self.handlers.get(collection)
+        if handler is None or not written:
+            self._settle(connection, collection, entries, rejected, removed=written)
+            return len(entries)
+
+        # Durably record the insert first: from here on a crash or a failed handler re-offers the
+        # documents to the handler, and the duplicate key errors of a second insert are expected
+        self._settle(connection, collection, entries, rejected, inserted=[index for index in written if index in fresh])
+        try:
+            handler(self.database, [bson.decode(entries[index][1]) for index in written])
+        except Exception as e:
+            failed = [entries[index] for index in written]
+            return len(rejected) + self._handler_failed(connection, collection, failed, e)
+        self._settle(connection, collection, entries, {}, removed=written)
+        return len(entries)
+
+    def _handler_failed(self, connection, collection, entries, error):
+        """Count a failed handler run; entries out of attempts are dropped, the rest are retried"""
+        exhausted = [(seq,) for seq, _, _, attempts in entries if attempts + 1 >= self.max_attempts]
+        connection.executemany('UPDATE spool SET attempts = attempts + 1 WHERE seq = ?', [(seq,) for seq, *_ in entries])
+        connection.executemany('DELETE FROM spool WHERE seq = ?', exhausted)
+        with self._lock:
+            self.handler_failures += 1
+            self.unhandled += len(exhausted)
+        if exhausted:
+            logger.error("%s handler for %s failed %s times, dropped %s of its documents (rebuild the derived data): %s",
+                         self.name, collection, self.max_attempts, len(exhausted), error)
+            return len(exhausted)
+        raise RuntimeError(f"{self.name} handler for {collection} failed, will retry: {error}") from error
+
+    def _settle(self, connection, collection, entries, rejected, inserted=(), removed=()):
+        """In one transaction: move rejected entries (index -> error) to dead_letter, mark inserted, delete removed"""
+        def seqs(indexes):
+            return [(entries[index][0],) for index in indexes]
+
+        connection.execute('BEGIN')
+        try:
+            if rejected:
+                connection.executemany(
+                    'INSERT INTO dead_letter (collection, document, error) VALUES (?, ?, ?)',
+                    [(collection, entries[index][1], error) for index, error in rejected.items()]
+                )
+                connection.executemany('DELETE FROM spool WHERE seq = ?', seqs(rejected))
+            connection.executemany('UPDATE spool SET inserted = 1 WHERE seq = ?', seqs(inserted))
+            connection.executemany('DELETE FROM spool WHERE seq = ?', seqs(removed))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        if rejected:
+            with self._lock:
+                self.dead_lettered += len(rejected)
+            logger.error("%s moved %s %s documents to dead_letter: %s",
+                         self.name, len(rejected), collection, next(iter(rejected.values())))
+
+    def _write_errors(self, collection, documents):
+        """insert_many(ordered=False); returns its write errors ({'index', 'code', 'errmsg'})"""
+        try:
+            self.database[collection].insert_many(documents, ordered=False)
+            return []
+        except BulkWriteError as e:
+            if e.details.get('writeConcernErrors'):
+                # The documents were written, just not acknowledged by enough members
+                logger.warning("%s write concern errors on %s: %s", self.name, collection, e.details['writeConcernErrors'])
+            return e.details.get('writeErrors', [])
+        except InvalidDocument as e:
+            # Raised client-side (e.g. DocumentTooLarge) before the batch is complete: find the bad documents
+            if len(documents) == 1:
+                return [{'index': 0, 'code': None, 'errmsg': str(e)}]
+            errors = []
+            for index, document in enumerate(documents):
+                errors += [dict(error, index=index) for error in self._write_errors(collection, [document])]
+            return errors
+
+    def _insert(self, collection, documents):
+        """Insert a batch; duplicate keys count as already written.
+
+        Returns {index: error} for documents MongoDB rejected for good; any
+        other failure raises and the whole batch is retried.
+        """
+        try:
+            errors = self._write_errors(collection, documents)
+        except Exception:
+            with self._lock:
+                self.failed += len(documents)
+            raise
+
+        duplicates = {error['index'] for error in errors if error.get('code') == DUPLICATE_KEY}
+        rejected = {
+            error['index']: error.get('errmsg') or f"code {error.get('code')}"
+            for error in errors if error.get('code') != DUPLICATE_KEY
+        }
+        with self._lock:
+            self.inserted += len(documents) - len(duplicates) - len(rejected)
+            self.duplicates += len(duplicates)
+            self.batches += 1
+        return rejected
+
+    def flush(self):
+        """Replay until the spool is empty; raises if MongoDB cannot take the writes"""
+        total = 0
+        while True:
+            replayed = self.replay_once()
+            total += replayed
+            if not replayed:
+                return total
+
+    def close(self, timeout=10):
+        """Stop the replayer; entries not yet replayed stay on disk for the next start"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+            self._local.connection = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'depth': self._depth if self._depth is not None else 0,
+                'capacity': self.max_rows,
+                'connected': self.database is not None,
+                'appended': self.appended,
+                'inserted': self.inserted,
+                'duplicates': self.duplicates,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'dead_lettered': self.dead_lettered,
+                'handler_failures': self.handler_failures,
+                'unhandled': self.unhandled,
+                'batches': self.batches
+            }
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Readiness flags and a per-phase timing breakdown for worker startup"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.phases = {}
+        self.errors = {}
+        self.ready = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases[name] = round(seconds, 4)
+        logger.info("Startup phase '%s' took %.3fs", name, seconds)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase and remember its error, if any"""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = str(e)
+            raise
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def mark_ready(self, component, ready=True):
+        with self._lock:
+            self.ready[component] = ready
+            if ready:
+                self.errors.pop(component, None)
+
+    def is_ready(self, *components):
+        return all(self.ready.get(component, False) for component in components)
+
+    def report(self):
+        with self._lock:
+            return {
+                'ready': dict(self.ready),
+                'phases': dict(self.phases),
+                'errors': dict(self.errors),
+                'uptime': round(time.monotonic() - self.started_at, 3)
+            }
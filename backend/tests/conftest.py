@@ -0,0 +1,48 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Tests import the app modules the way they import each other, from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# MODEL_DIR and SPOOL_PATH are read at import, so point them at a scratch directory
+# before any test module imports the app, and keep the app from warming up on its own
+MODEL_DIR = tempfile.mkdtemp(prefix='travel-models-')
+os.environ['MODEL_DIR'] = MODEL_DIR
+os.environ['SPOOL_PATH'] = os.path.join(MODEL_DIR, 'spool.db')
+os.environ['WARMUP_ON_IMPORT'] = 'false'
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    from catalog import load_catalog
+    return load_catalog()
+
+
+@pytest.fixture(scope='session')
+def model_dir(catalog):
+    """A Random Forest trained into MODEL_DIR, removed after the session"""
+    from models.random_forest_model import TravelRecommendationModel
+    TravelRecommendationModel(model_dir=MODEL_DIR).train(catalog)
+    yield MODEL_DIR
+    shutil.rmtree(MODEL_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app_module(model_dir):
+    """The Flask app with its models loaded and mongomock standing in for MongoDB"""
+    mongomock = pytest.importorskip('mongomock')
+    import app as app_module
+    app_module.initialize_models()
+    app_module.attach_database(mongomock.MongoClient()['travel_recommendations'])
+    app_module.startup.mark_ready('database')
+    yield app_module
+    app_module.write_spool.close()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,58 @@
+import pytest
+
+from model_registry import ModelNotAvailable
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    return {'Authorization': 'Bearer secret'}
+
+
+def test_admin_routes_disabled_without_token(client, monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.post('/api/models/random_forest/swap', json={}).status_code == 404
+    assert client.get('/api/logging').status_code == 404
+    assert client.put('/api/logging', json={'levels': {'root': 'DEBUG'}}).status_code == 404
+
+
+def test_admin_routes_require_the_token(client, admin_token):
+    assert client.post('/api/models/random_forest/swap', json={}).status_code == 401
+    assert client.get('/api/logging', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/api/logging', headers=admin_token).status_code == 200
+
+
+def test_admin_routes_have_no_cors_headers(client, admin_token):
+    origin = {'Origin': 'http://example.com'}
+    response = client.get('/api/logging', headers={**admin_token, **origin})
+    assert 'Access-Control-Allow-Origin' not in response.headers
+    response = client.get('/api/destinations', headers=origin)
+    assert 'Access-Control-Allow-Origin' in response.headers
+
+
+def test_failed_swap_keeps_the_old_model(client, app_module, admin_token):
+    before = app_module.registry.handle('random_forest')
+    response = client.post('/api/models/random_forest/swap', json={'version': 'missing'}, headers=admin_token)
+    assert response.status_code == 400
+    assert app_module.registry.handle('random_forest') is before
+
+
+def test_swap_keeps_serving_if_the_load_fails(app_module, monkeypatch):
+    registry = app_module.registry
+    before = registry.handle('random_forest')
+
+    def broken(directory):
+        raise ValueError('corrupt artifact')
+
+    monkeypatch.setitem(registry._loaders, 'random_forest', broken)
+    with pytest.raises(ModelNotAvailable):
+        registry.swap('random_forest')
+    assert registry.handle('random_forest') is before
+    assert registry.status()['random_forest']['error'] == 'corrupt artifact'
+
+
+def test_swap_publishes_the_new_model(client, app_module, admin_token):
+    before = app_module.registry.handle('random_forest')
+    response = client.post('/api/models/random_forest/swap', json={'version': 'current'}, headers=admin_token)
+    assert response.status_code == 200
+    assert app_module.registry.handle('random_forest') is not before
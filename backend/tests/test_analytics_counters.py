@@ -0,0 +1,50 @@
+import pytest
+
+from analytics_counters import DIMENSIONS, backfill_counters, increment_counters, read_counters
+from destination_index import DestinationIndex
+from history import DestinationDimension, history_document
+
+mongomock = pytest.importorskip('mongomock')
+
+PREFERENCES = {'budget': 1000, 'destination_type': 'Beach', 'travel_season': 'Summer', 'travel_purpose': 'Relaxation'}
+
+
+@pytest.fixture
+def destinations(catalog):
+    return DestinationDimension().add_catalog(DestinationIndex(catalog))
+
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient()['test']
+
+
+def saved_history(catalog, count):
+    names = [str(name) for name in catalog.destination]
+    return [
+        history_document(PREFERENCES, [{'destination': names[(i + j) % len(names)]} for j in range(3)])
+        for i in range(count)
+    ]
+
+
+def test_backfill_counts_existing_history(catalog, destinations, database):
+    documents = saved_history(catalog, 20)
+    database['user_preferences'].insert_many(documents)
+    assert backfill_counters(database['user_preferences'], database['analytics_counters'], destinations)
+
+    expected = database['expected']
+    increment_counters(expected, documents, destinations)
+    for dimension in DIMENSIONS:
+        assert sorted(read_counters(database['analytics_counters'], dimension)) == sorted(read_counters(expected, dimension))
+
+
+def test_backfill_leaves_existing_counters_alone(catalog, destinations, database):
+    database['user_preferences'].insert_many(saved_history(catalog, 5))
+    database['analytics_counters'].insert_one({'dimension': 'destination', 'key': 'Somewhere', 'count': 1})
+    assert backfill_counters(database['user_preferences'], database['analytics_counters'], destinations) is None
+    assert read_counters(database['analytics_counters'], 'destination') == [('Somewhere', 1)]
+
+
+def test_backfill_without_history_does_nothing(destinations, database):
+    assert backfill_counters(database['user_preferences'], database['analytics_counters'], destinations) is None
+    assert database['analytics_counters'].count_documents({}) == 0
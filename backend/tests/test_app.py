@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip'])
+def test_destinations_not_modified(client, encoding):
+    headers = {'Accept-Encoding': encoding}
+    response = client.get('/api/destinations', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('"') and etag.endswith('"')
+
+    response = client.get('/api/destinations', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_destinations_changed_etag(client):
+    response = client.get('/api/destinations', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.get_json()
+
+
+@pytest.mark.parametrize('score', ['high', None, [4], 'NaN', 'Infinity', 0, 6, True])
+def test_invalid_rating_is_rejected(client, score):
+    body = {'system_satisfaction_score': score, 'analytics_satisfaction_score': 4}
+    response = client.post('/api/ratings', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_non_finite_json_rating_is_rejected(client):
+    body = '{"system_satisfaction_score": NaN, "analytics_satisfaction_score": 4}'
+    response = client.post('/api/ratings', data=body, content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_rating_is_saved(client):
+    response = client.post('/api/ratings', json={'system_satisfaction_score': 4, 'analytics_satisfaction_score': '5'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+
+
+def test_compact_history_pages(client, app_module):
+    preferences = {'budget': 1500, 'destination_type': 'Beach', 'travel_purpose': 'Relaxation', 'travel_season': 'Summer'}
+    for _ in range(3):
+        assert client.post('/api/recommendations', json=preferences).status_code == 200
+    app_module.write_spool.flush()
+    for _ in range(2):
+        response = client.get('/api/history?include_recommendations=false&limit=2')
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['history']) == 2 and page['next_cursor']
+        assert all('recommendations' not in document for document in page['history'])
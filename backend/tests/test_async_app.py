@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('quart')
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import async_app
+
+PREFERENCES = {
+    'destination_type': 'Beach', 'travel_purpose': 'Relaxation', 'travel_season': 'Summer', 'budget': 3000
+}
+
+
+def serve(test, **settings):
+    """Run test(client) against a fresh app on mongomock, with async_app settings overridden"""
+    async def run():
+        app = async_app.create_app(mongomock_motor.AsyncMongoMockClient()['travel_recommendations'])
+        async with app.test_app() as test_app:
+            return await test(test_app.test_client())
+
+    original = {name: getattr(async_app, name) for name in settings if name != 'limits'}
+    limits = dict(async_app.ROUTE_LIMITS)
+    try:
+        for name, value in settings.items():
+            if name == 'limits':
+                async_app.ROUTE_LIMITS.update(value)
+            else:
+                setattr(async_app, name, value)
+        return asyncio.run(run())
+    finally:
+        for name, value in original.items():
+            setattr(async_app, name, value)
+        async_app.ROUTE_LIMITS.update(limits)
+
+
+def slow_counters(seconds, calls):
+    async def read(collection, dimension, limit=0, max_time_ms=None):
+        calls.append(max_time_ms)
+        await asyncio.sleep(seconds)
+        return []
+    return read
+
+
+def test_recommendations_are_saved_to_history(model_dir):
+    async def test(client):
+        response = await client.post('/api/recommendations', json=PREFERENCES)
+        assert response.status_code == 200
+        recommendations = (await response.get_json())['recommendations']['predictive']
+        assert recommendations
+        # History is saved in the background
+        for _ in range(50):
+            history = await (await client.get('/api/history')).get_json()
+            if history['history']:
+                break
+            await asyncio.sleep(0.01)
+        names = [rec['destination'] for rec in recommendations]
+        assert [rec['destination'] for rec in history['history'][0]['recommendations']] == names
+        top = await (await client.get('/api/top-destinations')).get_json()
+        assert {item['name'] for item in top['destinations']} <= set(names)
+        dashboard = await client.get('/api/dashboard')
+        assert dashboard.status_code == 200
+    serve(test)
+
+
+def test_missing_preference_is_rejected():
+    async def test(client):
+        response = await client.post('/api/recommendations', json={'budget': 3000})
+        assert response.status_code == 400
+    serve(test)
+
+
+def test_ratings_round_trip():
+    async def test(client):
+        for score in (2, 4):
+            response = await client.post('/api/ratings', json={
+                'system_satisfaction_score': score, 'analytics_satisfaction_score': 5
+            })
+            assert response.status_code == 200
+        ratings = await (await client.get('/api/ratings')).get_json()
+        assert ratings['total_ratings'] == 2
+        assert ratings['averages'] == {'system_satisfaction_score': 3.0, 'analytics_satisfaction_score': 5.0}
+        assert len(ratings['ratings']) == 2
+    serve(test)
+
+
+@pytest.mark.parametrize('score', ['high', None, 'NaN', 9])
+def test_invalid_rating_is_rejected(score):
+    async def test(client):
+        response = await client.post('/api/ratings', json={
+            'system_satisfaction_score': score, 'analytics_satisfaction_score': 5
+        })
+        assert response.status_code == 400
+    serve(test)
+
+
+def test_slow_query_times_out(monkeypatch):
+    calls = []
+    monkeypatch.setattr(async_app, 'read_counters_async', slow_counters(1.0, calls))
+
+    async def test(client):
+        response = await client.get('/api/destination-types')
+        assert response.status_code == 504
+    serve(test, DB_TIMEOUT_MS=50)
+    # The same bound is sent to the server as maxTimeMS
+    assert calls == [50]
+
+
+def test_overloaded_route_class_answers_503(monkeypatch):
+    monkeypatch.setattr(async_app, 'read_counters_async', slow_counters(0.3, []))
+
+    async def test(client):
+        responses = await asyncio.gather(*(client.get('/api/travel-seasons') for _ in range(3)))
+        return sorted(response.status_code for response in responses)
+    assert serve(test, QUEUE_TIMEOUT=0.05, limits={'analytics': 1}) == [200, 503, 503]
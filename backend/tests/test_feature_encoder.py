@@ -0,0 +1,37 @@
+import numpy as np
+
+from feature_encoder import FeatureEncoder
+
+CATEGORIES = {'Destination_Type': ['Beach', 'Beach ', 'Mountain'], 'Travel_Purpose': [' Nature Appreciation', 'Relaxation']}
+KEYS = {'Budget': 'budget', 'Destination_Type': 'destination_type', 'Travel_Purpose': 'travel_purpose'}
+
+
+def encoder():
+    return FeatureEncoder(['Budget', 'Destination_Type', 'Travel_Purpose'], CATEGORIES, KEYS)
+
+
+def test_training_categories_with_whitespace_keep_their_codes():
+    row = encoder().encode({'budget': '1,500', 'destination_type': 'Beach ', 'travel_purpose': ' Nature Appreciation'})
+    assert list(row[0]) == [1500.0, 1.0, 0.0]
+
+
+def test_unmatched_whitespace_falls_back_to_the_stripped_value():
+    row = encoder().encode({'budget': 1500, 'destination_type': ' Mountain ', 'travel_purpose': 'Relaxation '})
+    assert list(row[0]) == [1500.0, 2.0, 1.0]
+
+
+def test_encode_many_matches_encode():
+    preferences = [
+        {'budget': 900, 'destination_type': 'Beach', 'travel_purpose': 'Relaxation'},
+        {'budget': 2500, 'destination_type': 'Beach ', 'travel_purpose': 'unknown'}
+    ]
+    batch = encoder().encode_many(preferences)
+    assert np.array_equal(batch, np.vstack([encoder().encode(p).copy() for p in preferences]))
+
+
+def test_cache_key_matches_encoding(app_module):
+    model = app_module.registry.get('random_forest')
+    base = {'budget': 1500, 'destination_type': 'Beach', 'travel_purpose': 'Relaxation', 'travel_season': 'Summer'}
+    spaced = dict(base, destination_type='Beach ')
+    assert model.encoder.codes(base) != model.encoder.codes(spaced)
+    assert model.cache_key(base) != model.cache_key(spaced)
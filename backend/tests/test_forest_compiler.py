@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from models.forest_compiler import CompiledForest, check_parity, compile_forest, threshold_inputs
+
+
+@pytest.fixture(scope='module')
+def forest():
+    # A budget-like float feature and three small categorical codes, as in the recommender
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(100, 5000, 400)] + [rng.integers(0, size, 400) for size in (4, 6, 3)])
+    y = np.array([f'destination {i}' for i in rng.integers(0, 12, 400)])
+    return RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+
+
+def inputs(forest):
+    rng = np.random.default_rng(1)
+    random_rows = np.column_stack([rng.uniform(0, 6000, 300)] + [rng.integers(0, size, 300) for size in (4, 6, 3)])
+    return np.vstack([random_rows, threshold_inputs(forest)])
+
+
+def test_predict_proba_matches_sklearn(forest):
+    X = inputs(forest)
+    compiled = compile_forest(forest)
+    assert np.allclose(compiled.predict_proba(X), forest.predict_proba(X))
+    assert check_parity(forest, compiled, X) <= 1e-9
+    assert list(compiled.classes) == [str(label) for label in forest.classes_]
+
+
+def test_single_row_matches_batch(forest):
+    X = inputs(forest)
+    compiled = compile_forest(forest)
+    assert np.allclose(compiled.predict_proba(X[0]), compiled.predict_proba(X)[:1])
+
+
+def test_saved_arrays_match_sklearn(forest, tmp_path):
+    compile_forest(forest).save(str(tmp_path))
+    compiled = CompiledForest.load(str(tmp_path))
+    X = inputs(forest)
+    assert np.allclose(compiled.predict_proba(X), forest.predict_proba(X))
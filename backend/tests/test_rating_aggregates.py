@@ -0,0 +1,32 @@
+import pytest
+
+from rating_aggregates import SUMMARY_ID, rating_document, read_summary, record_ratings
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def test_rating_document_accepts_numeric_strings():
+    document = rating_document({'system_satisfaction_score': '4.5', 'analytics_satisfaction_score': 1})
+    assert document['system_satisfaction_score'] == 4.5
+    assert document['analytics_satisfaction_score'] == 1.0
+
+
+@pytest.mark.parametrize('score', [float('nan'), float('inf'), 0.5, 5.5, 'four', True])
+def test_rating_document_rejects_invalid_scores(score):
+    with pytest.raises((TypeError, ValueError)):
+        rating_document({'system_satisfaction_score': score, 'analytics_satisfaction_score': 3})
+
+
+def test_bad_rating_does_not_spoil_the_batch():
+    aggregates = mongomock.MongoClient()['test']['rating_aggregates']
+    good = [
+        {'_id': 1, 'system_satisfaction_score': 4.0, 'analytics_satisfaction_score': 5.0},
+        {'_id': 3, 'system_satisfaction_score': 2.0, 'analytics_satisfaction_score': 3.0}
+    ]
+    bad = {'_id': 2, 'system_satisfaction_score': float('nan'), 'analytics_satisfaction_score': 5.0}
+    record_ratings(aggregates, [good[0], bad, good[1]])
+    count, averages, details = read_summary(aggregates)
+    assert count == 2
+    assert averages == {'system_satisfaction_score': 3.0, 'analytics_satisfaction_score': 4.0}
+    assert details['system_satisfaction_score']['histogram'] == {'2': 1, '4': 1}
+    assert aggregates.find_one({'_id': SUMMARY_ID})['count'] == 2
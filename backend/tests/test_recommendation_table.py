@@ -0,0 +1,27 @@
+import numpy as np
+
+from models.recommendation_table import top_k_indices
+
+
+def tied_probabilities():
+    rng = np.random.default_rng(0)
+    # Coarse probabilities over many classes, so most rows have ties inside their top 5
+    return rng.integers(0, 4, size=(200, 120)) / 10.0
+
+
+def test_ties_rank_the_later_class_first():
+    probabilities = np.array([0.1, 0.3, 0.3, 0.0, 0.3, 0.2])
+    assert list(top_k_indices(probabilities, 4)) == [4, 2, 1, 5]
+
+
+def test_matches_the_original_ranking():
+    for row in tied_probabilities():
+        assert list(top_k_indices(row, 5)) == list(np.argsort(row)[-5:][::-1])
+
+
+def test_batch_matches_single_rows():
+    probabilities = tied_probabilities()
+    batch = top_k_indices(probabilities, 5)
+    assert batch.shape == (200, 5)
+    for row, top in zip(probabilities, batch):
+        assert list(top) == list(top_k_indices(row, 5))
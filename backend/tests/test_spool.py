@@ -0,0 +1,105 @@
+import bson
+import pytest
+
+from spool import WriteSpool
+
+mongomock = pytest.importorskip('mongomock')
+
+
+class Handler:
+    """Records the _ids it was given; fails the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.seen = []
+
+    def __call__(self, database, documents):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('handler down')
+        self.seen += [document['_id'] for document in documents]
+
+
+def make_spool(tmp_path, handler, **kwargs):
+    spool = WriteSpool(str(tmp_path / 'writes.db'), handlers={'ratings': handler}, **kwargs)
+    spool.database = mongomock.MongoClient()['test']
+    return spool
+
+
+def append(spool, count):
+    documents = [{'score': index} for index in range(count)]
+    for document in documents:
+        spool.append('ratings', document)
+    return [document['_id'] for document in documents]
+
+
+def test_each_document_handled_once(tmp_path):
+    handler = Handler()
+    spool = make_spool(tmp_path, handler, batch_size=3)
+    ids = append(spool, 7)
+    assert spool.flush() == 7
+    assert handler.seen == ids
+    assert spool.database['ratings'].count_documents({}) == 7
+    assert spool.depth() == 0
+
+
+def test_failed_handler_is_retried(tmp_path):
+    handler = Handler(failures=2)
+    spool = make_spool(tmp_path, handler)
+    ids = append(spool, 4)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            spool.replay_once()
+    # Inserted once, handled once the handler recovers
+    assert spool.flush() == 4
+    assert handler.seen == ids
+    assert spool.database['ratings'].count_documents({}) == 4
+    assert spool.stats()['handler_failures'] == 2
+
+
+def test_handler_gives_up_after_max_attempts(tmp_path):
+    handler = Handler(failures=10)
+    spool = make_spool(tmp_path, handler, max_attempts=2)
+    append(spool, 3)
+    with pytest.raises(RuntimeError):
+        spool.replay_once()
+    assert spool.replay_once() == 3
+    assert spool.depth() == 0
+    assert handler.seen == []
+    assert spool.stats()['unhandled'] == 3
+
+
+def test_insert_without_handler_run_is_handled_on_replay(tmp_path):
+    # A crash after MongoDB took the batch but before the handler ran: the replay sees duplicates
+    handler = Handler()
+    spool = make_spool(tmp_path, handler)
+    ids = append(spool, 3)
+    rows = spool._connection().execute('SELECT document FROM spool ORDER BY seq').fetchall()
+    spool.database['ratings'].insert_many([bson.decode(document) for document, in rows[:2]])
+    assert spool.flush() == 3
+    assert handler.seen == ids
+    assert spool.stats()['duplicates'] == 2
+
+
+def test_rejected_documents_are_dead_lettered(tmp_path, monkeypatch):
+    handler = Handler()
+    spool = make_spool(tmp_path, handler)
+    ids = append(spool, 2)
+    spool.append('ratings', {'invalid': True})
+    monkeypatch.setattr(spool, '_write_errors', lambda collection, documents: [
+        {'index': index, 'code': 121, 'errmsg': 'Document failed validation'}
+        for index, document in enumerate(documents) if document.get('invalid')
+    ])
+    assert spool.flush() == 3
+    assert handler.seen == ids
+    assert spool.dead_letter_depth() == 1
+
+
+def test_claimed_entries_are_skipped(tmp_path):
+    handler = Handler()
+    spool = make_spool(tmp_path, handler)
+    append(spool, 2)
+    other = make_spool(tmp_path, Handler())
+    assert len(other._claim(other._connection())) == 2
+    assert spool.replay_once() == 0
+    assert handler.seen == []
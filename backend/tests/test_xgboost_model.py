@@ -0,0 +1,32 @@
+import math
+
+import pytest
+
+pytest.importorskip('xgboost')
+
+from models.xgboost_model import FALLBACK_PREDICTION, XGBoostTravelModel
+
+PREFERENCES = {
+    'budget': '1,500', 'destination_type': 'Beach', 'travel_purpose': 'Relaxation',
+    'travel_season': 'Summer', 'municipality': 'Mati City'
+}
+
+
+@pytest.fixture(scope='module')
+def model(catalog, tmp_path_factory):
+    model = XGBoostTravelModel(model_dir=str(tmp_path_factory.mktemp('xgboost')))
+    model.train(catalog, cv_folds=0)
+    return model
+
+
+def test_predict_rescores_the_top_classes(model, catalog):
+    predictions = model.predict(PREFERENCES, catalog)
+    assert predictions and predictions != [FALLBACK_PREDICTION]
+    scores = [prediction['confidence_score'] for prediction in predictions]
+    assert scores == sorted(scores, reverse=True)
+    assert all(math.isfinite(prediction['budget_match']) for prediction in predictions)
+
+
+@pytest.mark.parametrize('budget', ['0', '0.0', 'nan', 'inf', '-inf'])
+def test_unusable_budget_gets_the_fallback(model, catalog, budget):
+    assert model.predict(dict(PREFERENCES, budget=budget), catalog) == [FALLBACK_PREDICTION]
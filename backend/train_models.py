@@ -0,0 +1,33 @@
+"""Offline training for the recommendation models.
+
+The web process never trains; run this from ``backend/`` to produce the
+artifacts it loads::
+
+    python train_models.py
+
+The XGBoost model is trained by a parallel hyperparameter search::
+
+    python -m models.xgboost_search
+"""
+import logging
+import time
+
+from catalog import CSV_PATH, load_catalog
+from models.random_forest_model import TravelRecommendationModel
+
+logger = logging.getLogger(__name__)
+
+
+def train_random_forest(dataset_path=CSV_PATH):
+    """Train the Random Forest and write the model, compiled forest and lookup table"""
+    catalog = load_catalog(dataset_path)
+    start = time.monotonic()
+    model = TravelRecommendationModel()
+    model.train(catalog)
+    logger.info("Random Forest trained on %s records in %.1fs", len(catalog), time.monotonic() - start)
+    return model
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    train_random_forest()
@@ -0,0 +1,25 @@
+"""WSGI entry point for production serving.
+
+Run from ``backend/`` with the settings in ``gunicorn.conf.py``::
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With ``preload_app`` the master imports this module once: it loads the
+catalog and models before forking, so every worker shares those pages
+copy-on-write. Each worker then opens its own MongoDB connection
+(``post_fork`` in ``gunicorn.conf.py``).
+"""
+import gc
+import os
+
+# The master must not start threads or open MongoDB connections before forking
+os.environ.setdefault('WARMUP_ON_IMPORT', 'false')
+
+import app as application  # noqa: E402
+
+app = application.app
+
+application.preload()
+# Move everything loaded so far out of the collector's reach, so garbage
+# collection in the workers does not touch (and copy) the shared pages
+gc.freeze()
@@ -17,7 +17,7 @@ function SatisfactionKPIs() {
         if (response.data.status === 'success') {
           setRatings({
             ...response.data.averages,
-            total_ratings: response.data.ratings.length
+            total_ratings: response.data.total_ratings
           });
         }
       } catch (error) {